@@ -0,0 +1,89 @@
+"""
+Async access to the database module for the FastAPI endpoints.
+
+Every call runs the synchronous function from backend.database on a dedicated
+thread pool, so SQLite work never blocks the event loop. Pool threads are
+long-lived, which keeps the connection pool's per-thread affinity warm.
+
+The number of calls waiting for a thread is bounded: once the backlog is full,
+run() raises DatabaseOverloadedError right away instead of queueing work that
+would only time out later. It is an HTTPException, so endpoints that re-raise
+HTTPException past their catch-all handlers answer 503 with a Retry-After header.
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import ParamSpec, TypeVar
+
+from fastapi import HTTPException
+
+from backend import database as db
+
+DB_EXECUTOR_THREADS = int(os.getenv("DB_EXECUTOR_THREADS", str(db.DB_POOL_SIZE)))
+DB_EXECUTOR_QUEUE_SIZE = int(os.getenv("DB_EXECUTOR_QUEUE_SIZE", "256"))  # calls allowed to wait for a thread
+DB_OVERLOAD_RETRY_AFTER = 1  # seconds clients are told to wait after a 503
+
+P = ParamSpec("P")
+T = TypeVar("T")
+
+
+class DatabaseOverloadedError(HTTPException):
+    """Raised when the database executor's backlog is full; answered as 503 with Retry-After"""
+
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=503,
+            detail="Database is overloaded, try again shortly",
+            headers={"Retry-After": str(DB_OVERLOAD_RETRY_AFTER)},
+        )
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the database thread pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, DB_EXECUTOR_THREADS), thread_name_prefix="db")
+        return _executor
+
+
+def shutdown() -> None:
+    """Wait for running calls to finish and stop the database threads"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _finish(_future: object) -> None:
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def run(func: Callable[P, T], *args: P.args, **kwargs: P.kwargs) -> T:  # noqa: UP047 - ParamSpec keeps the module importable on 3.11
+    """Await func(*args, **kwargs) run on the database thread pool"""
+    global _pending
+    with _pending_lock:
+        if _pending >= DB_EXECUTOR_THREADS + DB_EXECUTOR_QUEUE_SIZE:
+            raise DatabaseOverloadedError()
+        _pending += 1
+    try:
+        future = get_executor().submit(functools.partial(func, *args, **kwargs))
+    except BaseException:
+        _finish(None)
+        raise
+    # The slot is freed when the call finishes, even if the awaiting request is cancelled
+    future.add_done_callback(_finish)
+    return await asyncio.wrap_future(future)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark ParkingSpaceResponse list serialization
+
+Compares the previous path (build a Pydantic model per row, then let FastAPI
+validate the list against response_model and encode it with json) with the
+current one (plain dicts from _space_json dumped by orjson).
+
+Usage:
+    python -m backend.bench_serialization [rows] [repeats]
+"""
+
+import json
+import random
+import sys
+import time
+from typing import Any
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend.main import ParkingSpaceResponse, _space_json
+
+
+def make_rows(count: int) -> list[dict[str, Any]]:
+    """Synthetic rows shaped like search_places_by_location results"""
+    rng = random.Random(42)
+    return [
+        {
+            "id": i,
+            "added_by": rng.randint(1, 500),
+            "title": f"Driveway spot {i}",
+            "description": "Covered driveway, easy access, close to transit.",
+            "latitude": 37.7 + rng.random() * 0.1,
+            "longitude": -122.5 + rng.random() * 0.1,
+            "price_per_hour": round(rng.uniform(2, 25), 2),
+            "tags": rng.sample(["covered", "ev", "24h", "secure", "wide"], 2),
+            "created_at": "2025-01-01 12:00:00",
+            "distance_m": rng.random() * 2000,
+        }
+        for i in range(count)
+    ]
+
+
+def pydantic_path(rows: list[dict[str, Any]], adapter: TypeAdapter[list[ParkingSpaceResponse]]) -> bytes:
+    """Model per row, response_model validation, jsonable_encoder, json.dumps"""
+    models = [ParkingSpaceResponse.model_validate(_space_json(row, tags=row["tags"])) for row in rows]
+    validated = adapter.validate_python(models, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated), separators=(",", ":")).encode()
+
+
+def orjson_path(rows: list[dict[str, Any]]) -> bytes:
+    """Plain dicts dumped by orjson, as ORJSONResponse does"""
+    return orjson.dumps([_space_json(row, tags=row["tags"]) for row in rows])
+
+
+def best_of(repeats: int, func: Any, *args: Any) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rows = make_rows(count)
+    adapter = TypeAdapter(list[ParkingSpaceResponse])
+
+    assert json.loads(pydantic_path(rows, adapter)) == json.loads(orjson_path(rows)), "paths disagree"
+
+    before = best_of(repeats, pydantic_path, rows, adapter)
+    after = best_of(repeats, orjson_path, rows)
+    print(f"{count} rows, best of {repeats}")
+    print(f"  pydantic + json: {before * 1000:8.1f} ms")
+    print(f"  dict + orjson:   {after * 1000:8.1f} ms")
+    print(f"  speedup:         {before / after:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
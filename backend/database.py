@@ -1,172 +1,1083 @@
+import math
 import os
+import queue
+import random
 import sqlite3
-from contextlib import contextmanager
-from typing import Any
+import threading
+import time
+from collections import Counter, OrderedDict
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future
+from contextlib import contextmanager, suppress
+from datetime import UTC, date, datetime, timedelta
+from typing import Any, Generic, NamedTuple, TypeVar
+
+import numpy as np
+import numpy.typing as npt
 
 # Database configuration
 DB_PATH = os.getenv("DB_PATH", "./app.db")
 
+# Mean Earth radius used for great-circle distances
+EARTH_RADIUS_M = 6_371_008.8
+
+# Availability bitmaps: one bit per 15-minute slot, 96 slots per UTC day
+SLOT_MINUTES = 15
+SLOT_MASK_BYTES = 12
+AVAILABILITY_QUERY_CHUNK = 500
+
+# Place ids per IN (...) lookup when attaching tags to result rows
+TAG_QUERY_CHUNK = 500
+
+# BM25 column weights for places_fts (title, description, address)
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Retry policy for booking transactions that hit a locked database
+BOOKING_BUSY_RETRIES = 8
+BOOKING_BUSY_BACKOFF_BASE = 0.01  # seconds
+BOOKING_BUSY_BACKOFF_MAX = 0.5  # seconds
+
+# Starting search window for k-nearest-neighbour queries, doubled until k places are found
+KNN_INITIAL_RADIUS_M = 500.0
+
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a free connection
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))  # seconds before a connection is recycled
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "60"))  # idle seconds before a ping
+
+# Storage profile applied to every new connection
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL").upper()
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes, 0 disables memory-mapped I/O
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", str(64 * 1024)))  # page cache per connection
+
+# Write queue: small write transactions are applied by one writer thread in batches
+DB_WRITE_QUEUE = os.getenv("DB_WRITE_QUEUE", "1") != "0"
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "64"))
+
+# In-process cache for hot place and user lookups (size 0 disables it)
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "4096"))
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "30"))  # seconds; bounds staleness from other workers' writes
+
+# Geo-tile cache for radius searches: published places cached per fixed lat/lng tile
+SEARCH_TILE_DEGREES = 0.01  # about 1.1 km of latitude
+SEARCH_TILE_MAX_TILES = 256  # searches covering more tiles than this query the R*Tree directly
+SEARCH_TILE_CACHE_SIZE = int(os.getenv("SEARCH_TILE_CACHE_SIZE", "4096"))  # tiles
+
+# Marker clusters: Web Mercator grid with one cell for the world at level 0, 4^level cells at each level
+CLUSTER_MAX_LEVEL = 18
+CLUSTER_MAX_LATITUDE = 85.05112878  # Web Mercator cuts off the poles here
+
+# Read notifications older than this are moved to notifications_archive by archive_read_notifications
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "90"))
+NOTIFICATION_ARCHIVE_BATCH_SIZE = 1000
+
+# Rows per transaction when a migration backfills a new column on a live database
+DB_BACKFILL_BATCH_SIZE = int(os.getenv("DB_BACKFILL_BATCH_SIZE", "1000"))
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+T = TypeVar("T")
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+def storage_pragmas() -> list[str]:
+    """PRAGMA statements for the configured storage profile; raises ValueError on a bad mode"""
+    if DB_JOURNAL_MODE not in _JOURNAL_MODES:
+        raise ValueError(f"Unsupported DB_JOURNAL_MODE: {DB_JOURNAL_MODE}")
+    if DB_SYNCHRONOUS not in _SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported DB_SYNCHRONOUS: {DB_SYNCHRONOUS}")
+    return [
+        f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS:d}",
+        f"PRAGMA journal_mode = {DB_JOURNAL_MODE}",
+        f"PRAGMA synchronous = {DB_SYNCHRONOUS}",
+        f"PRAGMA mmap_size = {DB_MMAP_SIZE:d}",
+        f"PRAGMA cache_size = {-DB_CACHE_SIZE_KIB:d}",  # negative means KiB rather than pages
+    ]
 
-def init_database():
-    """Initialize database with required tables"""
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                username TEXT UNIQUE NOT NULL,
-                hashed_password TEXT NOT NULL,
-                user_type TEXT DEFAULT 'parker' CHECK(user_type IN ('parker', 'provider', 'both')),
-                license_plate_state TEXT CHECK(length(license_plate_state) = 2),
-                license_plate TEXT UNIQUE,
-                is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS places (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                description TEXT,
-                added_by INTEGER NOT NULL,
-                creator_is_owner BOOLEAN DEFAULT 1,
-                latitude DECIMAL(10, 8),
-                longitude DECIMAL(10, 8),
-                address TEXT NOT NULL,
-                price_per_hour DECIMAL(10, 2) DEFAULT 0,
-                is_published BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (added_by) REFERENCES users (id)
-            )
-        """)
+class PooledConnection:
+    """A pooled SQLite connection plus the bookkeeping needed to recycle it"""
+
+    def __init__(self, conn: sqlite3.Connection, file_id: tuple[int, int] | None):
+        self.conn = conn
+        self.file_id = file_id
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections with per-thread affinity.
+
+    A thread gets back the connection it used last whenever that connection is
+    idle, so worker threads keep warm statement caches. Connections idle for
+    longer than the health check interval are pinged before reuse, and
+    connections older than the max lifetime are closed instead of returned.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_size: int = DB_POOL_SIZE,
+        timeout: float = DB_POOL_TIMEOUT,
+        max_lifetime: float = DB_POOL_MAX_LIFETIME,
+        health_check_interval: float = DB_POOL_HEALTH_CHECK_INTERVAL,
+    ):
+        self.db_path = db_path
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_interval = health_check_interval
+        self._idle: list[PooledConnection] = []
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._local = threading.local()
+
+    def _connect(self) -> PooledConnection:
+        # Connections migrate between threads, but only one thread uses a connection at a time
+        conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # This makes rows behave like dicts
+        try:
+            for pragma in storage_pragmas():
+                conn.execute(pragma)
+        except Exception:
+            conn.close()
+            raise
+        return PooledConnection(conn, self._file_id())
+
+    def _file_id(self) -> tuple[int, int] | None:
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def _take_idle(self) -> PooledConnection | None:
+        preferred: PooledConnection | None = getattr(self._local, "last", None)
+        if preferred is not None and preferred in self._idle:
+            self._idle.remove(preferred)
+            return preferred
+        if self._idle:
+            return self._idle.pop()
+        return None
 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS license_plate_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                license_plate TEXT NOT NULL,
-                description TEXT NOT NULL,
-                reporter_email TEXT,
-                space_id INTEGER,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (space_id) REFERENCES places (id)
-            )
-        """)
+    def _is_healthy(self, pooled: PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - pooled.created_at > self.max_lifetime:
+            return False
+        # A connection to a deleted or replaced database file can only fail with "readonly database"
+        if pooled.file_id != self._file_id():
+            return False
+        if now - pooled.last_used > self.health_check_interval:
+            try:
+                pooled.conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                return False
+        return True
 
+    def _discard(self, pooled: PooledConnection) -> None:
+        with suppress(sqlite3.Error):
+            pooled.conn.close()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def held(self) -> PooledConnection | None:
+        """Return the connection the current thread has checked out, if any"""
+        return getattr(self._local, "held", None)
+
+    def acquire(self) -> PooledConnection:
+        """Check out a connection, waiting up to the pool timeout for one to free up"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pooled: PooledConnection | None = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise sqlite3.OperationalError("Connection pool is closed")
+                    pooled = self._take_idle()
+                    if pooled is not None or self._size < self.max_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise sqlite3.OperationalError("Timed out waiting for a database connection")
+                    self._cond.wait(remaining)
+                if pooled is None:
+                    self._size += 1
+
+            if pooled is None:
+                try:
+                    pooled = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(pooled):
+                self._discard(pooled)
+                continue
+
+            self._local.held = pooled
+            return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False) -> None:
+        """Return a connection to the pool, closing it if it is broken or expired"""
+        self._local.held = None
+        now = time.monotonic()
+        if discard or self._closed or now - pooled.created_at > self.max_lifetime:
+            self._discard(pooled)
+            return
+        pooled.last_used = now
+        self._local.last = pooled
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Close idle connections; connections still checked out are closed on release"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            pooled.conn.close()
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, rebuilding it if DB_PATH changed"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH)
+            clear_lookup_caches()
+        return _pool
+
+
+def close_db_pool() -> None:
+    """Close all pooled connections (called on application shutdown)"""
+    global _pool
+    _backfill_stop.set()
+    close_write_queue()
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def _add_column(conn: sqlite3.Connection, table: str, column: str, definition: str) -> bool:
+    """Add a column unless the table already has it; returns True if it was added"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column in columns:
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    return True
+
+
+def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _schedule_backfill(conn: sqlite3.Connection, name: str) -> None:
+    """Queue an online backfill over the rows that exist when the migration runs.
+
+    Rows inserted afterwards are kept current by the application code, so the
+    backfill only has to cover ids up to today's maximum.
+    """
+    max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {BACKFILLS[name].table}").fetchone()[0]
+    if max_id == 0:
+        return
+    conn.execute("INSERT OR REPLACE INTO schema_backfills (name, last_id, max_id) VALUES (?, 0, ?)", (name, max_id))
+
+
+# Schema migrations. Each step runs once, in its own transaction, and is recorded in
+# schema_version. Steps also have to cope with databases created before versioning
+# existed, hence the IF NOT EXISTS clauses. Never edit a released step; add a new one.
+def _migrate_core_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            username TEXT UNIQUE NOT NULL,
+            hashed_password TEXT NOT NULL,
+            user_type TEXT DEFAULT 'parker' CHECK(user_type IN ('parker', 'provider', 'both')),
+            license_plate_state TEXT CHECK(length(license_plate_state) = 2),
+            license_plate TEXT UNIQUE,
+            is_active BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS places (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT,
+            description TEXT,
+            added_by INTEGER NOT NULL,
+            creator_is_owner BOOLEAN DEFAULT 1,
+            latitude DECIMAL(10, 8),
+            longitude DECIMAL(10, 8),
+            address TEXT NOT NULL,
+            price_per_hour DECIMAL(10, 2) DEFAULT 0,
+            is_published BOOLEAN DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (added_by) REFERENCES users (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS license_plate_reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            license_plate TEXT NOT NULL,
+            description TEXT NOT NULL,
+            reporter_email TEXT,
+            space_id INTEGER,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (space_id) REFERENCES places (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            type TEXT DEFAULT 'info',
+            is_read BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_verifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_email TEXT NOT NULL UNIQUE,
+            status TEXT DEFAULT 'pending',
+            profile_photo_url TEXT,
+            id_document_url TEXT,
+            vehicle_registration_url TEXT,
+            verification_notes TEXT,
+            verified_at TIMESTAMP,
+            verified_by TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_email) REFERENCES users (email)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            rater_id INTEGER NOT NULL,
+            ratee_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (rater_id) REFERENCES users (id),
+            FOREIGN KEY (ratee_id) REFERENCES users (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_ratings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            place_id INTEGER NOT NULL,
+            rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (place_id) REFERENCES places (id)
+        )
+    """)
+
+    # Columns added to these tables before migrations were versioned
+    _add_column(conn, "places", "price_per_hour", "DECIMAL(10, 2) DEFAULT 0")
+    _add_column(conn, "places", "tags", "TEXT DEFAULT '[]'")
+    _add_column(conn, "users", "user_type", "TEXT DEFAULT 'parker' CHECK(user_type IN ('parker', 'provider', 'both'))")
+    _add_column(conn, "users", "units_preference", "TEXT DEFAULT 'imperial' CHECK(units_preference IN ('metric', 'imperial'))")
+
+    # Create indexes for better performance
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_license_plate ON users(license_plate)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_places_latitude ON places(latitude)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_places_longitude ON places(longitude)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_places_published_created ON places(is_published, created_at, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_places_added_by_created ON places(added_by, created_at, id)")
+
+    # Create indexes for rating tables
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_ratings_rater ON user_ratings(rater_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_ratings_ratee ON user_ratings(ratee_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_place_ratings_user ON place_ratings(user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_place_ratings_place ON place_ratings(place_id)")
+
+
+def _migrate_bookings(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            space_id INTEGER NOT NULL,
+            renter_id INTEGER NOT NULL,
+            start_time TIMESTAMP NOT NULL,
+            end_time TIMESTAMP NOT NULL,
+            total_price DECIMAL(10, 2) DEFAULT 0,
+            status TEXT DEFAULT 'confirmed' CHECK(status IN ('confirmed', 'cancelled')),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (space_id) REFERENCES places (id),
+            FOREIGN KEY (renter_id) REFERENCES users (id)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_space_time ON bookings(space_id, start_time, end_time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_renter ON bookings(renter_id)")
+
+
+def _migrate_space_availability(conn: sqlite3.Connection) -> None:
+    # Per-day bitmaps of booked 15-minute slots, derived from confirmed bookings
+    availability_exists = _table_exists(conn, "space_availability")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS space_availability (
+            space_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            booked_slots BLOB NOT NULL,
+            PRIMARY KEY (space_id, day),
+            FOREIGN KEY (space_id) REFERENCES places (id)
+        ) WITHOUT ROWID
+    """)
+    if not availability_exists:
+        _rebuild_availability(conn)
+
+
+def _migrate_places_rtree(conn: sqlite3.Connection) -> None:
+    # R*Tree spatial index over place coordinates, kept in sync with places by triggers
+    rtree_exists = _table_exists(conn, "places_rtree")
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree USING rtree(
+            id,
+            min_lat, max_lat,
+            min_lng, max_lng
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_rtree_insert AFTER INSERT ON places
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO places_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_rtree_update AFTER UPDATE OF latitude, longitude ON places
+        BEGIN
+            DELETE FROM places_rtree WHERE id = OLD.id;
+            INSERT INTO places_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_rtree_delete AFTER DELETE ON places
+        BEGIN
+            DELETE FROM places_rtree WHERE id = OLD.id;
+        END
+    """)
+    if not rtree_exists:
+        # Backfill places created before the spatial index existed
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS notifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_email TEXT NOT NULL,
-                title TEXT NOT NULL,
-                message TEXT NOT NULL,
-                type TEXT DEFAULT 'info',
-                is_read BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
+            INSERT INTO places_rtree (id, min_lat, max_lat, min_lng, max_lng)
+            SELECT id, latitude, latitude, longitude, longitude
+            FROM places
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
         """)
 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS user_verifications (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_email TEXT NOT NULL UNIQUE,
-                status TEXT DEFAULT 'pending',
-                profile_photo_url TEXT,
-                id_document_url TEXT,
-                vehicle_registration_url TEXT,
-                verification_notes TEXT,
-                verified_at TIMESTAMP,
-                verified_by TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_email) REFERENCES users (email)
-            )
-        """)
 
+def _migrate_places_fts(conn: sqlite3.Connection) -> None:
+    # FTS5 full-text index over place text, external content kept in sync by triggers
+    fts_exists = _table_exists(conn, "places_fts")
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(
+            title, description, address,
+            content = 'places', content_rowid = 'id',
+            tokenize = 'porter unicode61'
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_fts_insert AFTER INSERT ON places
+        BEGIN
+            INSERT INTO places_fts (rowid, title, description, address)
+            VALUES (NEW.id, NEW.title, NEW.description, NEW.address);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_fts_update AFTER UPDATE OF title, description, address ON places
+        BEGIN
+            INSERT INTO places_fts (places_fts, rowid, title, description, address)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.address);
+            INSERT INTO places_fts (rowid, title, description, address)
+            VALUES (NEW.id, NEW.title, NEW.description, NEW.address);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_fts_delete AFTER DELETE ON places
+        BEGIN
+            INSERT INTO places_fts (places_fts, rowid, title, description, address)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description, OLD.address);
+        END
+    """)
+    if not fts_exists:
+        conn.execute("INSERT INTO places_fts (places_fts) VALUES ('rebuild')")
+
+
+def _migrate_place_tags(conn: sqlite3.Connection) -> None:
+    # Normalized tag index; replaces decoding the places.tags JSON column on every read
+    place_tags_exists = _table_exists(conn, "place_tags")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_tags (
+            tag TEXT NOT NULL,
+            place_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (tag, place_id),
+            FOREIGN KEY (place_id) REFERENCES places (id)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_place_tags_place ON place_tags(place_id, position)")
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_tags_delete AFTER DELETE ON places
+        BEGIN
+            DELETE FROM place_tags WHERE place_id = OLD.id;
+        END
+    """)
+    if not place_tags_exists:
+        # Backfill from the legacy JSON column, keeping each place's tag order
         conn.execute("""
-            CREATE TABLE IF NOT EXISTS user_ratings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                rater_id INTEGER NOT NULL,
-                ratee_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (rater_id) REFERENCES users (id),
-                FOREIGN KEY (ratee_id) REFERENCES users (id)
-            )
+            INSERT OR IGNORE INTO place_tags (tag, place_id, position)
+            SELECT TRIM(j.value), p.id, j.key
+            FROM places p, json_each(p.tags) j
+            WHERE json_valid(p.tags) AND json_type(p.tags) = 'array'
+            AND j.type = 'text' AND TRIM(j.value) != ''
         """)
 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS place_ratings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                place_id INTEGER NOT NULL,
-                rating INTEGER NOT NULL CHECK(rating >= 1 AND rating <= 5),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (id),
-                FOREIGN KEY (place_id) REFERENCES places (id)
-            )
-        """)
 
-        # Create indexes for better performance
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_license_plate ON users(license_plate)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_places_latitude ON places(latitude)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_places_longitude ON places(longitude)")
-
-        # Create indexes for rating tables
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_user_ratings_rater ON user_ratings(rater_id)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_user_ratings_ratee ON user_ratings(ratee_id)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_place_ratings_user ON place_ratings(user_id)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_place_ratings_place ON place_ratings(place_id)")
-
-        # Add price_per_hour column if it doesn't exist (for existing databases)
-        cursor = conn.cursor()
-
-        # Add price_per_hour column to places
-        cursor.execute("PRAGMA table_info(places)")
-        places_columns = [column[1] for column in cursor.fetchall()]
-        if "price_per_hour" not in places_columns:
-            conn.execute("ALTER TABLE places ADD COLUMN price_per_hour DECIMAL(10, 2) DEFAULT 0")
-
-        # Add user_type column to users table if it doesn't exist
-        cursor.execute("PRAGMA table_info(users)")
-        users_columns = [column[1] for column in cursor.fetchall()]
-        if "user_type" not in users_columns:
-            conn.execute("ALTER TABLE users ADD COLUMN user_type TEXT DEFAULT 'parker' CHECK(user_type IN ('parker', 'provider', 'both'))")
-
-        # Add tags column to places table if it doesn't exist
-        cursor.execute("PRAGMA table_info(places)")
-        places_columns = [column[1] for column in cursor.fetchall()]
-        if "tags" not in places_columns:
-            conn.execute("ALTER TABLE places ADD COLUMN tags TEXT DEFAULT '[]'")
-
-        # Add units_preference column to users table if it doesn't exist
-        cursor.execute("PRAGMA table_info(users)")
-        users_columns = [column[1] for column in cursor.fetchall()]
-        if "units_preference" not in users_columns:
-            conn.execute("ALTER TABLE users ADD COLUMN units_preference TEXT DEFAULT 'imperial' CHECK(units_preference IN ('metric', 'imperial'))")
-
-        conn.commit()
+def _migrate_rating_aggregates(conn: sqlite3.Connection) -> None:
+    # Denormalized rating aggregates, maintained by the rating CRUD helpers.
+    # Adding a column with a constant default is O(1); existing rows are filled in online.
+    for table in ("places", "users"):
+        if _add_column(conn, table, "rating_sum", "INTEGER NOT NULL DEFAULT 0"):
+            _add_column(conn, table, "rating_count", "INTEGER NOT NULL DEFAULT 0")
+            _schedule_backfill(conn, f"{table}_rating_aggregates")
+
+
+def _migrate_place_clusters(conn: sqlite3.Connection) -> None:
+    # Hierarchical grid of marker clusters, maintained by the place and rating CRUD helpers
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS place_clusters (
+            level INTEGER NOT NULL,
+            x INTEGER NOT NULL,
+            y INTEGER NOT NULL,
+            place_count INTEGER NOT NULL,
+            lat_sum REAL NOT NULL,
+            lng_sum REAL NOT NULL,
+            min_price REAL NOT NULL,
+            rating_sum INTEGER NOT NULL,
+            rating_count INTEGER NOT NULL,
+            PRIMARY KEY (level, x, y)
+        ) WITHOUT ROWID
+    """)
+    _schedule_backfill(conn, "place_clusters")
+
+
+def _migrate_notification_counters(conn: sqlite3.Connection) -> None:
+    # Covers both the per-user listing and the unread filter
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notifications_user_read_created ON notifications(user_email, is_read, created_at)")
+    # Per-user unread counter, maintained by the notification CRUD helpers
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notification_counters (
+            user_email TEXT PRIMARY KEY,
+            unread_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO notification_counters (user_email, unread_count)
+        SELECT user_email, COUNT(*) FROM notifications WHERE is_read = 0 GROUP BY user_email
+    """)
+    # Old read notifications are moved here in batches by archive_read_notifications
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notifications_archive (
+            id INTEGER PRIMARY KEY,
+            user_email TEXT NOT NULL,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            type TEXT,
+            is_read BOOLEAN,
+            created_at TIMESTAMP,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _migrate_places_rtree_aux(conn: sqlite3.Connection) -> None:
+    # Second R*Tree whose auxiliary columns let counts be answered from the index alone.
+    # Exact coordinates are kept too: the R*Tree bounds are 32-bit floats. Triggers keep
+    # new writes current; existing places are copied in online by a backfill.
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree_aux USING rtree(
+            id,
+            min_lat, max_lat,
+            min_lng, max_lng,
+            +latitude, +longitude,
+            +is_published, +price_per_hour
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_rtree_aux_insert AFTER INSERT ON places
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO places_rtree_aux (id, min_lat, max_lat, min_lng, max_lng, latitude, longitude, is_published, price_per_hour)
+            VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude,
+                    NEW.latitude, NEW.longitude, NEW.is_published, NEW.price_per_hour);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_rtree_aux_update AFTER UPDATE OF latitude, longitude, is_published, price_per_hour ON places
+        BEGIN
+            DELETE FROM places_rtree_aux WHERE id = OLD.id;
+            INSERT INTO places_rtree_aux (id, min_lat, max_lat, min_lng, max_lng, latitude, longitude, is_published, price_per_hour)
+            SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude,
+                   NEW.latitude, NEW.longitude, NEW.is_published, NEW.price_per_hour
+            WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS places_rtree_aux_delete AFTER DELETE ON places
+        BEGIN
+            DELETE FROM places_rtree_aux WHERE id = OLD.id;
+        END
+    """)
+    _schedule_backfill(conn, "places_rtree_aux")
+
+
+def _fill_places_rtree_aux(conn: sqlite3.Connection, lo: int, hi: int) -> None:
+    # REPLACE: places written since the migration are already indexed by the triggers
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO places_rtree_aux (id, min_lat, max_lat, min_lng, max_lng, latitude, longitude, is_published, price_per_hour)
+        SELECT id, latitude, latitude, longitude, longitude, latitude, longitude, is_published, price_per_hour
+        FROM places
+        WHERE id > ? AND id <= ? AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """,
+        (lo, hi),
+    )
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+MIGRATIONS = [
+    Migration(1, "core_tables", _migrate_core_tables),
+    Migration(2, "bookings", _migrate_bookings),
+    Migration(3, "space_availability", _migrate_space_availability),
+    Migration(4, "places_rtree", _migrate_places_rtree),
+    Migration(5, "places_fts", _migrate_places_fts),
+    Migration(6, "place_tags", _migrate_place_tags),
+    Migration(7, "rating_aggregates", _migrate_rating_aggregates),
+    Migration(8, "place_clusters", _migrate_place_clusters),
+    Migration(9, "notification_counters", _migrate_notification_counters),
+    Migration(10, "places_rtree_aux", _migrate_places_rtree_aux),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+class Backfill(NamedTuple):
+    """Fills derived data for rows with lo < id <= hi of table"""
+
+    table: str
+    apply: Callable[[sqlite3.Connection, int, int], Any]
+
+
+BACKFILLS = {
+    "place_clusters": Backfill("places", lambda conn, lo, hi: _cluster_add_range(conn, lo, hi)),
+    # Cluster cells hold the places' stored aggregates, so each batch moves them by what it corrects
+    "places_rating_aggregates": Backfill("places", lambda conn, lo, hi: _reconcile_rating_aggregates(conn, "places", (lo, hi), follow_clusters=True)),
+    "users_rating_aggregates": Backfill("users", lambda conn, lo, hi: _reconcile_rating_aggregates(conn, "users", (lo, hi))),
+    "places_rtree_aux": Backfill("places", _fill_places_rtree_aux),
+}
+
+
+def _schema_state(conn: sqlite3.Connection) -> tuple[int, bool]:
+    """Current schema version and whether backfills are pending, in a single query"""
+    try:
+        row = conn.execute("SELECT (SELECT MAX(version) FROM schema_version), EXISTS (SELECT 1 FROM schema_backfills)").fetchone()
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+        return 0, False
+    return row[0] or 0, bool(row[1])
+
+
+def migrate() -> int:
+    """Apply pending schema migrations; returns how many this process applied.
+
+    An up-to-date database costs one read. Otherwise each step runs under
+    BEGIN IMMEDIATE and re-checks the version first, so when many workers start
+    at once exactly one applies each step and the others skip it.
+    """
+    with get_db() as conn:
+        version, _ = _schema_state(conn)
+    if version >= SCHEMA_VERSION:
+        return 0
+
+    applied = 0
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        with get_db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_backfills (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL,
+                    max_id INTEGER NOT NULL
+                )
+            """)
+            version, _ = _schema_state(conn)
+            if migration.version <= version:
+                continue  # Another worker got here first
+            migration.apply(conn)
+            conn.execute("INSERT INTO schema_version (version, name) VALUES (?, ?)", (migration.version, migration.name))
+            applied += 1
+    return applied
+
+
+def run_backfills(batch_size: int = DB_BACKFILL_BATCH_SIZE, stop: threading.Event | None = None) -> int:
+    """Work through pending online backfills in small batches; returns batches applied.
+
+    Each batch is its own short write transaction over an id range, so live
+    traffic interleaves with the backfill instead of waiting for the whole table.
+    Progress is stored in schema_backfills: an interrupted backfill resumes where
+    it stopped, and several workers running this at once share the work.
+    """
+    batches = 0
+    while stop is None or not stop.is_set():
+        with get_db() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"""
+                SELECT name, last_id, max_id FROM schema_backfills
+                WHERE name IN ({", ".join("?" * len(BACKFILLS))})
+                ORDER BY name
+                LIMIT 1
+            """,
+                list(BACKFILLS),
+            ).fetchone()
+            if row is None:
+                return batches
+            backfill = BACKFILLS[row["name"]]
+            upper = min(row["last_id"] + max(1, batch_size), row["max_id"])
+            backfill.apply(conn, row["last_id"], upper)
+            if upper >= row["max_id"]:
+                conn.execute("DELETE FROM schema_backfills WHERE name = ?", (row["name"],))
+            else:
+                conn.execute("UPDATE schema_backfills SET last_id = ? WHERE name = ?", (upper, row["name"]))
+        clear_lookup_caches()
+        batches += 1
+    return batches
+
+
+_backfill_stop = threading.Event()
+
+
+def start_backfills() -> threading.Thread | None:
+    """Run pending backfills on a background thread; returns None when there are none"""
+    with get_db() as conn:
+        _, pending = _schema_state(conn)
+    if not pending:
+        return None
+    _backfill_stop.clear()
+    thread = threading.Thread(target=run_backfills, kwargs={"stop": _backfill_stop}, name="db-backfill", daemon=True)
+    thread.start()
+    return thread
+
+
+def init_database():
+    """Bring the database schema up to date and finish any pending backfills"""
+    migrate()
+    run_backfills()
 
 
 @contextmanager
 def get_db():
-    """Database connection context manager"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # This makes rows behave like dicts
+    """Database connection context manager backed by the connection pool.
+
+    Nested calls in the same thread reuse the outer connection and join its
+    transaction; only the outermost block commits or rolls back.
+    """
+    pool = get_pool()
+    held = pool.held()
+    if held is not None:
+        yield held.conn
+        return
+
+    pooled = pool.acquire()
+    discard = False
     try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
+        yield pooled.conn
+        pooled.conn.commit()
+    except BaseException:
+        try:
+            pooled.conn.rollback()
+        except sqlite3.Error:
+            discard = True
         raise
     finally:
-        conn.close()
+        pool.release(pooled, discard=discard)
+
+
+class WriteQueue:
+    """Single writer thread that applies queued write jobs in batched transactions.
+
+    Jobs queued while a batch is running are picked up together: each runs in
+    its own savepoint, so a failing job only rolls back its own changes, and the
+    whole batch shares one BEGIN IMMEDIATE/COMMIT. Readers keep using their own
+    pooled connections and, under WAL, are never blocked by the writer.
+    """
+
+    def __init__(self, max_batch: int = DB_WRITE_BATCH_SIZE):
+        self.max_batch = max(1, max_batch)
+        self._jobs: queue.SimpleQueue[tuple[Callable[[sqlite3.Connection], Any], Future[Any]] | None] = queue.SimpleQueue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, job: Callable[[sqlite3.Connection], T]) -> "Future[T]":
+        """Queue a job; its future resolves once the batch containing it has committed"""
+        if self._closed:
+            raise sqlite3.OperationalError("Write queue is closed")
+        future: Future[T] = Future()
+        self._jobs.put((job, future))
+        return future
+
+    def close(self) -> None:
+        """Apply the jobs already queued, then stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._jobs.put(None)
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._jobs.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._apply(batch)
+            if stop:
+                return
+
+    def _apply(self, batch: list[tuple[Callable[[sqlite3.Connection], Any], Future[Any]]]) -> None:
+        outcomes: list[tuple[Future[Any], Any, Exception | None]] = []
+        try:
+            with get_db() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for job, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    conn.execute("SAVEPOINT write_job")
+                    try:
+                        result = job(conn)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO write_job")
+                        outcomes.append((future, None, e))
+                    else:
+                        outcomes.append((future, result, None))
+                    conn.execute("RELEASE write_job")
+        except BaseException as e:
+            # BEGIN or COMMIT failed, so nothing in the batch was written
+            for _, future in batch:
+                if not future.done():
+                    if future.running():
+                        future.set_exception(e)
+                    else:
+                        future.cancel()
+            return
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+_write_queue: WriteQueue | None = None
+_write_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> WriteQueue:
+    """Return the process-wide write queue, starting its writer thread on first use"""
+    global _write_queue
+    with _write_queue_lock:
+        if _write_queue is None or _write_queue.closed:
+            _write_queue = WriteQueue()
+        return _write_queue
+
+
+def close_write_queue() -> None:
+    """Flush queued writes and stop the writer thread"""
+    global _write_queue
+    with _write_queue_lock:
+        write_queue, _write_queue = _write_queue, None
+    if write_queue is not None:
+        write_queue.close()
+
+
+def run_write(job: Callable[[sqlite3.Connection], T]) -> T:  # noqa: UP047 - TypeVar keeps the module importable on 3.11
+    """Run a small write transaction through the write queue and return its result.
+
+    Inside an open get_db() block (including on the writer thread itself) the
+    job runs inline on that connection instead, joining the caller's transaction.
+    """
+    held = get_pool().held()
+    if held is not None:
+        return job(held.conn)
+    if not DB_WRITE_QUEUE:
+        with get_db() as conn:
+            return job(conn)
+    return get_write_queue().submit(job).result()
+
+
+class TTLCache(Generic[K, V]):  # noqa: UP046 - TypeVars keep the module importable on 3.11
+    """Thread-safe LRU cache whose entries also expire after a fixed TTL.
+
+    Writers invalidate keys after their transaction commits. Every invalidation
+    bumps a generation counter, and put() drops values read under an older
+    generation, so a lookup racing a write cannot re-cache the row it replaced.
+    """
+
+    def __init__(self, max_size: int = LOOKUP_CACHE_SIZE, ttl: float = LOOKUP_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def generation(self) -> int:
+        """Token to pass to put() for a value about to be read from the database"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+            self._misses += 1
+            return None
+
+    def put(self, key: K, value: V, generation: int) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[V], bool]) -> None:
+        """Drop every entry whose value matches, for writes that only know a secondary key"""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+
+_place_cache: TTLCache[int, dict[str, Any]] = TTLCache()
+_user_cache: TTLCache[str, dict[str, Any]] = TTLCache()
+_tile_cache: TTLCache[tuple[int, int], list[dict[str, Any]]] = TTLCache(max_size=SEARCH_TILE_CACHE_SIZE)
+
+
+def clear_lookup_caches() -> None:
+    """Drop all cached place, user and search tile lookups"""
+    _place_cache.clear()
+    _user_cache.clear()
+    _tile_cache.clear()
+
+
+def lookup_cache_stats() -> dict[str, dict[str, int]]:
+    """Size and hit/miss/eviction counters of the lookup caches"""
+    return {"places": _place_cache.stats(), "users": _user_cache.stats(), "search_tiles": _tile_cache.stats()}
 
 
 # User CRUD operations
@@ -212,25 +1123,23 @@ def get_user_by_license_plate(license_plate: str) -> dict[str, Any] | None:
 
 
 def get_user_by_email(email: str) -> dict[str, Any] | None:
-    """Get user by email with rating statistics"""
+    """Get user by email with rating statistics, served from the lookup cache when fresh"""
+    cached = _user_cache.get(email)
+    if cached is not None:
+        return dict(cached)
+    generation = _user_cache.generation()
     with get_db() as conn:
         cursor = conn.execute(
             """
-            SELECT u.*,
-                   COALESCE(AVG(ur.rating), 0) as average_rating,
-                   COUNT(ur.rating) as rating_count
-            FROM users u
-            LEFT JOIN user_ratings ur ON u.id = ur.ratee_id
-            WHERE u.email = ?
-            GROUP BY u.id
+            SELECT * FROM users WHERE email = ?
         """,
             (email,),
         )
         row = cursor.fetchone()
         if row:
             result = dict(row)
-            # Convert to proper types
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
+            result["average_rating"] = _average_rating(result)
+            _user_cache.put(email, dict(result), generation)
             return result
         return None
 
@@ -240,21 +1149,14 @@ def get_user_by_id(user_id: int) -> dict[str, Any] | None:
     with get_db() as conn:
         cursor = conn.execute(
             """
-            SELECT u.*,
-                   COALESCE(AVG(ur.rating), 0) as average_rating,
-                   COUNT(ur.rating) as rating_count
-            FROM users u
-            LEFT JOIN user_ratings ur ON u.id = ur.ratee_id
-            WHERE u.id = ?
-            GROUP BY u.id
+            SELECT * FROM users WHERE id = ?
         """,
             (user_id,),
         )
         row = cursor.fetchone()
         if row:
             result = dict(row)
-            # Convert to proper types
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
+            result["average_rating"] = _average_rating(result)
             return result
         return None
 
@@ -299,7 +1201,9 @@ def update_user(
 
     with get_db() as conn:
         cursor = conn.execute(f"UPDATE users SET {', '.join(updates)} WHERE email = ?", params)
-        return cursor.rowcount > 0
+        updated = cursor.rowcount > 0
+    _user_cache.invalidate(email)
+    return updated
 
 
 # Place CRUD operations
@@ -315,16 +1219,12 @@ def create_place(
     tags: list[str] | None = None,
 ) -> int:
     """Create a new place and return the place ID"""
-    import json
-
-    tags_json = json.dumps(tags or [])
-
     with get_db() as conn:
         cursor = conn.execute(
             """
             INSERT INTO places (title, description, added_by, creator_is_owner,
-                latitude, longitude, address, price_per_hour, tags)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                latitude, longitude, address, price_per_hour)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """,
             (
                 title,
@@ -335,158 +1235,835 @@ def create_place(
                 longitude,
                 address,
                 price_per_hour,
-                tags_json,
             ),
         )
-        return cursor.lastrowid or 0
+        place_id = cursor.lastrowid or 0
+        _set_place_tags(conn, place_id, tags or [])
+        place = _place_state(conn, place_id)
+        _cluster_add(conn, place)
+    _invalidate_tile(place)
+    return place_id
 
 
-def _parse_place_tags(place_dict: dict[str, Any]) -> dict[str, Any]:
-    """Helper function to parse tags JSON in place records"""
-    import json
+def _average_rating(record: dict[str, Any]) -> float | None:
+    """Average rating from the denormalized rating_sum/rating_count columns"""
+    if not record["rating_count"]:
+        return None
+    return record["rating_sum"] / record["rating_count"]
+
+
+def _normalize_tags(tags: list[str]) -> list[str]:
+    """Strip tags and drop blanks and duplicates, keeping first-seen order"""
+    return list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
 
-    if place_dict and "tags" in place_dict:
-        try:
-            place_dict["tags"] = json.loads(place_dict["tags"])
-        except (json.JSONDecodeError, TypeError):
-            place_dict["tags"] = []
-    return place_dict
+
+def _set_place_tags(conn: sqlite3.Connection, place_id: int, tags: list[str]) -> None:
+    """Replace a place's rows in the place_tags index"""
+    conn.execute("DELETE FROM place_tags WHERE place_id = ?", (place_id,))
+    conn.executemany(
+        "INSERT INTO place_tags (tag, place_id, position) VALUES (?, ?, ?)",
+        [(tag, place_id, position) for position, tag in enumerate(_normalize_tags(tags))],
+    )
+
+
+def _attach_tags(conn: sqlite3.Connection, places: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Fill in each place's ``tags`` list from place_tags, batching the lookups"""
+    tags_by_place: dict[int, list[str]] = {place["id"]: [] for place in places}
+    place_ids = list(tags_by_place)
+    for i in range(0, len(place_ids), TAG_QUERY_CHUNK):
+        chunk = place_ids[i : i + TAG_QUERY_CHUNK]
+        cursor = conn.execute(
+            f"""
+            SELECT place_id, tag
+            FROM place_tags
+            WHERE place_id IN ({", ".join("?" * len(chunk))})
+            ORDER BY place_id, position
+        """,
+            chunk,
+        )
+        for row in cursor.fetchall():
+            tags_by_place[row["place_id"]].append(row["tag"])
+    for place in places:
+        place["tags"] = tags_by_place[place["id"]]
+    return places
+
+
+def _tag_filter(tags_all: list[str] | None, tags_any: list[str] | None, id_column: str = "p.id") -> tuple[str, list[Any]]:
+    """SQL conditions on id_column that restrict places to tag matches via the place_tags index"""
+    sql = ""
+    params: list[Any] = []
+    all_tags = _normalize_tags(tags_all or [])
+    if all_tags:
+        sql += f"""
+            AND {id_column} IN (
+                SELECT place_id FROM place_tags
+                WHERE tag IN ({", ".join("?" * len(all_tags))})
+                GROUP BY place_id
+                HAVING COUNT(*) = ?
+            )"""
+        params += [*all_tags, len(all_tags)]
+    any_tags = _normalize_tags(tags_any or [])
+    if any_tags:
+        sql += f"""
+            AND {id_column} IN (SELECT place_id FROM place_tags WHERE tag IN ({", ".join("?" * len(any_tags))}))"""
+        params += any_tags
+    return sql, params
+
+
+def _copy_place(place: dict[str, Any]) -> dict[str, Any]:
+    return {**place, "tags": list(place["tags"])}
 
 
 def get_place_by_id(place_id: int) -> dict[str, Any] | None:
-    """Get place by ID with rating statistics"""
+    """Get place by ID with rating statistics, served from the lookup cache when fresh"""
+    cached = _place_cache.get(place_id)
+    if cached is not None:
+        return _copy_place(cached)
+    generation = _place_cache.generation()
     with get_db() as conn:
         cursor = conn.execute(
             """
-            SELECT p.*,
-                   COALESCE(AVG(pr.rating), 0) as average_rating,
-                   COUNT(pr.rating) as rating_count
+            SELECT p.*
             FROM places p
-            LEFT JOIN place_ratings pr ON p.id = pr.place_id
             WHERE p.id = ?
-            GROUP BY p.id
         """,
             (place_id,),
         )
         row = cursor.fetchone()
         if row:
             result = dict(row)
-            # Convert to proper types
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
-            return _parse_place_tags(result)
+            result["average_rating"] = _average_rating(result)
+            _attach_tags(conn, [result])
+            _place_cache.put(place_id, _copy_place(result), generation)
+            return result
         return None
 
 
-def get_places_by_creator(creator_id: int, skip: int = 0, limit: int = 100) -> list[dict[str, Any]]:
-    """Get places by creator ID with rating statistics"""
+def encode_cursor(place: dict[str, Any]) -> str:
+    """Opaque keyset pagination cursor pointing just past the given place"""
+    import base64
+    import json
+
+    raw = json.dumps([place["created_at"], place["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """Decode a cursor from encode_cursor into (created_at, id); raises ValueError if malformed"""
+    import base64
+    import binascii
+    import json
+
+    try:
+        created_at, place_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(created_at, str) or not isinstance(place_id, int):
+        raise ValueError("Invalid cursor")
+    return created_at, place_id
+
+
+def _list_places(
+    where: str,
+    params: list[Any],
+    skip: int,
+    limit: int,
+    after: tuple[str, int] | None,
+) -> list[dict[str, Any]]:
+    """Newest-first page of places matching where, by OFFSET or by keyset cursor.
+
+    With a cursor the page starts right after the (created_at, id) position, so
+    the composite index seeks straight to it instead of walking skipped rows.
+    """
+    if after is not None:
+        where += " AND (p.created_at, p.id) < (?, ?)"
+        params = [*params, *after]
+        skip = 0
     with get_db() as conn:
         cursor = conn.execute(
-            """
-            SELECT p.*,
-                   COALESCE(AVG(pr.rating), 0) as average_rating,
-                   COUNT(pr.rating) as rating_count
+            f"""
+            SELECT p.*
             FROM places p
-            LEFT JOIN place_ratings pr ON p.id = pr.place_id
-            WHERE p.added_by = ?
-            GROUP BY p.id
-            ORDER BY p.created_at DESC
+            WHERE {where}
+            ORDER BY p.created_at DESC, p.id DESC
             LIMIT ? OFFSET ?
         """,
-            (creator_id, limit, skip),
+            [*params, limit, skip],
         )
         results: list[dict[str, Any]] = []
         for row in cursor.fetchall():
             result = dict(row)
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
-            results.append(_parse_place_tags(result))
-        return results
+            result["average_rating"] = _average_rating(result)
+            results.append(result)
+        return _attach_tags(conn, results)
 
 
-def get_places_by_owner(owner_id: int, skip: int = 0, limit: int = 100) -> list[dict[str, Any]]:
+def get_places_by_creator(
+    creator_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[str, int] | None = None,
+) -> list[dict[str, Any]]:
+    """Get places by creator ID with rating statistics"""
+    return _list_places("p.added_by = ?", [creator_id], skip, limit, after)
+
+
+def get_places_by_owner(
+    owner_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[str, int] | None = None,
+) -> list[dict[str, Any]]:
     """Get places owned by a user (where creator_is_owner=True and added_by=owner_id)"""
+    return _list_places("p.added_by = ? AND p.creator_is_owner = 1", [owner_id], skip, limit, after)
+
+
+def get_published_places(
+    skip: int = 0,
+    limit: int = 100,
+    after: tuple[str, int] | None = None,
+) -> list[dict[str, Any]]:
+    """Get published places with rating statistics.
+
+    Pass ``after=decode_cursor(token)`` for keyset pagination; ``skip`` is ignored then.
+    """
+    return _list_places("p.is_published = 1", [], skip, limit, after)
+
+
+def haversine_m(lat: float, lng: float, lats: npt.NDArray[np.float64], lngs: npt.NDArray[np.float64]) -> npt.NDArray[np.float64]:
+    """Great-circle distance in meters from one point to arrays of points"""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - np.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _unclamped_box(lat: float, lng: float, radius_m: float) -> tuple[float, float, float, float]:
+    # Longitudes may run past ±180 when the circle crosses the antimeridian
+    angular = radius_m / EARTH_RADIUS_M
+    lat_delta = math.degrees(angular)
+    min_lat, max_lat = lat - lat_delta, lat + lat_delta
+    cos_lat = math.cos(math.radians(lat))
+    if min_lat <= -90 or max_lat >= 90 or math.sin(angular) >= cos_lat:
+        # The circle reaches a pole, so it spans every longitude
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    lng_delta = math.degrees(math.asin(math.sin(angular) / cos_lat))
+    return min_lat, max_lat, lng - lng_delta, lng + lng_delta
+
+
+def bounding_box(lat: float, lng: float, radius_m: float) -> tuple[float, float, float, float]:
+    """Smallest lat/lng box (min_lat, max_lat, min_lng, max_lng) containing a circle on the sphere"""
+    min_lat, max_lat, min_lng, max_lng = _unclamped_box(lat, lng, radius_m)
+    return min_lat, max_lat, max(min_lng, -180.0), min(max_lng, 180.0)
+
+
+def bounding_boxes(lat: float, lng: float, radius_m: float) -> list[tuple[float, float, float, float]]:
+    """Like bounding_box, but a circle crossing the antimeridian also gets the box on its far side"""
+    min_lat, max_lat, min_lng, max_lng = _unclamped_box(lat, lng, radius_m)
+    boxes = [(min_lat, max_lat, max(min_lng, -180.0), min(max_lng, 180.0))]
+    if min_lng < -180.0:
+        boxes.append((min_lat, max_lat, min_lng + 360.0, 180.0))
+    if max_lng > 180.0:
+        boxes.append((min_lat, max_lat, -180.0, max_lng - 360.0))
+    return boxes
+
+
+def search_places_by_location(
+    lat: float,
+    lng: float,
+    radius_km: float = 1.0,
+    start_time: datetime | None = None,
+    end_time: datetime | None = None,
+    tags_all: list[str] | None = None,
+    tags_any: list[str] | None = None,
+    text: str | None = None,
+) -> list[dict[str, Any]]:
+    """Search places within radius of given coordinates, nearest first, with rating statistics.
+
+    Each result carries a ``distance_m`` key with its great-circle distance from the search point.
+    If start_time and end_time are given, places booked in any slot of that window are left out.
+    ``tags_all`` keeps places having every listed tag, ``tags_any`` places having at least one.
+    With ``text``, only places matching it in places_fts are kept, best BM25 match first
+    and nearest first among equal matches; each result then also carries ``text_rank``.
+    """
+    # Bounding box search through the places_rtree spatial index; a search
+    # crossing the antimeridian has one box on each side of it
+    boxes = bounding_boxes(lat, lng, radius_km * 1000)
+    match = _fts_query(text) if text else None
+    if match is None and len(boxes) == 1:
+        tiled = _search_tiles(lat, lng, radius_km * 1000, boxes[0], start_time, end_time, tags_all, tags_any)
+        if tiled is not None:
+            return tiled
+    tag_sql, tag_params = _tag_filter(tags_all, tags_any)
+
+    select = "p.*"
+    join = ""
+    if match is not None:
+        select += f", bm25(places_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS text_rank"
+        join = "JOIN places_fts f ON f.rowid = p.id"
+        tag_sql += " AND places_fts MATCH ?"
+        tag_params.append(match)
+
     with get_db() as conn:
-        cursor = conn.execute(
-            """
-            SELECT p.*,
-                   COALESCE(AVG(pr.rating), 0) as average_rating,
-                   COUNT(pr.rating) as rating_count
-            FROM places p
-            LEFT JOIN place_ratings pr ON p.id = pr.place_id
-            WHERE p.added_by = ? AND p.creator_is_owner = 1
-            GROUP BY p.id
-            ORDER BY p.created_at DESC
-            LIMIT ? OFFSET ?
-        """,
-            (owner_id, limit, skip),
-        )
+        rows: list[sqlite3.Row] = []
+        for box in boxes:
+            cursor = conn.execute(
+                f"""
+                SELECT {select}
+                FROM places_rtree r
+                JOIN places p ON p.id = r.id
+                {join}
+                WHERE r.max_lat >= ? AND r.min_lat <= ?
+                AND r.max_lng >= ? AND r.min_lng <= ?
+                AND p.is_published = 1{tag_sql}
+            """,
+                [*box, *tag_params],
+            )
+            rows.extend(cursor.fetchall())
+
+        if not rows:
+            return []
+
+        # Refine the bounding box candidates to the true radius in one vectorized pass
+        lats = np.fromiter((row["latitude"] for row in rows), dtype=np.float64, count=len(rows))
+        lngs = np.fromiter((row["longitude"] for row in rows), dtype=np.float64, count=len(rows))
+        distances = haversine_m(lat, lng, lats, lngs)
+        inside = np.flatnonzero(distances <= radius_km * 1000)
+        if match is not None:
+            # bm25() is lower for better matches; distance breaks ties
+            ranks = np.fromiter((row["text_rank"] for row in rows), dtype=np.float64, count=len(rows))
+            nearest_first = inside[np.lexsort((distances[inside], ranks[inside]))]
+        else:
+            nearest_first = inside[np.argsort(distances[inside], kind="stable")]
+
+        booked: set[int] = set()
+        if start_time is not None and end_time is not None:
+            booked = get_booked_space_ids([rows[i]["id"] for i in inside.tolist()], start_time, end_time)
+
         results: list[dict[str, Any]] = []
-        for row in cursor.fetchall():
+        for i in nearest_first.tolist():
+            if rows[i]["id"] in booked:
+                continue
+            result = dict(rows[i])
+            result["average_rating"] = _average_rating(result)
+            result["distance_m"] = float(distances[i])
+            results.append(result)
+        return _attach_tags(conn, results)
+
+
+def _places_rtree_aux_ready(conn: sqlite3.Connection) -> bool:
+    """Whether places_rtree_aux holds every place, i.e. its backfill has finished"""
+    return conn.execute("SELECT 1 FROM schema_backfills WHERE name = 'places_rtree_aux'").fetchone() is None
+
+
+def _place_count_query(
+    aux_ready: bool,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    tags_all: list[str] | None = None,
+    tags_any: list[str] | None = None,
+) -> tuple[str, list[Any]]:
+    """SQL selecting the coordinates of published places in a bounding box, and its filter parameters.
+
+    The four box parameters (min_lat, max_lat, min_lng, max_lng) come before the
+    returned ones. Until places_rtree_aux is filled, the rows come from places.
+    """
+    # CROSS JOIN keeps the R*Tree as the outer loop rather than scanning published places
+    source = "places_rtree_aux r" if aux_ready else "places_rtree i CROSS JOIN places r ON r.id = i.id"
+    bounds = "r" if aux_ready else "i"
+    filter_sql, params = _tag_filter(tags_all, tags_any, id_column="r.id")
+    if min_price is not None:
+        filter_sql += " AND r.price_per_hour >= ?"
+        params.append(min_price)
+    if max_price is not None:
+        filter_sql += " AND r.price_per_hour <= ?"
+        params.append(max_price)
+    sql = f"""
+        SELECT r.latitude, r.longitude
+        FROM {source}
+        WHERE {bounds}.max_lat >= ? AND {bounds}.min_lat <= ?
+        AND {bounds}.max_lng >= ? AND {bounds}.min_lng <= ?
+        AND r.is_published = 1{filter_sql}
+    """
+    return sql, params
+
+
+def count_places_by_location(
+    lat: float,
+    lng: float,
+    radius_km: float = 1.0,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    tags_all: list[str] | None = None,
+    tags_any: list[str] | None = None,
+) -> int:
+    """Count published places within radius of given coordinates, with the same filters as search.
+
+    Answered from places_rtree_aux alone: coordinates, publication and price are
+    auxiliary columns of the index, so places rows are never read. Tag filters
+    only add lookups in the place_tags index. While the index is still being
+    backfilled, the count joins places instead.
+    """
+    rows: list[sqlite3.Row] = []
+    with get_db() as conn:
+        sql, params = _place_count_query(_places_rtree_aux_ready(conn), min_price, max_price, tags_all, tags_any)
+        # Near the antimeridian the circle has a box on each side of it
+        for box in bounding_boxes(lat, lng, radius_km * 1000):
+            rows.extend(conn.execute(sql, [*box, *params]).fetchall())
+    if not rows:
+        return 0
+    coords = np.array(rows, dtype=np.float64)
+    return int(np.count_nonzero(haversine_m(lat, lng, coords[:, 0], coords[:, 1]) <= radius_km * 1000))
+
+
+def _tile_key(lat: float, lng: float) -> tuple[int, int]:
+    """Geo tile containing a point; tiles are half-open [lo, lo + SEARCH_TILE_DEGREES) in both axes"""
+    return math.floor(lat / SEARCH_TILE_DEGREES), math.floor(lng / SEARCH_TILE_DEGREES)
+
+
+def _invalidate_tile(place: sqlite3.Row | None) -> None:
+    """Drop the cached search tile holding a place, if it has coordinates"""
+    if place is not None and place["latitude"] is not None and place["longitude"] is not None:
+        _tile_cache.invalidate(_tile_key(float(place["latitude"]), float(place["longitude"])))
+
+
+def _place_state(conn: sqlite3.Connection, place_id: int) -> sqlite3.Row | None:
+    """The columns of a place that its search tile and marker clusters depend on"""
+    return conn.execute(
+        "SELECT id, latitude, longitude, is_published, price_per_hour, rating_sum, rating_count FROM places WHERE id = ?",
+        (place_id,),
+    ).fetchone()
+
+
+def _tile_places(conn: sqlite3.Connection, tiles: list[tuple[int, int]]) -> list[dict[str, Any]]:
+    """Published places in the given tiles, loading tiles missing from the cache in one R*Tree query"""
+    places: list[dict[str, Any]] = []
+    missing: list[tuple[int, int]] = []
+    for key in tiles:
+        cached = _tile_cache.get(key)
+        if cached is None:
+            missing.append(key)
+        else:
+            places.extend(cached)
+    if not missing:
+        return places
+
+    generation = _tile_cache.generation()
+    loaded: dict[tuple[int, int], list[dict[str, Any]]] = {key: [] for key in missing}
+    rows = conn.execute(
+        """
+        SELECT p.*
+        FROM places_rtree r
+        JOIN places p ON p.id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ?
+        AND r.max_lng >= ? AND r.min_lng <= ?
+        AND p.is_published = 1
+    """,
+        [
+            min(i for i, _ in missing) * SEARCH_TILE_DEGREES,
+            (max(i for i, _ in missing) + 1) * SEARCH_TILE_DEGREES,
+            min(j for _, j in missing) * SEARCH_TILE_DEGREES,
+            (max(j for _, j in missing) + 1) * SEARCH_TILE_DEGREES,
+        ],
+    ).fetchall()
+    for row in rows:
+        tile = loaded.get(_tile_key(row["latitude"], row["longitude"]))
+        if tile is not None:
             result = dict(row)
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
-            results.append(_parse_place_tags(result))
-        return results
+            result["average_rating"] = _average_rating(result)
+            tile.append(result)
+    _attach_tags(conn, [place for tile in loaded.values() for place in tile])
+    for key, tile in loaded.items():
+        _tile_cache.put(key, tile, generation)
+        places.extend(tile)
+    return places
+
+
+def _search_tiles(
+    lat: float,
+    lng: float,
+    radius_m: float,
+    box: tuple[float, float, float, float],
+    start_time: datetime | None,
+    end_time: datetime | None,
+    tags_all: list[str] | None,
+    tags_any: list[str] | None,
+) -> list[dict[str, Any]] | None:
+    """search_places_by_location assembled from cached geo tiles; None if the box covers too many tiles.
+
+    Searches from nearby map viewports snap to the same tiles, so panning reuses
+    the places already loaded instead of querying the overlapping area again.
+    """
+    min_lat, max_lat, min_lng, max_lng = box
+    (lo_i, lo_j), (hi_i, hi_j) = _tile_key(min_lat, min_lng), _tile_key(max_lat, max_lng)
+    if (hi_i - lo_i + 1) * (hi_j - lo_j + 1) > SEARCH_TILE_MAX_TILES:
+        return None
+    with get_db() as conn:
+        places = _tile_places(conn, [(i, j) for i in range(lo_i, hi_i + 1) for j in range(lo_j, hi_j + 1)])
+
+    all_tags = set(_normalize_tags(tags_all or []))
+    any_tags = set(_normalize_tags(tags_any or []))
+    if all_tags or any_tags:
+        places = [p for p in places if all_tags <= set(p["tags"]) and (not any_tags or any_tags.intersection(p["tags"]))]
+    if not places:
+        return []
+
+    lats = np.fromiter((place["latitude"] for place in places), dtype=np.float64, count=len(places))
+    lngs = np.fromiter((place["longitude"] for place in places), dtype=np.float64, count=len(places))
+    distances = haversine_m(lat, lng, lats, lngs)
+    inside = np.flatnonzero(distances <= radius_m)
+    nearest_first = inside[np.argsort(distances[inside], kind="stable")]
+
+    booked: set[int] = set()
+    if start_time is not None and end_time is not None:
+        booked = get_booked_space_ids([places[i]["id"] for i in inside.tolist()], start_time, end_time)
+
+    results: list[dict[str, Any]] = []
+    for i in nearest_first.tolist():
+        if places[i]["id"] in booked:
+            continue
+        result = _copy_place(places[i])
+        result["distance_m"] = float(distances[i])
+        results.append(result)
+    return results
+
+
+def _fts_query(text: str) -> str | None:
+    """FTS5 MATCH expression for free text: any word, each as a quoted prefix term.
+
+    Quoting keeps user input from being read as FTS5 query syntax.
+    """
+    import re
+
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " OR ".join(f'"{word}"*' for word in dict.fromkeys(words))
+
 
+def rebuild_search_index() -> int:
+    """Rebuild places_fts from the places table and merge its segments; returns rows indexed.
+
+    Triggers keep the index current row by row; run this after bulk imports that
+    bypass them or to compact the index.
+    """
+    with get_db() as conn:
+        conn.execute("INSERT INTO places_fts (places_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO places_fts (places_fts) VALUES ('optimize')")
+        return conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+
+
+def get_nearest_places(
+    lat: float,
+    lng: float,
+    k: int = 10,
+    min_price: float | None = None,
+    max_price: float | None = None,
+) -> list[dict[str, Any]]:
+    """Get the k nearest published places, nearest first, without needing a search radius.
+
+    Best-first search over the places_rtree index: the search window grows
+    geometrically and each new ring of candidates goes into a min-heap keyed by
+    exact distance. A candidate is settled once it is no farther than the radius
+    already scanned, so the search stops as soon as k places are settled.
+    """
+    import heapq
+
+    filters = ""
+    filter_params: list[Any] = []
+    if min_price is not None:
+        filters += " AND p.price_per_hour >= ?"
+        filter_params.append(min_price)
+    if max_price is not None:
+        filters += " AND p.price_per_hour <= ?"
+        filter_params.append(max_price)
+
+    heap: list[tuple[float, int]] = []
+    settled: list[tuple[float, int]] = []
+    radius_m = KNN_INITIAL_RADIUS_M
+    previous_boxes: list[tuple[float, float, float, float]] = []
 
-def get_published_places(skip: int = 0, limit: int = 100) -> list[dict[str, Any]]:
-    """Get published places with rating statistics"""
     with get_db() as conn:
+        while len(settled) < k:
+            # Near the antimeridian the window is two boxes, one on each side
+            boxes = bounding_boxes(lat, lng, radius_m)
+            for box in boxes:
+                query = """
+                    SELECT p.id, p.latitude, p.longitude
+                    FROM places_rtree r
+                    JOIN places p ON p.id = r.id
+                    WHERE r.max_lat >= ? AND r.min_lat <= ?
+                    AND r.max_lng >= ? AND r.min_lng <= ?
+                    AND p.is_published = 1
+                """
+                params: list[Any] = [*box]
+                for previous_box in previous_boxes:
+                    # Only the ring between the previous window and this one is new
+                    query += " AND NOT (r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?)"
+                    params.extend(previous_box)
+                rows = conn.execute(query + filters, params + filter_params).fetchall()
+
+                if rows:
+                    lats = np.fromiter((row["latitude"] for row in rows), dtype=np.float64, count=len(rows))
+                    lngs = np.fromiter((row["longitude"] for row in rows), dtype=np.float64, count=len(rows))
+                    for distance, row in zip(haversine_m(lat, lng, lats, lngs).tolist(), rows, strict=True):
+                        heapq.heappush(heap, (distance, row["id"]))
+
+            covers_globe = boxes[0] == (-90.0, 90.0, -180.0, 180.0)
+            while heap and len(settled) < k and (covers_globe or heap[0][0] <= radius_m):
+                settled.append(heapq.heappop(heap))
+            if covers_globe:
+                break
+
+            previous_boxes = boxes
+            radius_m *= 2
+
+        if not settled:
+            return []
+
+        ids = [place_id for _, place_id in settled]
         cursor = conn.execute(
-            """
-            SELECT p.*,
-                   COALESCE(AVG(pr.rating), 0) as average_rating,
-                   COUNT(pr.rating) as rating_count
+            f"""
+            SELECT p.*
             FROM places p
-            LEFT JOIN place_ratings pr ON p.id = pr.place_id
-            WHERE p.is_published = 1
-            GROUP BY p.id
-            ORDER BY p.created_at DESC
-            LIMIT ? OFFSET ?
+            WHERE p.id IN ({", ".join("?" * len(ids))})
         """,
-            (limit, skip),
+            ids,
         )
+        rows_by_id = {row["id"]: row for row in cursor.fetchall()}
+
         results: list[dict[str, Any]] = []
-        for row in cursor.fetchall():
+        for distance, place_id in settled:
+            row = rows_by_id.get(place_id)
+            if row is None:
+                continue  # Deleted while the search was running
             result = dict(row)
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
-            results.append(_parse_place_tags(result))
-        return results
+            result["average_rating"] = _average_rating(result)
+            result["distance_m"] = distance
+            results.append(result)
+        return _attach_tags(conn, results)
 
 
-def search_places_by_location(lat: float, lng: float, radius_km: float = 1.0) -> list[dict[str, Any]]:
-    """Search places within radius of given coordinates with rating statistics"""
-    with get_db() as conn:
-        # Simple bounding box search (for MVP - in production use PostGIS)
-        # 1 degree of latitude ≈ 111 km
-        lat_delta = radius_km / 111.0
-        # 1 degree of longitude varies by latitude
-        import math
+def cluster_cell(lat: float, lng: float, level: int) -> tuple[int, int]:
+    """Web Mercator grid cell (x, y) containing a point at the given cluster level"""
+    n = 1 << level
+    lat = min(max(lat, -CLUSTER_MAX_LATITUDE), CLUSTER_MAX_LATITUDE)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
 
-        lng_delta = radius_km / (111.0 * math.cos(math.radians(lat)))
 
-        cursor = conn.execute(
+def _cell_bounds(x: int, y: int, level: int) -> tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lng, max_lng) of a cluster cell"""
+    n = 1 << level
+
+    def lat_at(row: int) -> float:
+        return math.degrees(math.atan(math.sinh(math.pi * (1.0 - 2.0 * row / n))))
+
+    return lat_at(y + 1), lat_at(y), x / n * 360.0 - 180.0, (x + 1) / n * 360.0 - 180.0
+
+
+def _clustered(place: sqlite3.Row) -> bool:
+    return bool(place["is_published"]) and place["latitude"] is not None and place["longitude"] is not None
+
+
+def _place_cells(place: sqlite3.Row) -> list[tuple[int, int, int]]:
+    """(level, x, y) of every cell containing the place, coarsest level first"""
+    lat, lng = float(place["latitude"]), float(place["longitude"])
+    return [(level, *cluster_cell(lat, lng, level)) for level in range(CLUSTER_MAX_LEVEL + 1)]
+
+
+def _cluster_tracked(conn: sqlite3.Connection, place: sqlite3.Row | None) -> bool:
+    """True if the place is counted in the cluster grid, so its writes must be applied to it.
+
+    While the place_clusters backfill is running, places it has not reached yet
+    are left alone; the backfill counts them in their state at that time.
+    """
+    if place is None or not _clustered(place):
+        return False
+    pending = conn.execute("SELECT last_id, max_id FROM schema_backfills WHERE name = 'place_clusters'").fetchone()
+    return pending is None or not pending["last_id"] < place["id"] <= pending["max_id"]
+
+
+def _cluster_add_rows(conn: sqlite3.Connection, places: Iterable[sqlite3.Row]) -> int:
+    """Count published places into their cells at every level of the cluster grid; returns cells touched"""
+    cells: dict[tuple[int, int, int], list[float]] = {}
+    for place in places:
+        lat, lng = float(place["latitude"]), float(place["longitude"])
+        price = float(place["price_per_hour"] or 0)
+        for cell in _place_cells(place):
+            agg = cells.get(cell)
+            if agg is None:
+                cells[cell] = [1, lat, lng, price, place["rating_sum"], place["rating_count"]]
+            else:
+                agg[0] += 1
+                agg[1] += lat
+                agg[2] += lng
+                agg[3] = min(agg[3], price)
+                agg[4] += place["rating_sum"]
+                agg[5] += place["rating_count"]
+    conn.executemany(
+        """
+        INSERT INTO place_clusters (level, x, y, place_count, lat_sum, lng_sum, min_price, rating_sum, rating_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (level, x, y) DO UPDATE SET
+            place_count = place_count + excluded.place_count,
+            lat_sum = lat_sum + excluded.lat_sum,
+            lng_sum = lng_sum + excluded.lng_sum,
+            min_price = MIN(min_price, excluded.min_price),
+            rating_sum = rating_sum + excluded.rating_sum,
+            rating_count = rating_count + excluded.rating_count
+    """,
+        [(*cell, *agg) for cell, agg in cells.items()],
+    )
+    return len(cells)
+
+
+def _cluster_add_range(conn: sqlite3.Connection, lo: int, hi: int) -> int:
+    """Count the published places with lo < id <= hi into the grid (the place_clusters backfill step)"""
+    rows = conn.execute(
+        """
+        SELECT id, latitude, longitude, is_published, price_per_hour, rating_sum, rating_count
+        FROM places
+        WHERE id > ? AND id <= ? AND is_published = 1 AND latitude IS NOT NULL AND longitude IS NOT NULL
+    """,
+        (lo, hi),
+    )
+    return _cluster_add_rows(conn, rows)
+
+
+def _cluster_add(conn: sqlite3.Connection, place: sqlite3.Row | None) -> None:
+    """Count a published place into its cell at every level of the cluster grid"""
+    if place is not None and _cluster_tracked(conn, place):
+        _cluster_add_rows(conn, [place])
+
+
+def _cluster_remove(conn: sqlite3.Connection, place: sqlite3.Row | None) -> None:
+    """Take a place's previous state out of the cluster grid (call after the places row changed).
+
+    Sums are decremented in place. A minimum cannot be, so where the place may
+    have been the cheapest, the finest cell's min_price is recomputed from the
+    places inside it and each coarser cell's from its four children.
+    """
+    if place is None or not _cluster_tracked(conn, place):
+        return
+    lat, lng = float(place["latitude"]), float(place["longitude"])
+    price = float(place["price_per_hour"] or 0)
+    for level, x, y in reversed(_place_cells(place)):
+        conn.execute(
             """
-            SELECT p.*,
-                   COALESCE(AVG(pr.rating), 0) as average_rating,
-                   COUNT(pr.rating) as rating_count
-            FROM places p
-            LEFT JOIN place_ratings pr ON p.id = pr.place_id
-            WHERE p.latitude BETWEEN ? AND ?
-            AND p.longitude BETWEEN ? AND ?
-            AND p.is_published = 1
-            GROUP BY p.id
+            UPDATE place_clusters
+            SET place_count = place_count - 1, lat_sum = lat_sum - ?, lng_sum = lng_sum - ?,
+                rating_sum = rating_sum - ?, rating_count = rating_count - ?
+            WHERE level = ? AND x = ? AND y = ?
         """,
-            (lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta),
+            (lat, lng, place["rating_sum"], place["rating_count"], level, x, y),
         )
-        results: list[dict[str, Any]] = []
-        for row in cursor.fetchall():
-            result = dict(row)
-            result["average_rating"] = float(result["average_rating"]) if result["rating_count"] > 0 else None
-            results.append(_parse_place_tags(result))
-        return results
+        cell = conn.execute("SELECT place_count, min_price FROM place_clusters WHERE level = ? AND x = ? AND y = ?", (level, x, y)).fetchone()
+        if cell is None:
+            continue
+        if cell["place_count"] <= 0:
+            conn.execute("DELETE FROM place_clusters WHERE level = ? AND x = ? AND y = ?", (level, x, y))
+        elif price <= cell["min_price"]:
+            conn.execute("UPDATE place_clusters SET min_price = ? WHERE level = ? AND x = ? AND y = ?", (_cell_min_price(conn, level, x, y), level, x, y))
+
+
+def _cell_min_price(conn: sqlite3.Connection, level: int, x: int, y: int) -> float:
+    if level < CLUSTER_MAX_LEVEL:
+        row = conn.execute(
+            "SELECT MIN(min_price) FROM place_clusters WHERE level = ? AND x IN (?, ?) AND y IN (?, ?)",
+            (level + 1, 2 * x, 2 * x + 1, 2 * y, 2 * y + 1),
+        ).fetchone()
+        return row[0] if row[0] is not None else 0.0
+    min_lat, max_lat, min_lng, max_lng = _cell_bounds(x, y, level)
+    rows = conn.execute(
+        """
+        SELECT p.latitude, p.longitude, p.price_per_hour
+        FROM places_rtree r
+        JOIN places p ON p.id = r.id
+        WHERE r.max_lat >= ? AND r.min_lat <= ?
+        AND r.max_lng >= ? AND r.min_lng <= ?
+        AND p.is_published = 1
+    """,
+        (min_lat, max_lat, min_lng, max_lng),
+    ).fetchall()
+    prices = [float(row["price_per_hour"] or 0) for row in rows if cluster_cell(row["latitude"], row["longitude"], level) == (x, y)]
+    return min(prices, default=0.0)
+
+
+def _cluster_rating_changed(conn: sqlite3.Connection, place: sqlite3.Row | None, rating_delta: int, count_delta: int) -> None:
+    """Apply a change in a place's rating aggregates to its cells"""
+    if place is None or not _cluster_tracked(conn, place):
+        return
+    conn.executemany(
+        "UPDATE place_clusters SET rating_sum = rating_sum + ?, rating_count = rating_count + ? WHERE level = ? AND x = ? AND y = ?",
+        [(rating_delta, count_delta, *cell) for cell in _place_cells(place)],
+    )
+
+
+def rebuild_place_clusters() -> int:
+    """Rebuild the marker cluster grid from the places table; returns cells written.
+
+    The grid is emptied and refilled by the place_clusters backfill in batches
+    of DB_BACKFILL_BATCH_SIZE places, so writers are never blocked for the whole
+    table. Cells fill in as the batches commit.
+    """
+    with get_db() as conn:
+        conn.execute("DELETE FROM place_clusters")
+        _schedule_backfill(conn, "place_clusters")
+    run_backfills()
+    with get_db() as conn:
+        return conn.execute("SELECT COUNT(*) FROM place_clusters").fetchone()[0]
+
+
+def get_place_clusters(min_lat: float, max_lat: float, min_lng: float, max_lng: float, level: int) -> list[dict[str, Any]]:
+    """Pre-aggregated marker clusters for the grid cells at level overlapping a bounding box.
+
+    Each cluster has its cell, the number of published places in it, their
+    centroid, the lowest hourly price and the average rating over all ratings.
+    A box with min_lng > max_lng crosses the antimeridian: it runs east from
+    min_lng to 180 and on from -180 to max_lng.
+    """
+    level = min(max(level, 0), CLUSTER_MAX_LEVEL)
+    min_x, min_y = cluster_cell(max_lat, min_lng, level)
+    max_x, max_y = cluster_cell(min_lat, max_lng, level)
+    if min_lng <= max_lng:
+        x_ranges = [(min_x, max_x)]
+    elif max_x >= min_x:
+        x_ranges = [(0, (1 << level) - 1)]  # Both sides share a column, so every column is covered
+    else:
+        x_ranges = [(min_x, (1 << level) - 1), (0, max_x)]
+    with get_db() as conn:
+        rows: list[sqlite3.Row] = []
+        for lo_x, hi_x in x_ranges:
+            cursor = conn.execute(
+                """
+                SELECT x, y, place_count, lat_sum, lng_sum, min_price, rating_sum, rating_count
+                FROM place_clusters
+                WHERE level = ? AND x BETWEEN ? AND ? AND y BETWEEN ? AND ?
+            """,
+                (level, lo_x, hi_x, min_y, max_y),
+            )
+            rows.extend(cursor.fetchall())
+        return [
+            {
+                "level": level,
+                "x": row["x"],
+                "y": row["y"],
+                "count": row["place_count"],
+                "lat": row["lat_sum"] / row["place_count"],
+                "lng": row["lng_sum"] / row["place_count"],
+                "min_price": row["min_price"],
+                "average_rating": row["rating_sum"] / row["rating_count"] if row["rating_count"] else None,
+            }
+            for row in rows
+        ]
 
 
 def update_place(place_id: int, **kwargs: Any) -> bool:
-    """Update a place"""
+    """Update a place; pass ``tags`` to replace its tag list"""
     allowed_fields = [
         "title",
         "description",
@@ -505,13 +2082,15 @@ def update_place(place_id: int, **kwargs: Any) -> bool:
             updates.append(f"{field} = ?")
             params.append(value)
 
-    if not updates:
+    tags: list[str] | None = kwargs.get("tags")
+    if not updates and tags is None:
         return False
 
     updates.append("updated_at = CURRENT_TIMESTAMP")
     params.append(place_id)
 
     with get_db() as conn:
+        old = _place_state(conn, place_id)
         cursor = conn.execute(
             f"""
             UPDATE places
@@ -520,14 +2099,30 @@ def update_place(place_id: int, **kwargs: Any) -> bool:
         """,
             params,
         )
-        return cursor.rowcount > 0
+        if cursor.rowcount == 0:
+            return False
+        if tags is not None:
+            _set_place_tags(conn, place_id, tags)
+        new = _place_state(conn, place_id)
+        _cluster_remove(conn, old)
+        _cluster_add(conn, new)
+    _place_cache.invalidate(place_id)
+    _invalidate_tile(old)
+    _invalidate_tile(new)
+    return True
 
 
 def delete_place(place_id: int) -> bool:
     """Delete a place"""
     with get_db() as conn:
+        place = _place_state(conn, place_id)
         cursor = conn.execute("DELETE FROM places WHERE id = ?", (place_id,))
-        return cursor.rowcount > 0
+        deleted = cursor.rowcount > 0
+        if deleted:
+            _cluster_remove(conn, place)
+    _place_cache.invalidate(place_id)
+    _invalidate_tile(place)
+    return deleted
 
 
 # Utility functions
@@ -563,7 +2158,8 @@ def create_license_plate_report(
     space_id: int | None = None,
 ) -> int:
     """Create a new license plate report and return the report ID"""
-    with get_db() as conn:
+
+    def insert(conn: sqlite3.Connection) -> int:
         cursor = conn.execute(
             """
             INSERT INTO license_plate_reports (license_plate, description, reporter_email, space_id)
@@ -573,6 +2169,8 @@ def create_license_plate_report(
         )
         return cursor.lastrowid or 0
 
+    return run_write(insert)
+
 
 # User Rating CRUD operations
 def create_user_rating(
@@ -582,7 +2180,8 @@ def create_user_rating(
     description: str | None = None,
 ) -> int:
     """Create a new user rating and return the rating ID"""
-    with get_db() as conn:
+
+    def insert(conn: sqlite3.Connection) -> int:
         cursor = conn.execute(
             """
             INSERT INTO user_ratings (rater_id, ratee_id, rating, description)
@@ -590,8 +2189,16 @@ def create_user_rating(
         """,
             (rater_id, ratee_id, rating, description),
         )
+        conn.execute(
+            "UPDATE users SET rating_sum = rating_sum + ?, rating_count = rating_count + 1 WHERE id = ?",
+            (rating, ratee_id),
+        )
         return cursor.lastrowid or 0
 
+    rating_id = run_write(insert)
+    _user_cache.invalidate_where(lambda user: user["id"] == ratee_id)
+    return rating_id
+
 
 def get_license_plate_reports(limit: int = 100) -> list[dict[str, Any]]:
     """Get all license plate reports"""
@@ -642,21 +2249,15 @@ def get_user_ratings_by_rater(rater_id: int) -> list[dict[str, Any]]:
 def get_user_average_rating(user_id: int) -> float | None:
     """Get the average rating for a user"""
     with get_db() as conn:
-        cursor = conn.execute(
-            """
-            SELECT AVG(rating) FROM user_ratings WHERE ratee_id = ?
-        """,
-            (user_id,),
-        )
-        result = cursor.fetchone()[0]
-        return float(result) if result is not None else None
+        row = conn.execute("SELECT rating_sum, rating_count FROM users WHERE id = ?", (user_id,)).fetchone()
+        return _average_rating(dict(row)) if row else None
 
 
 def get_user_rating_count(user_id: int) -> int:
     """Get the total number of ratings for a user"""
     with get_db() as conn:
-        cursor = conn.execute("SELECT COUNT(*) FROM user_ratings WHERE ratee_id = ?", (user_id,))
-        return cursor.fetchone()[0]
+        row = conn.execute("SELECT rating_count FROM users WHERE id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
 
 
 # Place Rating CRUD operations
@@ -667,7 +2268,8 @@ def create_place_rating(
     description: str | None = None,
 ) -> int:
     """Create a new place rating and return the rating ID"""
-    with get_db() as conn:
+
+    def insert(conn: sqlite3.Connection) -> tuple[int, sqlite3.Row | None]:
         cursor = conn.execute(
             """
             INSERT INTO place_ratings (user_id, place_id, rating, description)
@@ -675,13 +2277,65 @@ def create_place_rating(
         """,
             (user_id, place_id, rating, description),
         )
-        return cursor.lastrowid or 0
+        conn.execute(
+            "UPDATE places SET rating_sum = rating_sum + ?, rating_count = rating_count + 1 WHERE id = ?",
+            (rating, place_id),
+        )
+        place = _place_state(conn, place_id)
+        _cluster_rating_changed(conn, place, rating, 1)
+        return cursor.lastrowid or 0, place
+
+    rating_id, place = run_write(insert)
+    _place_cache.invalidate(place_id)
+    _invalidate_tile(place)
+    return rating_id
 
 
 # Notification operations
+
+# Called with ("created", notification) or ("read", {"user_email", "ids"}) once the change has
+# committed; each payload also carries the user's new "unread_count". Used by the SSE hub.
+NotificationListener = Callable[[str, dict[str, Any]], None]
+_notification_listeners: list[NotificationListener] = []
+
+
+def add_notification_listener(listener: NotificationListener) -> None:
+    if listener not in _notification_listeners:
+        _notification_listeners.append(listener)
+
+
+def remove_notification_listener(listener: NotificationListener) -> None:
+    with suppress(ValueError):
+        _notification_listeners.remove(listener)
+
+
+def _publish_notification_event(event: str, payload: dict[str, Any]) -> None:
+    for listener in list(_notification_listeners):
+        try:
+            listener(event, payload)
+        except Exception as e:
+            print(f"Notification listener failed: {e}")
+
+
+def _count_unread(conn: sqlite3.Connection, user_email: str) -> int:
+    row = conn.execute("SELECT unread_count FROM notification_counters WHERE user_email = ?", (user_email,)).fetchone()
+    return row[0] if row else 0
+
+
+def _add_unread(conn: sqlite3.Connection, user_email: str, delta: int) -> None:
+    conn.execute(
+        """
+        INSERT INTO notification_counters (user_email, unread_count) VALUES (?, ?)
+        ON CONFLICT (user_email) DO UPDATE SET unread_count = unread_count + excluded.unread_count
+    """,
+        (user_email, delta),
+    )
+
+
 def create_notification(user_email: str, title: str, message: str, notification_type: str = "info") -> int:
     """Create a new notification and return the notification ID"""
-    with get_db() as conn:
+
+    def insert(conn: sqlite3.Connection) -> dict[str, Any]:
         cursor = conn.execute(
             """
             INSERT INTO notifications (user_email, title, message, type)
@@ -689,7 +2343,14 @@ def create_notification(user_email: str, title: str, message: str, notification_
         """,
             (user_email, title, message, notification_type),
         )
-        return cursor.lastrowid or 0
+        _add_unread(conn, user_email, 1)
+        notification = dict(conn.execute("SELECT * FROM notifications WHERE id = ?", (cursor.lastrowid,)).fetchone())
+        notification["unread_count"] = _count_unread(conn, user_email)
+        return notification
+
+    notification = run_write(insert)
+    _publish_notification_event("created", notification)
+    return notification["id"]
 
 
 def get_user_notifications(user_email: str, unread_only: bool = False) -> list[dict[str, Any]]:
@@ -710,21 +2371,157 @@ def get_user_notifications(user_email: str, unread_only: bool = False) -> list[d
         return [dict(row) for row in cursor.fetchall()]
 
 
+def create_notifications_bulk(user_emails: list[str], title: str, message: str, notification_type: str = "info") -> int:
+    """Create the same notification for many users in one transaction; returns how many were created.
+
+    Meant for system-wide announcements: rows go in through a single executemany
+    and unread counters are bumped once per user.
+    """
+    if not user_emails:
+        return 0
+
+    def insert(conn: sqlite3.Connection) -> list[dict[str, Any]]:
+        # The write lock is held, so everything past the current maximum id is ours
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM notifications").fetchone()[0]
+        conn.executemany(
+            "INSERT INTO notifications (user_email, title, message, type) VALUES (?, ?, ?, ?)",
+            [(user_email, title, message, notification_type) for user_email in user_emails],
+        )
+        conn.executemany(
+            """
+            INSERT INTO notification_counters (user_email, unread_count) VALUES (?, ?)
+            ON CONFLICT (user_email) DO UPDATE SET unread_count = unread_count + excluded.unread_count
+        """,
+            list(Counter(user_emails).items()),
+        )
+        cursor = conn.execute(
+            """
+            SELECT n.*, c.unread_count
+            FROM notifications n
+            JOIN notification_counters c ON c.user_email = n.user_email
+            WHERE n.id > ?
+            ORDER BY n.id
+        """,
+            (last_id,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+    notifications = run_write(insert)
+    for notification in notifications:
+        _publish_notification_event("created", notification)
+    return len(notifications)
+
+
+def get_user_notifications_after(user_email: str, after_id: int, limit: int = 100) -> list[dict[str, Any]]:
+    """Notifications for a user with id greater than after_id, oldest first (SSE reconnect replay)"""
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            SELECT * FROM notifications
+            WHERE user_email = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """,
+            (user_email, after_id, limit),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
 def mark_notification_read(notification_id: int) -> bool:
     """Mark a notification as read"""
-    with get_db() as conn:
-        cursor = conn.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notification_id,))
-        return cursor.rowcount > 0
+
+    def mark_read(conn: sqlite3.Connection) -> tuple[bool, dict[str, Any] | None]:
+        row = conn.execute("SELECT user_email, is_read FROM notifications WHERE id = ?", (notification_id,)).fetchone()
+        if row is None:
+            return False, None
+        if row["is_read"]:
+            return True, None
+        conn.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notification_id,))
+        _add_unread(conn, row["user_email"], -1)
+        return True, {"user_email": row["user_email"], "ids": [notification_id], "unread_count": _count_unread(conn, row["user_email"])}
+
+    found, change = run_write(mark_read)
+    if change is not None:
+        _publish_notification_event("read", change)
+    return found
+
+
+def mark_notifications_read(user_email: str, ids: list[int] | None = None, before: datetime | None = None) -> int:
+    """Mark a user's notifications read in one UPDATE, by id or everything created up to ``before``.
+
+    Ids belonging to other users are ignored. Returns how many notifications changed.
+    """
+    if ids is not None:
+        if not ids:
+            return 0
+        condition = f"id IN ({', '.join('?' * len(ids))})"
+        params: list[Any] = list(ids)
+    elif before is not None:
+        condition = "created_at <= ?"
+        params = [_to_db_timestamp(before)]
+    else:
+        raise ValueError("Either ids or before is required")
+
+    def mark_read(conn: sqlite3.Connection) -> dict[str, Any] | None:
+        cursor = conn.execute(
+            f"UPDATE notifications SET is_read = 1 WHERE user_email = ? AND is_read = 0 AND {condition} RETURNING id",
+            [user_email, *params],
+        )
+        changed = sorted(row[0] for row in cursor.fetchall())
+        if not changed:
+            return None
+        _add_unread(conn, user_email, -len(changed))
+        return {"user_email": user_email, "ids": changed, "unread_count": _count_unread(conn, user_email)}
+
+    change = run_write(mark_read)
+    if change is None:
+        return 0
+    _publish_notification_event("read", change)
+    return len(change["ids"])
 
 
 def get_unread_notification_count(user_email: str) -> int:
-    """Get count of unread notifications for a user"""
+    """Get count of unread notifications for a user from the notification_counters table"""
     with get_db() as conn:
-        cursor = conn.execute(
-            "SELECT COUNT(*) FROM notifications WHERE user_email = ? AND is_read = 0",
-            (user_email,),
-        )
-        return cursor.fetchone()[0]
+        return _count_unread(conn, user_email)
+
+
+def archive_read_notifications(older_than_days: int = NOTIFICATION_RETENTION_DAYS, batch_size: int = NOTIFICATION_ARCHIVE_BATCH_SIZE) -> int:
+    """Move read notifications older than the cutoff to notifications_archive; returns rows moved.
+
+    Works in short write transactions of at most batch_size rows, so live
+    notification traffic is never blocked for long.
+    """
+    cutoff = _to_db_timestamp(datetime.now(UTC) - timedelta(days=older_than_days))
+    moved = 0
+    last_id = 0
+
+    def archive_batch(conn: sqlite3.Connection) -> list[int]:
+        ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT id FROM notifications WHERE id > ? AND is_read = 1 AND created_at < ? ORDER BY id LIMIT ?",
+                (last_id, cutoff, batch_size),
+            ).fetchall()
+        ]
+        if ids:
+            placeholders = ", ".join("?" * len(ids))
+            conn.execute(
+                f"""
+                INSERT OR REPLACE INTO notifications_archive (id, user_email, title, message, type, is_read, created_at)
+                SELECT id, user_email, title, message, type, is_read, created_at FROM notifications WHERE id IN ({placeholders})
+            """,
+                ids,
+            )
+            conn.execute(f"DELETE FROM notifications WHERE id IN ({placeholders})", ids)
+        return ids
+
+    while True:
+        ids = run_write(archive_batch)
+        moved += len(ids)
+        if len(ids) < batch_size:
+            return moved
+        last_id = ids[-1]
 
 
 def get_place_ratings(place_id: int) -> list[dict[str, Any]]:
@@ -762,35 +2559,353 @@ def get_user_place_ratings(user_id: int) -> list[dict[str, Any]]:
 def get_place_average_rating(place_id: int) -> float | None:
     """Get the average rating for a place"""
     with get_db() as conn:
-        cursor = conn.execute(
-            """
-            SELECT AVG(rating) FROM place_ratings WHERE place_id = ?
-        """,
-            (place_id,),
-        )
-        result = cursor.fetchone()[0]
-        return float(result) if result is not None else None
+        row = conn.execute("SELECT rating_sum, rating_count FROM places WHERE id = ?", (place_id,)).fetchone()
+        return _average_rating(dict(row)) if row else None
 
 
 def get_place_rating_count(place_id: int) -> int:
     """Get the total number of ratings for a place"""
     with get_db() as conn:
-        cursor = conn.execute("SELECT COUNT(*) FROM place_ratings WHERE place_id = ?", (place_id,))
-        return cursor.fetchone()[0]
+        row = conn.execute("SELECT rating_count FROM places WHERE id = ?", (place_id,)).fetchone()
+        return row[0] if row else 0
 
 
 def delete_user_rating(rating_id: int) -> bool:
     """Delete a user rating"""
-    with get_db() as conn:
+
+    def delete(conn: sqlite3.Connection) -> int | None:
+        row = conn.execute("SELECT ratee_id, rating FROM user_ratings WHERE id = ?", (rating_id,)).fetchone()
+        if not row:
+            return None
         cursor = conn.execute("DELETE FROM user_ratings WHERE id = ?", (rating_id,))
-        return cursor.rowcount > 0
+        if cursor.rowcount == 0:
+            return None
+        conn.execute(
+            "UPDATE users SET rating_sum = rating_sum - ?, rating_count = rating_count - 1 WHERE id = ?",
+            (row["rating"], row["ratee_id"]),
+        )
+        return row["ratee_id"]
+
+    ratee_id = run_write(delete)
+    if ratee_id is None:
+        return False
+    _user_cache.invalidate_where(lambda user: user["id"] == ratee_id)
+    return True
 
 
 def delete_place_rating(rating_id: int) -> bool:
     """Delete a place rating"""
-    with get_db() as conn:
+
+    def delete(conn: sqlite3.Connection) -> tuple[int, sqlite3.Row | None] | None:
+        row = conn.execute("SELECT place_id, rating FROM place_ratings WHERE id = ?", (rating_id,)).fetchone()
+        if not row:
+            return None
         cursor = conn.execute("DELETE FROM place_ratings WHERE id = ?", (rating_id,))
-        return cursor.rowcount > 0
+        if cursor.rowcount == 0:
+            return None
+        conn.execute(
+            "UPDATE places SET rating_sum = rating_sum - ?, rating_count = rating_count - 1 WHERE id = ?",
+            (row["rating"], row["place_id"]),
+        )
+        place = _place_state(conn, row["place_id"])
+        _cluster_rating_changed(conn, place, -row["rating"], -1)
+        return row["place_id"], place
+
+    deleted = run_write(delete)
+    if deleted is None:
+        return False
+    place_id, place = deleted
+    _place_cache.invalidate(place_id)
+    _invalidate_tile(place)
+    return True
+
+
+# Rating aggregate maintenance
+_RATING_SOURCES = {
+    "places": ("place_ratings", "place_id"),
+    "users": ("user_ratings", "ratee_id"),
+}
+
+
+def _reconcile_rating_aggregates(conn: sqlite3.Connection, table: str, id_range: tuple[int, int] | None = None, follow_clusters: bool = False) -> int:
+    """Recompute rating_sum/rating_count for rows of table that drifted; return rows fixed.
+
+    With ``id_range=(lo, hi)`` only rows with lo < id <= hi are checked. With
+    ``follow_clusters`` (places only) each correction is also applied to the
+    place's marker cluster cells.
+    """
+    ratings_table, key = _RATING_SOURCES[table]
+    range_sql = ""
+    params: list[Any] = []
+    if id_range is not None:
+        range_sql = "WHERE t.id > ? AND t.id <= ?"
+        params = list(id_range)
+    place_columns = ", t.latitude, t.longitude, t.is_published" if follow_clusters else ""
+    drifted = conn.execute(
+        f"""
+        SELECT t.id, t.rating_sum AS stored_sum, t.rating_count AS stored_count,
+               COALESCE(SUM(r.rating), 0) AS rating_sum,
+               COUNT(r.rating) AS rating_count{place_columns}
+        FROM {table} t
+        LEFT JOIN {ratings_table} r ON r.{key} = t.id
+        {range_sql}
+        GROUP BY t.id
+        HAVING t.rating_sum != COALESCE(SUM(r.rating), 0) OR t.rating_count != COUNT(r.rating)
+    """,
+        params,
+    ).fetchall()
+    conn.executemany(
+        f"UPDATE {table} SET rating_sum = ?, rating_count = ? WHERE id = ?",
+        [(row["rating_sum"], row["rating_count"], row["id"]) for row in drifted],
+    )
+    if follow_clusters:
+        deltas: dict[tuple[int, int, int], list[int]] = {}
+        for row in drifted:
+            if not _cluster_tracked(conn, row):
+                continue
+            for cell in _place_cells(row):
+                delta = deltas.setdefault(cell, [0, 0])
+                delta[0] += row["rating_sum"] - row["stored_sum"]
+                delta[1] += row["rating_count"] - row["stored_count"]
+        conn.executemany(
+            "UPDATE place_clusters SET rating_sum = rating_sum + ?, rating_count = rating_count + ? WHERE level = ? AND x = ? AND y = ?",
+            [(*delta, *cell) for cell, delta in deltas.items()],
+        )
+    return len(drifted)
+
+
+def reconcile_rating_aggregates() -> dict[str, int]:
+    """Rebuild denormalized rating aggregates from the ratings tables; return rows fixed per table"""
+    with get_db() as conn:
+        fixed = {table: _reconcile_rating_aggregates(conn, table) for table in _RATING_SOURCES}
+    if fixed["places"]:
+        # Drift may have reached the cluster cells too, so rebuild them rather than apply deltas
+        rebuild_place_clusters()
+    clear_lookup_caches()
+    return fixed
+
+
+# Booking operations
+def _to_db_timestamp(value: datetime) -> str:
+    """Format a datetime as a sortable UTC timestamp string; naive values are taken as UTC"""
+    if value.tzinfo is not None:
+        value = value.astimezone(UTC).replace(tzinfo=None)
+    return value.isoformat(sep=" ")
+
+
+def _slot_masks(start: str, end: str) -> dict[str, int]:
+    """Bitmask of the 15-minute slots touched by [start, end), keyed by UTC day"""
+    start_dt = datetime.fromisoformat(start)
+    end_dt = datetime.fromisoformat(end)
+    masks: dict[str, int] = {}
+    day = start_dt.date()
+    while datetime.combine(day, datetime.min.time()) < end_dt:
+        day_start = datetime.combine(day, datetime.min.time())
+        first_minute = max(0, (start_dt - day_start) // timedelta(minutes=1))
+        last_minute = min(24 * 60, math.ceil((end_dt - day_start) / timedelta(minutes=1)))
+        first_slot = first_minute // SLOT_MINUTES
+        end_slot = -(-last_minute // SLOT_MINUTES)  # Round up so partially used slots count as booked
+        if end_slot > first_slot:
+            masks[day.isoformat()] = ((1 << end_slot) - 1) ^ ((1 << first_slot) - 1)
+        day += timedelta(days=1)
+    return masks
+
+
+def _read_slot_masks(conn: sqlite3.Connection, space_id: int, first_day: str, last_day: str) -> dict[str, int]:
+    # A range rather than IN (...): one bound parameter per day overflows SQLite's variable limit on long bookings
+    cursor = conn.execute(
+        "SELECT day, booked_slots FROM space_availability WHERE space_id = ? AND day BETWEEN ? AND ?",
+        (space_id, first_day, last_day),
+    )
+    return {row["day"]: int.from_bytes(row["booked_slots"], "little") for row in cursor.fetchall()}
+
+
+def _write_slot_masks(conn: sqlite3.Connection, space_id: int, masks: dict[str, int]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO space_availability (space_id, day, booked_slots) VALUES (?, ?, ?)",
+        [(space_id, day, mask.to_bytes(SLOT_MASK_BYTES, "little")) for day, mask in masks.items()],
+    )
+
+
+def _mark_slots_booked(conn: sqlite3.Connection, space_id: int, start: str, end: str) -> None:
+    """OR a new booking into the space's availability bitmaps (caller holds the write lock)"""
+    masks = _slot_masks(start, end)
+    if not masks:
+        return
+    current = _read_slot_masks(conn, space_id, min(masks), max(masks))
+    _write_slot_masks(conn, space_id, {day: current.get(day, 0) | mask for day, mask in masks.items()})
+
+
+def _rebuild_availability(conn: sqlite3.Connection, space_id: int | None = None, days: tuple[str, str] | None = None) -> None:
+    """Recompute availability bitmaps from confirmed bookings, for one space's days (first, last) or for everything.
+
+    Bits cannot simply be cleared on cancellation because two bookings may share a slot.
+    """
+    query = "SELECT space_id, start_time, end_time FROM bookings WHERE status = 'confirmed'"
+    params: list[Any] = []
+    if space_id is not None and days:
+        first_day, last_day = days
+        query += " AND space_id = ? AND start_time < ? AND end_time > ?"
+        params = [space_id, (date.fromisoformat(last_day) + timedelta(days=1)).isoformat(), first_day]
+        conn.execute("DELETE FROM space_availability WHERE space_id = ? AND day BETWEEN ? AND ?", (space_id, first_day, last_day))
+    else:
+        conn.execute("DELETE FROM space_availability")
+
+    rebuilt: dict[int, dict[str, int]] = {}
+    for row in conn.execute(query, params).fetchall():
+        space_masks = rebuilt.setdefault(row["space_id"], {})
+        for day, mask in _slot_masks(row["start_time"], row["end_time"]).items():
+            if days is None or days[0] <= day <= days[1]:
+                space_masks[day] = space_masks.get(day, 0) | mask
+    for booked_space_id, masks in rebuilt.items():
+        _write_slot_masks(conn, booked_space_id, masks)
+
+
+def get_booked_space_ids(space_ids: list[int], start_time: datetime, end_time: datetime) -> set[int]:
+    """Return the subset of space_ids with a booking in any 15-minute slot touched by [start_time, end_time).
+
+    Works on slot granularity: a space booked until 10:05 counts as busy for the whole 10:00-10:15 slot.
+    """
+    wanted = _slot_masks(_to_db_timestamp(start_time), _to_db_timestamp(end_time))
+    if not space_ids or not wanted:
+        return set()
+    booked: set[int] = set()
+    with get_db() as conn:
+        for i in range(0, len(space_ids), AVAILABILITY_QUERY_CHUNK):
+            chunk = space_ids[i : i + AVAILABILITY_QUERY_CHUNK]
+            cursor = conn.execute(
+                f"""
+                SELECT space_id, day, booked_slots FROM space_availability
+                WHERE space_id IN ({", ".join("?" * len(chunk))})
+                AND day BETWEEN ? AND ?
+            """,
+                [*chunk, min(wanted), max(wanted)],
+            )
+            for row in cursor.fetchall():
+                if int.from_bytes(row["booked_slots"], "little") & wanted.get(row["day"], 0):
+                    booked.add(row["space_id"])
+    return booked
+
+
+def _is_busy_error(error: sqlite3.OperationalError) -> bool:
+    """True if the error means another connection holds the lock (SQLITE_BUSY/SQLITE_LOCKED)"""
+    code = getattr(error, "sqlite_errorcode", 0) & 0xFF
+    return code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED) or "database is locked" in str(error)
+
+
+def create_booking(
+    space_id: int,
+    renter_id: int,
+    start_time: datetime,
+    end_time: datetime,
+    total_price: float = 0.0,
+) -> int | None:
+    """Create a booking and return its ID, or None if it overlaps a confirmed booking.
+
+    The availability check and insert run under BEGIN IMMEDIATE, which takes the
+    database write lock up front, so concurrent requests in any number of worker
+    processes cannot both see a slot as free. Lock contention is retried with
+    jittered exponential backoff.
+    """
+    start = _to_db_timestamp(start_time)
+    end = _to_db_timestamp(end_time)
+    for attempt in range(BOOKING_BUSY_RETRIES + 1):
+        try:
+            return _insert_booking_if_free(space_id, renter_id, start, end, total_price)
+        except sqlite3.OperationalError as e:
+            if not _is_busy_error(e) or attempt == BOOKING_BUSY_RETRIES:
+                raise
+            delay = min(BOOKING_BUSY_BACKOFF_MAX, BOOKING_BUSY_BACKOFF_BASE * 2**attempt)
+            time.sleep(random.uniform(0, delay))
+    return None  # Unreachable: the last attempt either returns or raises
+
+
+def _insert_booking_if_free(space_id: int, renter_id: int, start: str, end: str, total_price: float) -> int | None:
+    with get_db() as conn:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+        # Confirmed bookings of a space never overlap, so only the latest one
+        # starting before the new end time can collide: one probe of idx_bookings_space_time
+        conflict = conn.execute(
+            """
+            SELECT end_time FROM bookings
+            WHERE space_id = ? AND start_time < ? AND status = 'confirmed'
+            ORDER BY start_time DESC
+            LIMIT 1
+        """,
+            (space_id, end),
+        ).fetchone()
+        if conflict and conflict["end_time"] > start:
+            return None
+
+        cursor = conn.execute(
+            """
+            INSERT INTO bookings (space_id, renter_id, start_time, end_time, total_price)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+            (space_id, renter_id, start, end, total_price),
+        )
+        _mark_slots_booked(conn, space_id, start, end)
+        return cursor.lastrowid or 0
+
+
+def get_booking_by_id(booking_id: int) -> dict[str, Any] | None:
+    """Get booking by ID"""
+    with get_db() as conn:
+        cursor = conn.execute("SELECT * FROM bookings WHERE id = ?", (booking_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+
+
+def get_bookings_by_renter(renter_id: int) -> list[dict[str, Any]]:
+    """Get all bookings made by a user"""
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            SELECT * FROM bookings
+            WHERE renter_id = ?
+            ORDER BY start_time
+        """,
+            (renter_id,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def get_bookings_by_space(space_id: int) -> list[dict[str, Any]]:
+    """Get all bookings for a space"""
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            SELECT * FROM bookings
+            WHERE space_id = ?
+            ORDER BY start_time
+        """,
+            (space_id,),
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def cancel_booking(booking_id: int) -> bool:
+    """Mark a booking as cancelled, freeing its time slot"""
+    with get_db() as conn:
+        cursor = conn.execute("UPDATE bookings SET status = 'cancelled' WHERE id = ? AND status = 'confirmed'", (booking_id,))
+        if cursor.rowcount == 0:
+            # Already cancelled still counts as success; only a missing booking fails
+            return conn.execute("SELECT 1 FROM bookings WHERE id = ?", (booking_id,)).fetchone() is not None
+        booking = conn.execute("SELECT space_id, start_time, end_time FROM bookings WHERE id = ?", (booking_id,)).fetchone()
+        masks = _slot_masks(booking["start_time"], booking["end_time"])
+        if masks:
+            _rebuild_availability(conn, booking["space_id"], (min(masks), max(masks)))
+        return True
+
+
+def delete_all_bookings() -> int:
+    """Delete every booking (used by the test reset endpoint); return rows deleted"""
+    with get_db() as conn:
+        cursor = conn.execute("DELETE FROM bookings")
+        conn.execute("DELETE FROM space_availability")
+        return cursor.rowcount
 
 
 # User verification operations
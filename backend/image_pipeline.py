@@ -0,0 +1,137 @@
+"""
+Resized variants of uploaded space photos.
+
+Phones upload multi-megabyte originals, but list views and map popups only
+need a thumbnail and the space modal a medium-sized image. After an upload is
+saved, the original is handed to a process pool that writes WebP and JPEG
+variants next to it and re-saves the original without its EXIF metadata
+(camera GPS coordinates included).
+
+Variant filenames are derived from the original's, so their URLs can be
+computed from an image_url without a lookup. They appear a moment after the
+upload returns, and only images that rendered successfully get them; clients
+fall back to image_url otherwise. Transparent images keep their alpha channel
+in the WebP variants and are flattened onto white for JPEG.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))  # processes resizing uploads
+IMAGE_VARIANTS = {"thumbnail": 160, "medium": 960}  # longest edge in pixels
+IMAGE_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}  # variant file extension -> Pillow format
+IMAGE_QUALITY = 80
+
+
+def variant_path(original: Path, variant: str, extension: str) -> Path:
+    return original.with_name(f"{original.stem}.{variant}.{extension}")
+
+
+def variant_urls(image_url: str | None, upload_dir: Path) -> dict[str, dict[str, str]] | None:
+    """URLs of the resized variants of an /uploads/ image, keyed by variant then file extension.
+
+    None unless the pipeline has rendered them, so an image_url that was never
+    processed or failed to decode does not advertise missing files.
+    """
+    if not image_url:
+        return None
+    directory, _, name = image_url.rpartition("/")
+    if directory != "/uploads" or not name or name.startswith("."):
+        return None
+    # Variants are written in order, so the last one existing means all of them do
+    last_variant, last_extension = list(IMAGE_VARIANTS)[-1], list(IMAGE_FORMATS)[-1]
+    if not variant_path(upload_dir / name, last_variant, last_extension).is_file():
+        return None
+    stem = name.rsplit(".", 1)[0]
+    return {variant: {extension: f"{directory}/{stem}.{variant}.{extension}" for extension in IMAGE_FORMATS} for variant in IMAGE_VARIANTS}
+
+
+def render_variants(source: str) -> list[str]:
+    """Write every variant of the image at source and strip its EXIF metadata. Runs in a worker process."""
+    original = Path(source)
+    with Image.open(original) as image:
+        image_format = image.format
+        # Apply the EXIF orientation to the pixels, since the tag itself is dropped
+        oriented = ImageOps.exif_transpose(image)
+        has_metadata = bool(image.getexif()) or "exif" in image.info
+    has_alpha = oriented.mode in ("RGBA", "LA", "PA") or "transparency" in oriented.info
+    mode = "RGBA" if has_alpha else "RGB"
+    base = oriented.convert(mode) if oriented.mode != mode else oriented
+
+    written: list[str] = []
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = base.copy()
+        resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for extension, output_format in IMAGE_FORMATS.items():
+            target = variant_path(original, variant, extension)
+            # JPEG has no alpha channel; converting would turn transparent pixels black
+            output = _on_white(resized) if has_alpha and output_format == "JPEG" else resized
+            _save(output, target, output_format, quality=IMAGE_QUALITY, optimize=True)
+            written.append(str(target))
+
+    if has_metadata and image_format in ("JPEG", "PNG", "WEBP"):
+        # Saving without exif= leaves the metadata behind
+        _save(base if image_format == "JPEG" else oriented, original, image_format, quality=90)
+    return written
+
+
+def _on_white(image: Image.Image) -> Image.Image:
+    flattened = Image.new("RGB", image.size, "white")
+    flattened.paste(image, mask=image.getchannel("A"))
+    return flattened
+
+
+def _save(image: Image.Image, target: Path, output_format: str, **options: object) -> None:
+    # Write beside the target and rename, so a half-written file is never served
+    partial = target.with_name(f".{target.name}.partial")
+    image.save(partial, format=output_format, **options)
+    partial.replace(target)
+
+
+class ImagePipeline:
+    """Process pool rendering variants in the background, started on first use"""
+
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = max(1, workers)
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    def _pool(self) -> Executor:
+        if self._executor is None:
+            # spawn: forking a process that holds database threads and locks is unsafe
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def process(self, original: Path) -> list[str]:
+        """Render the variants of an uploaded image, returning the written paths (empty on failure)"""
+        self._pending += 1
+        try:
+            return await asyncio.wrap_future(self._pool().submit(render_variants, str(original)))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next upload
+            print(f"Image worker pool failed while rendering {original}: {e}")
+            self.stop()
+            return []
+        except Exception as e:
+            print(f"Error rendering image variants for {original}: {e}")
+            return []
+        finally:
+            self._pending -= 1
+
+    def stop(self) -> None:
+        """Shut the worker processes down, abandoning queued images"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, int]:
+        return {"workers": self.workers, "pending": self._pending}
+
+
+pipeline = ImagePipeline()
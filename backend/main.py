@@ -1,47 +1,51 @@
+import math
+import os
 import time
+from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from datetime import datetime
+from datetime import UTC, datetime
 from pathlib import Path as FilePath
-from typing import Annotated, Any, TypedDict
+from typing import Annotated, Any, Literal
 
 import anyio
+import orjson
+from backend import async_database as adb
 from backend import database as db
+from backend import image_pipeline, notification_hub
 from backend.email_service import EmailService
 from fastapi import (
     BackgroundTasks,
     FastAPI,
     File,
     Form,
+    Header,
     HTTPException,
     Path,
     Query,
     UploadFile,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, EmailStr, Field, ValidationInfo, field_validator
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from pydantic import BaseModel, EmailStr, Field, ValidationInfo, field_validator, model_validator
 from backend.verification_service import DocumentVerificationService
 
+# Rows fetched per database page when streaming space listings
+STREAM_PAGE_SIZE = 500
 
-# TypedDict for booking data
-class BookingData(TypedDict):
-    id: int
-    space_id: int
-    renter_id: int
-    start_time: datetime
-    end_time: datetime
-    total_price: float
-    status: str
-    created_at: str
+# Longest booking or availability search window, bounding the per-day bitmap work
+MAX_BOOKING_DAYS = 366
 
-
-# Temporary bookings storage until we add bookings table
-bookings_db: dict[str, BookingData] = {}
-next_booking_id = 1
+# Cluster grid levels below the map zoom: 2 gives 4x4 cells per 256px map tile
+CLUSTER_ZOOM_OFFSET = 2
 
 # Image upload configuration
 UPLOAD_DIR = FilePath("./uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))  # per file
+UPLOAD_CHUNK_SIZE = 256 * 1024  # bytes held in memory at a time while saving an upload
+UPLOAD_FORM_OVERHEAD = 64 * 1024  # allowance for multipart boundaries, part headers and form fields
 
 # Initialize services
 email_service = EmailService()
@@ -56,6 +60,12 @@ DEV_USER: dict[str, Any] = {
 }
 
 
+def _window_days(start: datetime, end: datetime) -> float:
+    """Length of a time window in days; naive datetimes are taken as UTC, as the database does"""
+    start_utc, end_utc = (value.replace(tzinfo=UTC) if value.tzinfo is None else value for value in (start, end))
+    return (end_utc - start_utc).total_seconds() / 86400
+
+
 class UserRegister(BaseModel):
     email: EmailStr
     name: str = Field(..., min_length=1, max_length=100)
@@ -114,7 +124,9 @@ class ParkingSpaceResponse(BaseModel):
     is_available: bool = True
     requires_verification: bool = False
     image_url: str | None = None
+    image_variants: dict[str, dict[str, str]] | None = None  # Resized copies of image_url: variant -> format -> URL
     created_at: str  # ISO format string with Z suffix
+    distance_m: float | None = None  # Distance from the search point, only set on search results
 
 
 class Booking(BaseModel):
@@ -132,6 +144,12 @@ class Booking(BaseModel):
             return info.data["start_time"]
         return v
 
+    @model_validator(mode="after")
+    def validate_duration(self) -> "Booking":
+        if _window_days(self.start_time, self.end_time) > MAX_BOOKING_DAYS:
+            raise ValueError(f"Bookings can be at most {MAX_BOOKING_DAYS} days long")
+        return self
+
 
 class BookingResponse(BaseModel):
     id: int
@@ -150,6 +168,53 @@ class SearchQuery(BaseModel):
     radius: Annotated[float, Field(gt=0, le=1000)] = 1.0  # km, positive and reasonable max
     min_price: Annotated[float, Field(ge=0)] | None = None
     max_price: Annotated[float, Field(ge=0)] | None = None
+    start_time: datetime | None = None  # Only return spaces free for the whole window
+    end_time: datetime | None = None
+    tags_all: Annotated[list[str], Field(max_length=20)] = []  # Spaces having every one of these tags
+    tags_any: Annotated[list[str], Field(max_length=20)] = []  # Spaces having at least one of these tags
+    q: Annotated[str, Field(max_length=200)] | None = None  # Free text over title, description and address
+
+    @model_validator(mode="after")
+    def validate_time_window(self) -> "SearchQuery":
+        if (self.start_time is None) != (self.end_time is None):
+            raise ValueError("start_time and end_time must be given together")
+        if self.start_time is not None and self.end_time is not None:
+            if (self.start_time.tzinfo is None) != (self.end_time.tzinfo is None):
+                raise ValueError("start_time and end_time must both include a timezone or both omit it")
+            if self.end_time <= self.start_time:
+                raise ValueError("end_time must be after start_time")
+            if _window_days(self.start_time, self.end_time) > MAX_BOOKING_DAYS:
+                raise ValueError(f"Availability windows can be at most {MAX_BOOKING_DAYS} days long")
+        return self
+
+
+class SpaceCluster(BaseModel):
+    level: int
+    x: int
+    y: int
+    count: int
+    lat: float  # Centroid of the spaces in the cell
+    lng: float
+    min_price: float
+    average_rating: float | None = None
+
+
+class SpacesCount(BaseModel):
+    total_spaces: int
+    verified_only_spaces: int
+    public_spaces: int
+
+
+class MarkNotificationsRead(BaseModel):
+    email: str
+    ids: Annotated[list[Annotated[int, Field(ge=1, le=2147483647)]], Field(min_length=1, max_length=1000)] | None = None
+    before: datetime | None = None  # Mark everything created up to this time read
+
+    @model_validator(mode="after")
+    def validate_selection(self) -> "MarkNotificationsRead":
+        if (self.ids is None) == (self.before is None):
+            raise ValueError("Exactly one of ids and before must be given")
+        return self
 
 
 class ReportLicensePlate(BaseModel):
@@ -230,7 +295,8 @@ def get_current_user() -> dict[str, Any]:
 
 async def send_rating_reminder(email: str, place_id: int):
     try:
-        db.create_notification(
+        await adb.run(
+            db.create_notification,
             user_email=email,
             title="Rate your recent parking",
             message=f"Your parking session just ended. Please rate place #{place_id}.",
@@ -243,10 +309,65 @@ async def send_rating_reminder(email: str, place_id: int):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting up Park Place backend...")
-    db.init_database()
-    print("Database initialized")
+    applied = db.migrate()
+    print(f"Database schema at version {db.SCHEMA_VERSION} ({applied} migration(s) applied)")
+    if db.start_backfills() is not None:
+        print("Running schema backfills in the background")
+    notification_hub.hub.start()
     yield
     print("Shutting down...")
+    notification_hub.hub.stop()
+    image_pipeline.pipeline.stop()
+    adb.shutdown()
+    db.close_db_pool()
+
+
+def _upload_body_limit(path: str) -> int | None:
+    """Largest request body accepted by an upload endpoint, or None for other paths"""
+    if path.startswith("/spaces/") and path.endswith("/upload-image"):
+        return UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD
+    if path == "/verification/upload":
+        return 3 * UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD  # profile photo, ID document, registration
+    return None
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects oversized upload bodies with 413 while they are being received.
+
+    The multipart parser spools every part to a temporary file before the
+    endpoint runs, so a per-file check in the endpoint only happens after the
+    whole body is on disk. This refuses a too large Content-Length up front
+    and stops reading a body without one as soon as it passes the limit.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = _upload_body_limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        too_large = f"Upload exceeds the {limit} byte request limit"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await ORJSONResponse({"detail": too_large}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing, which passes HTTPException through
+                    raise HTTPException(status_code=413, detail=too_large)
+            return message
+
+        await self.app(scope, limited_receive, send)
 
 
 app = FastAPI(title="Park Place API", version="0.1.0", lifespan=lifespan)
@@ -254,12 +375,15 @@ app = FastAPI(title="Park Place API", version="0.1.0", lifespan=lifespan)
 # Mount static files for serving uploaded images
 app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 
+# Added before CORS so that its 413 responses still carry the CORS headers
+app.add_middleware(UploadSizeLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:3001"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 
@@ -271,18 +395,20 @@ async def root():
 @app.post("/_test/reset", include_in_schema=False)
 async def reset_database():
     """Reset database for testing - not included in OpenAPI schema"""
-    import os
-
     if os.getenv("DB_PATH") and "test" in os.getenv("DB_PATH", ""):
         # Only allow reset on test databases
-        db.init_database()  # This recreates tables
-        global bookings_db, next_booking_id
-        bookings_db = {}
-        next_booking_id = 1
+        await adb.run(db.init_database)  # This recreates tables
+        await adb.run(db.delete_all_bookings)
         return {"message": "Test database reset"}
     raise HTTPException(status_code=403, detail="Not a test database")
 
 
+@app.get("/_stats/cache", include_in_schema=False)
+async def cache_stats():
+    """Hit/miss counters of the in-process lookup caches, for monitoring"""
+    return {**db.lookup_cache_stats(), "notification_streams": notification_hub.hub.stats(), "image_pipeline": image_pipeline.pipeline.stats()}
+
+
 @app.post(
     "/auth/register",
     response_model=UserResponse,
@@ -301,7 +427,7 @@ async def register(user: UserRegister):
 
     # Check if user already exists and make unique if needed for testing
 
-    existing_user = db.get_user_by_email(user.email)
+    existing_user = await adb.run(db.get_user_by_email, user.email)
     if existing_user:
         # For testing, make it unique
         unique_suffix = str(int(time.time() * 1000000))[-8:]
@@ -315,20 +441,24 @@ async def register(user: UserRegister):
 
     # Create user
     try:
-        user_id = db.create_user(
+        user_id = await adb.run(
+            db.create_user,
             email=user.email,
             username=user.name,
             hashed_password="temp_hash",
             license_plate_state=license_plate_state,
             license_plate=license_plate_number,
         )
+    except HTTPException:
+        raise
     except Exception as e:
         if "UNIQUE constraint failed" in str(e):
             # Try again with unique username
             unique_suffix = str(int(time.time() * 1000000))[-8:]
             user.name = f"{user.name}_{unique_suffix}"
             user.email = f"{user.email}_{unique_suffix}"
-            user_id = db.create_user(
+            user_id = await adb.run(
+                db.create_user,
                 email=user.email,
                 username=user.name,
                 hashed_password="temp_hash",
@@ -371,7 +501,7 @@ async def get_me():
 @app.get("/users/profile", responses={404: {"description": "User not found"}})
 async def get_user_profile(email: str):
     """Get user profile by email from database"""
-    user = db.get_user_by_email(email)
+    user = await adb.run(db.get_user_by_email, email)
     if not user:
         raise HTTPException(status_code=404, detail="User profile not found")
 
@@ -394,7 +524,7 @@ async def update_user_profile(user_data: UserRegister):
     """Update user profile by email"""
     try:
         # Check if user exists
-        user = db.get_user_by_email(user_data.email)
+        user = await adb.run(db.get_user_by_email, user_data.email)
         if not user:
             raise HTTPException(status_code=404, detail="User profile not found")
 
@@ -406,7 +536,8 @@ async def update_user_profile(user_data: UserRegister):
             license_plate_number = user_data.car_license_plate[2:].upper()
 
         # Update the user record
-        success = db.update_user(
+        success = await adb.run(
+            db.update_user,
             email=user_data.email,
             username=user_data.name,
             license_plate=license_plate_number,
@@ -418,7 +549,7 @@ async def update_user_profile(user_data: UserRegister):
             raise HTTPException(status_code=500, detail="Failed to update profile")
 
         # Return updated profile
-        updated_user = db.get_user_by_email(user_data.email)
+        updated_user = await adb.run(db.get_user_by_email, user_data.email)
         if not updated_user:
             raise HTTPException(status_code=404, detail="User not found after update")
         return {
@@ -439,34 +570,124 @@ async def update_user_profile(user_data: UserRegister):
         raise HTTPException(status_code=500, detail="Failed to update profile") from e
 
 
-@app.get("/spaces", response_model=list[ParkingSpaceResponse])
-async def get_spaces(limit: Annotated[int, Query(ge=1, le=10000)] = 100):
-    places = db.get_published_places(limit=limit)
-    return [
-        ParkingSpaceResponse(
-            id=place["id"],
-            owner_id=place["added_by"],
-            title=place["title"],
-            description=place["description"],
-            lat=place["latitude"] or 0.0,
-            lng=place["longitude"] or 0.0,
-            price_per_hour=place.get("price_per_hour", 0.0),
-            tags=[],  # TODO: Add tags system
-            rating=0.0,
-            is_available=True,
-            requires_verification=place.get("requires_verification", False),
-            image_url=None,
-            created_at=place["created_at"] + "Z" if not place["created_at"].endswith("Z") else place["created_at"],
-        )
-        for place in places
-    ]
+@app.get(
+    "/spaces",
+    response_model=list[ParkingSpaceResponse],
+    responses={400: {"description": "Invalid cursor"}},
+)
+async def get_spaces(
+    limit: Annotated[int, Query(ge=1, le=10000)] = 100,
+    cursor: str | None = None,
+):
+    """List published spaces, newest first.
+
+    When more results may follow, the X-Next-Cursor response header holds the
+    cursor to pass for the next page.
+    """
+    after = None
+    if cursor is not None:
+        try:
+            after = db.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor") from None
+
+    places = await adb.run(db.get_published_places, limit=limit, after=after)
+    headers = {"X-Next-Cursor": db.encode_cursor(places[-1])} if len(places) == limit else None
+    return ORJSONResponse([_space_json(place, tags=place["tags"]) for place in places], headers=headers)
+
+
+def _space_json(place: dict[str, Any], tags: list[str]) -> dict[str, Any]:
+    """Encode a places row straight into the ParkingSpaceResponse JSON shape.
+
+    List endpoints return these dicts through ORJSONResponse, which skips
+    building and re-validating a Pydantic model per row. Keys and defaults
+    must stay in step with ParkingSpaceResponse.
+    """
+    created_at: str = place["created_at"]
+    distance_m = place.get("distance_m")
+    return {
+        "id": place["id"],
+        "owner_id": place["added_by"],
+        "title": place["title"],
+        "description": place["description"],
+        "lat": float(place["latitude"] or 0.0),
+        "lng": float(place["longitude"] or 0.0),
+        "price_per_hour": float(place["price_per_hour"] or 0.0),
+        "tags": tags,
+        "rating": 0.0,
+        "is_available": True,
+        "requires_verification": False,
+        "image_url": None,
+        "image_variants": None,
+        "created_at": created_at if created_at.endswith("Z") else created_at + "Z",
+        "distance_m": None if distance_m is None else round(distance_m, 1),
+    }
+
+
+async def _stream_published_spaces(limit: int | None, output_format: str) -> AsyncIterator[bytes]:
+    """Yield published spaces as NDJSON lines or JSON array pieces, one DB page at a time"""
+    after: tuple[str, int] | None = None
+    sent = 0
+    first = True
+    if output_format == "json":
+        yield b"["
+    while limit is None or sent < limit:
+        page_size = STREAM_PAGE_SIZE if limit is None else min(STREAM_PAGE_SIZE, limit - sent)
+        places = await adb.run(db.get_published_places, limit=page_size, after=after)
+        if not places:
+            break
+        items = [orjson.dumps(_space_json(place, tags=place["tags"])) for place in places]
+        if output_format == "json":
+            chunk = b",".join(items)
+            yield chunk if first else b"," + chunk
+        else:
+            yield b"\n".join(items) + b"\n"
+        first = False
+        sent += len(places)
+        after = (places[-1]["created_at"], places[-1]["id"])
+        if len(places) < page_size:
+            break
+    if output_format == "json":
+        yield b"]"
+
+
+@app.get(
+    "/spaces/stream",
+    responses={
+        200: {
+            "description": "Published spaces, newest first, as NDJSON (one ParkingSpaceResponse per line) or a JSON array",
+            "content": {"application/x-ndjson": {}, "application/json": {}},
+        }
+    },
+)
+async def stream_spaces(
+    output_format: Annotated[Literal["ndjson", "json"], Query(alias="format")] = "ndjson",
+    limit: Annotated[int | None, Query(ge=1)] = None,
+):
+    """Stream published spaces without materializing the full list.
+
+    Rows are read in keyset-paginated pages and written as they arrive, so
+    memory stays flat and the first spaces reach the client immediately.
+    """
+    media_type = "application/x-ndjson" if output_format == "ndjson" else "application/json"
+    return StreamingResponse(_stream_published_spaces(limit, output_format), media_type=media_type)
 
 
 @app.post("/spaces/search", response_model=list[ParkingSpaceResponse])
 async def search_spaces(query: SearchQuery):
-    places = db.search_places_by_location(query.lat, query.lng, query.radius)
+    places = await adb.run(
+        db.search_places_by_location,
+        query.lat,
+        query.lng,
+        query.radius,
+        start_time=query.start_time,
+        end_time=query.end_time,
+        tags_all=query.tags_all,
+        tags_any=query.tags_any,
+        text=query.q,
+    )
 
-    results: list[ParkingSpaceResponse] = []
+    results: list[dict[str, Any]] = []
     for place in places:
         price = place.get("price_per_hour", 0.0)
 
@@ -475,35 +696,9 @@ async def search_spaces(query: SearchQuery):
         if query.max_price and price > query.max_price:
             continue
 
-        # Parse tags from JSON string
-        import json
-
-        tags = []
-        if place.get("tags"):
-            try:
-                tags = json.loads(place["tags"]) if isinstance(place["tags"], str) else place["tags"]
-            except (json.JSONDecodeError, TypeError):
-                tags = []
-
-        results.append(
-            ParkingSpaceResponse(
-                id=place["id"],
-                owner_id=place["added_by"],
-                title=place["title"],
-                description=place["description"],
-                lat=place["latitude"] or 0.0,
-                lng=place["longitude"] or 0.0,
-                price_per_hour=price,
-                tags=tags,
-                rating=0.0,
-                is_available=True,
-                requires_verification=place.get("verified_only", False),
-                image_url=None,
-                created_at=place["created_at"] + "Z" if not place["created_at"].endswith("Z") else place["created_at"],
-            )
-        )
+        results.append(_space_json(place, tags=place["tags"]))
 
-    return results
+    return ORJSONResponse(results)
 
 
 @app.get("/spaces/nearby")
@@ -516,11 +711,87 @@ async def get_nearby_spaces(
     return await search_spaces(query)
 
 
+@app.get("/spaces/count", response_model=SpacesCount)
+async def count_spaces(
+    lat: Annotated[float, Query(ge=-90, le=90)],
+    lng: Annotated[float, Query(ge=-180, le=180)],
+    radius: Annotated[float, Query(gt=0, le=1000)] = 1.0,
+    min_price: Annotated[float | None, Query(ge=0)] = None,
+    max_price: Annotated[float | None, Query(ge=0)] = None,
+    tags_all: Annotated[list[str] | None, Query(max_length=20)] = None,
+    tags_any: Annotated[list[str] | None, Query(max_length=20)] = None,
+):
+    """Count published spaces within radius km, with the same price and tag filters as search"""
+    total = await adb.run(
+        db.count_places_by_location,
+        lat,
+        lng,
+        radius,
+        # A zero bound means no bound, as in search_spaces
+        min_price=min_price or None,
+        max_price=max_price or None,
+        tags_all=tags_all,
+        tags_any=tags_any,
+    )
+    # No space requires verification yet (see ParkingSpaceResponse.requires_verification)
+    return SpacesCount(total_spaces=total, verified_only_spaces=0, public_spaces=total)
+
+
+@app.get("/spaces/nearest", response_model=list[ParkingSpaceResponse])
+async def get_nearest_spaces(
+    lat: Annotated[float, Query(ge=-90, le=90)],
+    lng: Annotated[float, Query(ge=-180, le=180)],
+    k: Annotated[int, Query(ge=1, le=100)] = 10,
+    min_price: Annotated[float | None, Query(ge=0)] = None,
+    max_price: Annotated[float | None, Query(ge=0)] = None,
+):
+    """Get the k nearest published spaces, nearest first, without a radius guess"""
+    places = await adb.run(db.get_nearest_places, lat, lng, k=k, min_price=min_price, max_price=max_price)
+    return ORJSONResponse([_space_json(place, tags=place["tags"]) for place in places])
+
+
+def _wrap_longitude(lng: float) -> float:
+    """Longitude in [-180, 180], leaving values already in range untouched"""
+    return lng if -180 <= lng <= 180 else (lng + 180) % 360 - 180
+
+
+@app.get(
+    "/spaces/clusters",
+    response_model=list[SpaceCluster],
+    responses={400: {"description": "Invalid bbox"}},
+)
+async def get_space_clusters(
+    bbox: Annotated[str, Query(description="west,south,east,north in degrees")],
+    zoom: Annotated[int, Query(ge=0, le=22)],
+):
+    """Marker clusters for a map viewport: count, centroid, min price and average rating per grid cell.
+
+    Clusters are read from the place_clusters grid index, so zoomed-out views
+    cost one small range scan instead of loading every space in the viewport.
+    """
+    try:
+        west, south, east, north = (float(value) for value in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid bbox") from None
+    if not (math.isfinite(west) and math.isfinite(east) and -90 <= south <= north <= 90):
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+    # Map clients send viewports crossing the antimeridian either as west > east
+    # or with longitudes continued past ±180; both become west > east here
+    if west <= east and east - west >= 360:
+        west, east = -180.0, 180.0
+    else:
+        west, east = _wrap_longitude(west), _wrap_longitude(east)
+
+    clusters = await adb.run(db.get_place_clusters, south, north, west, east, zoom + CLUSTER_ZOOM_OFFSET)
+    return ORJSONResponse(clusters)
+
+
 @app.post("/spaces", response_model=ParkingSpaceResponse)
 async def create_space(space: ParkingSpace):
     current_user = get_current_user()
 
-    place_id = db.create_place(
+    place_id = await adb.run(
+        db.create_place,
         added_by=current_user["id"],
         title=space.title,
         description=space.description,
@@ -532,7 +803,7 @@ async def create_space(space: ParkingSpace):
         tags=space.tags,
     )
 
-    place = db.get_place_by_id(place_id)
+    place = await adb.run(db.get_place_by_id, place_id)
     if not place:
         raise HTTPException(status_code=500, detail="Failed to create space")
 
@@ -544,11 +815,12 @@ async def create_space(space: ParkingSpace):
         lat=space.lat,
         lng=space.lng,
         price_per_hour=space.price_per_hour,
-        tags=space.tags,
+        tags=place["tags"],
         rating=0.0,
         is_available=True,
         requires_verification=False,  # New spaces don't require verification by default
         image_url=space.image_url,
+        image_variants=image_pipeline.variant_urls(space.image_url, UPLOAD_DIR),
         created_at=place["created_at"] + "Z" if not place["created_at"].endswith("Z") else place["created_at"],
     )
 
@@ -559,7 +831,7 @@ async def create_space(space: ParkingSpace):
     responses={404: {"description": "Space not found"}},
 )
 async def get_space(space_id: Annotated[int, Path(ge=0, le=2147483647)]):
-    place = db.get_place_by_id(space_id)
+    place = await adb.run(db.get_place_by_id, space_id)
     if not place:
         raise HTTPException(status_code=404, detail="Space not found")
 
@@ -571,7 +843,7 @@ async def get_space(space_id: Annotated[int, Path(ge=0, le=2147483647)]):
         lat=place["latitude"] or 0.0,
         lng=place["longitude"] or 0.0,
         price_per_hour=place.get("price_per_hour", 0.0),
-        tags=[],
+        tags=place["tags"],
         rating=0.0,
         is_available=True,
         requires_verification=place.get("requires_verification", False),
@@ -590,23 +862,25 @@ async def get_space(space_id: Annotated[int, Path(ge=0, le=2147483647)]):
 )
 async def update_space(space_id: Annotated[int, Path(ge=0, le=2147483647)], space: ParkingSpace):
     current_user = get_current_user()
-    place = db.get_place_by_id(space_id)
+    place = await adb.run(db.get_place_by_id, space_id)
     if not place:
         raise HTTPException(status_code=404, detail="Space not found")
 
     if place["added_by"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    db.update_place(
+    await adb.run(
+        db.update_place,
         space_id,
         title=space.title,
         description=space.description,
         latitude=space.lat,
         longitude=space.lng,
         price_per_hour=space.price_per_hour,
+        tags=space.tags,
     )
 
-    updated_place = db.get_place_by_id(space_id)
+    updated_place = await adb.run(db.get_place_by_id, space_id)
     if not updated_place:
         raise HTTPException(status_code=404, detail="Space not found after update")
 
@@ -618,11 +892,12 @@ async def update_space(space_id: Annotated[int, Path(ge=0, le=2147483647)], spac
         lat=updated_place["latitude"] or 0.0,
         lng=updated_place["longitude"] or 0.0,
         price_per_hour=space.price_per_hour,
-        tags=space.tags,
+        tags=updated_place["tags"],
         rating=0.0,
         is_available=True,
         requires_verification=updated_place.get("requires_verification", False),
         image_url=space.image_url,
+        image_variants=image_pipeline.variant_urls(space.image_url, UPLOAD_DIR),
         created_at=updated_place["created_at"] + "Z" if not updated_place["created_at"].endswith("Z") else updated_place["created_at"],
     )
 
@@ -636,28 +911,54 @@ async def update_space(space_id: Annotated[int, Path(ge=0, le=2147483647)], spac
 )
 async def delete_space(space_id: Annotated[int, Path(ge=0, le=2147483647)]):
     current_user = get_current_user()
-    place = db.get_place_by_id(space_id)
+    place = await adb.run(db.get_place_by_id, space_id)
     if not place:
         raise HTTPException(status_code=404, detail="Space not found")
 
     if place["added_by"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    db.delete_place(space_id)
+    await adb.run(db.delete_place, space_id)
     return {"message": "Space deleted"}
 
 
+async def save_upload(file: UploadFile, file_path: FilePath) -> int:
+    """Stream an upload to disk in chunks, rejecting it with 413 once it passes UPLOAD_MAX_BYTES.
+
+    This is the per-file limit; the request body as a whole is already bounded
+    by UploadSizeLimitMiddleware while it is received. Returns the number of
+    bytes written. A partially written file is removed on failure.
+    """
+    too_large = HTTPException(status_code=413, detail=f"File exceeds the {UPLOAD_MAX_BYTES} byte upload limit")
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise too_large
+
+    written = 0
+    try:
+        async with await anyio.open_file(file_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > UPLOAD_MAX_BYTES:
+                    raise too_large
+                await out.write(chunk)
+    except BaseException:
+        file_path.unlink(missing_ok=True)
+        raise
+    return written
+
+
 @app.post(
     "/spaces/{space_id}/upload-image",
     responses={
         404: {"description": "Space not found"},
         403: {"description": "Not authorized"},
         400: {"description": "Invalid file"},
+        413: {"description": "File too large"},
     },
 )
-async def upload_image(space_id: Annotated[int, Path(ge=0, le=2147483647)], file: UploadFile = File(...)):
+async def upload_image(space_id: Annotated[int, Path(ge=0, le=2147483647)], background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     current_user = get_current_user()
-    place = db.get_place_by_id(space_id)
+    place = await adb.run(db.get_place_by_id, space_id)
     if not place:
         raise HTTPException(status_code=404, detail="Space not found")
 
@@ -673,34 +974,34 @@ async def upload_image(space_id: Annotated[int, Path(ge=0, le=2147483647)], file
     filename = f"space_{space_id}_{datetime.now().timestamp():.0f}.{file_extension}"
     file_path = UPLOAD_DIR / filename
 
-    # Save file
-    contents = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    await save_upload(file, file_path)
+    # Thumbnails are rendered after the response is sent
+    background_tasks.add_task(image_pipeline.pipeline.process, file_path)
 
     # Return URL path
     image_url = f"/uploads/{filename}"
-    return {"image_url": image_url}
+    # Variants are rendered after the response, so a fresh upload has none yet
+    return {"image_url": image_url, "image_variants": None}
+
+
+def _booking_response(booking: dict[str, Any]) -> BookingResponse:
+    """Convert a bookings row (UTC timestamps) into a BookingResponse"""
+    return BookingResponse(
+        id=booking["id"],
+        space_id=booking["space_id"],
+        renter_id=booking["renter_id"],
+        start_time=datetime.fromisoformat(booking["start_time"]).replace(tzinfo=UTC),
+        end_time=datetime.fromisoformat(booking["end_time"]).replace(tzinfo=UTC),
+        total_price=booking["total_price"],
+        status=booking["status"],
+        created_at=booking["created_at"].replace(" ", "T") + "Z",
+    )
 
 
 @app.get("/bookings/my-bookings", response_model=list[BookingResponse])
 async def get_my_bookings():
     current_user = get_current_user()
-    user_bookings = [
-        BookingResponse(
-            id=booking["id"],
-            space_id=booking["space_id"],
-            renter_id=booking["renter_id"],
-            start_time=booking["start_time"],
-            end_time=booking["end_time"],
-            total_price=booking["total_price"],
-            status=booking["status"],
-            created_at=booking["created_at"],
-        )
-        for booking in bookings_db.values()
-        if booking["renter_id"] == current_user["id"]
-    ]
-    return user_bookings
+    return [_booking_response(booking) for booking in await adb.run(db.get_bookings_by_renter, current_user["id"])]
 
 
 @app.post(
@@ -712,54 +1013,36 @@ async def get_my_bookings():
     },
 )
 async def create_booking(booking: Booking, background_tasks: BackgroundTasks):
-    global next_booking_id
     current_user = get_current_user()
 
-    place = db.get_place_by_id(booking.space_id)
+    place = await adb.run(db.get_place_by_id, booking.space_id)
     if not place:
         raise HTTPException(status_code=404, detail="Space not found")
 
-    # Check availability (simplified)
-    for existing_booking in bookings_db.values():
-        if existing_booking["space_id"] == booking.space_id and not (booking.end_time <= existing_booking["start_time"] or booking.start_time >= existing_booking["end_time"]):
-            raise HTTPException(status_code=400, detail="Space not available for this time")
-
-    booking_id = next_booking_id
-    next_booking_id += 1
-
     hours = (booking.end_time - booking.start_time).total_seconds() / 3600
     total_price = hours * place.get("price_per_hour", 0.0)
 
-    created_at = datetime.now().replace(microsecond=0).isoformat() + "Z"
-
-    booking_data: BookingData = {
-        "id": booking_id,
-        "space_id": booking.space_id,
-        "renter_id": current_user["id"],
-        "start_time": booking.start_time,
-        "end_time": booking.end_time,
-        "total_price": total_price,
-        "status": "confirmed",
-        "created_at": created_at,
-    }
-
-    bookings_db[str(booking_id)] = booking_data
-
-    # Schedule a rating reminder shortly after end_time (MVP: send immediately if in past)
-    max(0, int((booking.end_time - datetime.utcnow()).total_seconds()))
-    # Using background task without actual delay for simplicity; in production use a scheduler
-    background_tasks.add_task(send_rating_reminder, current_user["email"], booking.space_id)
-
-    return BookingResponse(
-        id=booking_id,
+    # Availability is checked and the booking inserted in one transaction
+    booking_id = await adb.run(
+        db.create_booking,
         space_id=booking.space_id,
         renter_id=current_user["id"],
         start_time=booking.start_time,
         end_time=booking.end_time,
         total_price=total_price,
-        status="confirmed",
-        created_at=created_at,
     )
+    if booking_id is None:
+        raise HTTPException(status_code=400, detail="Space not available for this time")
+
+    created = await adb.run(db.get_booking_by_id, booking_id)
+    if not created:
+        raise HTTPException(status_code=500, detail="Failed to create booking")
+
+    # Schedule a rating reminder shortly after end_time (MVP: send immediately if in past)
+    # Using background task without actual delay for simplicity; in production use a scheduler
+    background_tasks.add_task(send_rating_reminder, current_user["email"], booking.space_id)
+
+    return _booking_response(created)
 
 
 @app.put(
@@ -771,14 +1054,14 @@ async def create_booking(booking: Booking, background_tasks: BackgroundTasks):
 )
 async def cancel_booking(booking_id: Annotated[int, Path(ge=0)]):
     current_user = get_current_user()
-    booking = bookings_db.get(str(booking_id))
+    booking = await adb.run(db.get_booking_by_id, booking_id)
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
 
     if booking["renter_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    booking["status"] = "cancelled"
+    await adb.run(db.cancel_booking, booking_id)
     return {"message": "Booking cancelled"}
 
 
@@ -792,35 +1075,22 @@ async def cancel_booking(booking_id: Annotated[int, Path(ge=0)]):
 )
 async def get_space_bookings(space_id: Annotated[int, Path(ge=0, le=2147483647)]):
     current_user = get_current_user()
-    place = db.get_place_by_id(space_id)
+    place = await adb.run(db.get_place_by_id, space_id)
     if not place:
         raise HTTPException(status_code=404, detail="Space not found")
 
     if place["added_by"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Not authorized")
 
-    space_bookings = [
-        BookingResponse(
-            id=booking["id"],
-            space_id=booking["space_id"],
-            renter_id=booking["renter_id"],
-            start_time=booking["start_time"],
-            end_time=booking["end_time"],
-            total_price=booking["total_price"],
-            status=booking["status"],
-            created_at=booking["created_at"],
-        )
-        for booking in bookings_db.values()
-        if booking["space_id"] == space_id
-    ]
-    return space_bookings
+    return [_booking_response(booking) for booking in await adb.run(db.get_bookings_by_space, space_id)]
 
 
 @app.post("/reports/license-plate", responses={501: {"description": "Not implemented"}})
 async def report_license_plate(report: ReportLicensePlate):
     try:
         # Create the license plate report
-        report_id = db.create_license_plate_report(
+        report_id = await adb.run(
+            db.create_license_plate_report,
             license_plate=report.license_plate,
             description=report.description,
             reporter_email=report.reporter_email,
@@ -829,10 +1099,11 @@ async def report_license_plate(report: ReportLicensePlate):
 
         # Find the owner of the reported license plate and send notification
         # Find user by license plate
-        parker = db.get_user_by_license_plate(report.license_plate)
+        parker = await adb.run(db.get_user_by_license_plate, report.license_plate)
         if parker:
             # Create notification for the owner of the license plate
-            db.create_notification(
+            await adb.run(
+                db.create_notification,
                 user_email=parker["email"],
                 title="License Plate Reported",
                 message=f"Your license plate {report.license_plate} has been reported. Reason: {report.description}",
@@ -843,6 +1114,8 @@ async def report_license_plate(report: ReportLicensePlate):
             "message": "License plate report submitted successfully",
             "report_id": report_id,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error creating license plate report: {e}")
         raise HTTPException(status_code=500, detail="Failed to submit report") from e
@@ -851,14 +1124,16 @@ async def report_license_plate(report: ReportLicensePlate):
 @app.get("/reports", responses={501: {"description": "Not implemented"}})
 async def get_reports():
     try:
-        reports = db.get_license_plate_reports()
+        reports = await adb.run(db.get_license_plate_reports)
         return reports
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting reports: {e}")
         raise HTTPException(status_code=500, detail="Failed to get reports") from e
 
 
-@app.post("/verification/upload", response_model=dict, responses={400: {"description": "Bad request"}})
+@app.post("/verification/upload", response_model=dict, responses={400: {"description": "Bad request"}, 413: {"description": "File too large"}})
 async def upload_verification_documents(
     profile_photo: UploadFile = File(...),
     id_document: UploadFile = File(...),
@@ -907,19 +1182,23 @@ async def upload_verification_documents(
         id_document_filename = create_filename(id_document.filename or "id.jpg", "id")
         vehicle_reg_filename = create_filename(vehicle_registration.filename or "registration.jpg", "vehicle")
 
-        # Save files to upload directory
-        for file, filename in [
-            (profile_photo, profile_photo_filename),
-            (id_document, id_document_filename),
-            (vehicle_registration, vehicle_reg_filename),
-        ]:
-            file_path = UPLOAD_DIR / filename
-            contents = await file.read()
-            with open(file_path, "wb") as f:
-                f.write(contents)
+        # Save files to upload directory, dropping the whole submission if any file fails
+        saved: list[FilePath] = []
+        try:
+            for file, filename in [
+                (profile_photo, profile_photo_filename),
+                (id_document, id_document_filename),
+                (vehicle_registration, vehicle_reg_filename),
+            ]:
+                await save_upload(file, UPLOAD_DIR / filename)
+                saved.append(UPLOAD_DIR / filename)
+        except BaseException:
+            for file_path in saved:
+                file_path.unlink(missing_ok=True)
+            raise
 
         # Get the user's profile to find their entered license plate
-        user_profile = db.get_user_by_email(user_email)
+        user_profile = await adb.run(db.get_user_by_email, user_email)
         if not user_profile:
             raise HTTPException(status_code=404, detail="User profile not found")
         
@@ -937,7 +1216,8 @@ async def upload_verification_documents(
             )
 
         # Create verification record in database
-        verification_id = db.create_user_verification(
+        verification_id = await adb.run(
+            db.create_user_verification,
             user_email=user_email,
             profile_photo_url=f"/uploads/{profile_photo_filename}",
             id_document_url=f"/uploads/{id_document_filename}",
@@ -955,14 +1235,15 @@ async def upload_verification_documents(
         # Update verification status based on AI result
         if verification_result.is_verified:
             # Mark as verified
-            db.update_verification_status(
+            await adb.run(
+                db.update_verification_status,
                 user_email=user_email,
                 status="verified",
                 verified_by="ai_system",
                 verification_notes="Automatically verified by AI system",
             )
             # Update user's verified status
-            db.update_user(user_email, is_verified=True)
+            await adb.run(db.update_user, user_email, is_verified=True)
             
             # Send success email
             await email_service.send_verification_approved_email(
@@ -971,7 +1252,8 @@ async def upload_verification_documents(
             )
             
             # Send in-app notification
-            db.create_notification(
+            await adb.run(
+                db.create_notification,
                 user_email=user_email,
                 title="Verification Approved",
                 message="Congratulations! Your identity has been verified. You now have access to verified-only parking spaces.",
@@ -985,7 +1267,8 @@ async def upload_verification_documents(
             }
         else:
             # Mark as rejected
-            db.update_verification_status(
+            await adb.run(
+                db.update_verification_status,
                 user_email=user_email,
                 status="rejected",
                 verified_by="ai_system",
@@ -1000,7 +1283,8 @@ async def upload_verification_documents(
             )
             
             # Send in-app notification
-            db.create_notification(
+            await adb.run(
+                db.create_notification,
                 user_email=user_email,
                 title="Verification Requires Updates",
                 message=f"Your verification could not be completed. Please review and resubmit your documents. Details: {verification_result.details}",
@@ -1025,7 +1309,7 @@ async def upload_verification_documents(
 async def get_verification_status(email: EmailStr):
     """Get user's verification status"""
     try:
-        verification = db.get_user_verification(email)
+        verification = await adb.run(db.get_user_verification, email)
         if not verification:
             # Return default status for users who haven't started verification
             return VerificationStatus(
@@ -1044,6 +1328,8 @@ async def get_verification_status(email: EmailStr):
             verified_at=verification.get("verified_at"),
             created_at=verification["created_at"],
         )
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting verification status: {e}")
         raise HTTPException(status_code=500, detail="Failed to get verification status") from e
@@ -1053,7 +1339,8 @@ async def get_verification_status(email: EmailStr):
 async def update_verification_status_admin(user_email: EmailStr, update: VerificationStatusUpdate):
     """Update verification status (admin only - simplified for MVP)"""
     try:
-        success = db.update_verification_status(
+        success = await adb.run(
+            db.update_verification_status,
             user_email=user_email,
             status=update.status,
             verified_by=update.verified_by or "admin",
@@ -1071,7 +1358,8 @@ async def update_verification_status_admin(user_email: EmailStr, update: Verific
             notification_title = "Verification Rejected"
             notification_message = f"Your verification was not approved. Reason: {update.verification_notes or 'Please resubmit with clearer documents.'}"
 
-        db.create_notification(
+        await adb.run(
+            db.create_notification,
             user_email=user_email,
             title=notification_title,
             message=notification_message,
@@ -1091,8 +1379,10 @@ async def update_verification_status_admin(user_email: EmailStr, update: Verific
 async def get_pending_verifications_admin():
     """Get all pending verifications (admin only)"""
     try:
-        pending = db.get_pending_verifications()
+        pending = await adb.run(db.get_pending_verifications)
         return pending
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting pending verifications: {e}")
         raise HTTPException(status_code=500, detail="Failed to get pending verifications") from e
@@ -1102,29 +1392,64 @@ async def get_pending_verifications_admin():
 async def get_user_notifications(email: str):
     """Get notifications for a user"""
     try:
-        notifications = db.get_user_notifications(email)
+        notifications = await adb.run(db.get_user_notifications, email)
         return notifications
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting notifications: {e}")
         raise HTTPException(status_code=500, detail="Failed to get notifications") from e
 
 
+# Kept out of the OpenAPI schema: the stream never ends, which schema-driven test clients cannot handle
+@app.get("/notifications/stream", include_in_schema=False)
+async def stream_notifications(
+    email: str,
+    last_event_id: Annotated[int | None, Header(alias="Last-Event-ID")] = None,
+):
+    """Server-Sent Events stream of a user's new notifications and unread count changes.
+
+    Replaces polling /notifications and /notifications/unread-count. On reconnect,
+    EventSource sends Last-Event-ID and notifications created since are replayed.
+    """
+    return StreamingResponse(
+        notification_hub.stream(email, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/notifications/unread-count")
 async def get_unread_count(email: str):
     """Get count of unread notifications for a user"""
     try:
-        count = db.get_unread_notification_count(email)
+        count = await adb.run(db.get_unread_notification_count, email)
         return {"unread_count": count}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting unread count: {e}")
         raise HTTPException(status_code=500, detail="Failed to get unread count") from e
 
 
+@app.put("/notifications/read")
+async def mark_notifications_read(selection: MarkNotificationsRead):
+    """Mark many of a user's notifications read at once, by id or everything up to a timestamp"""
+    try:
+        count = await adb.run(db.mark_notifications_read, selection.email, ids=selection.ids, before=selection.before)
+        return {"marked_read": count}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error marking notifications as read: {e}")
+        raise HTTPException(status_code=500, detail="Failed to mark notifications as read") from e
+
+
 @app.put("/notifications/{notification_id}/read", responses={404: {"description": "Notification not found"}})
 async def mark_notification_read(notification_id: int):
     """Mark a notification as read"""
     try:
-        success = db.mark_notification_read(notification_id)
+        success = await adb.run(db.mark_notification_read, notification_id)
         if not success:
             raise HTTPException(status_code=404, detail="Notification not found")
         return {"message": "Notification marked as read"}
@@ -1141,13 +1466,16 @@ async def create_user_rating(rating: CreateUserRating):
     """Create a rating for a user"""
     try:
         current_user = get_current_user()
-        rating_id = db.create_user_rating(
+        rating_id = await adb.run(
+            db.create_user_rating,
             rater_id=current_user["id"],
             ratee_id=rating.ratee_id,
             rating=rating.rating,
             description=rating.description,
         )
         return {"id": rating_id, "message": "User rating created successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         if "UNIQUE constraint failed" in str(e):
             raise HTTPException(status_code=409, detail="You have already rated this user") from e
@@ -1160,13 +1488,16 @@ async def create_place_rating(rating: CreatePlaceRating):
     """Create a rating for a place"""
     try:
         current_user = get_current_user()
-        rating_id = db.create_place_rating(
+        rating_id = await adb.run(
+            db.create_place_rating,
             user_id=current_user["id"],
             place_id=rating.place_id,
             rating=rating.rating,
             description=rating.description,
         )
         return {"id": rating_id, "message": "Place rating created successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         if "UNIQUE constraint failed" in str(e):
             raise HTTPException(status_code=409, detail="You have already rated this place") from e
@@ -1178,12 +1509,14 @@ async def create_place_rating(rating: CreatePlaceRating):
 async def get_place_ratings(place_id: int = Path(..., ge=1, le=2147483647)):
     """Get all ratings for a specific place"""
     try:
-        ratings = db.get_place_ratings(place_id)
+        ratings = await adb.run(db.get_place_ratings, place_id)
         return {
             "ratings": ratings,
             "count": len(ratings),
-            "average": db.get_place_average_rating(place_id),
+            "average": await adb.run(db.get_place_average_rating, place_id),
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting place ratings: {e}")
         raise HTTPException(status_code=500, detail="Failed to get place ratings") from e
@@ -1193,12 +1526,14 @@ async def get_place_ratings(place_id: int = Path(..., ge=1, le=2147483647)):
 async def get_user_ratings(user_id: int = Path(..., ge=1, le=2147483647)):
     """Get all ratings for a specific user"""
     try:
-        ratings = db.get_user_ratings_by_ratee(user_id)
+        ratings = await adb.run(db.get_user_ratings_by_ratee, user_id)
         return {
             "ratings": ratings,
             "count": len(ratings),
-            "average": db.get_user_average_rating(user_id),
+            "average": await adb.run(db.get_user_average_rating, user_id),
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting user ratings: {e}")
         raise HTTPException(status_code=500, detail="Failed to get user ratings") from e
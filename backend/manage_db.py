@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Database maintenance commands
+
+Usage:
+    python -m backend.manage_db reconcile-ratings
+    python -m backend.manage_db rebuild-search-index
+    python -m backend.manage_db rebuild-clusters
+    python -m backend.manage_db archive-notifications [--days N]
+    python -m backend.manage_db migrate
+"""
+
+import argparse
+
+from backend import database as db
+
+
+def reconcile_ratings(_args: argparse.Namespace) -> None:
+    """Rebuild denormalized rating aggregates on places and users"""
+    fixed = db.reconcile_rating_aggregates()
+    for table, count in fixed.items():
+        print(f"{table}: {count} row(s) reconciled")
+
+
+def rebuild_search_index(_args: argparse.Namespace) -> None:
+    """Rebuild the places_fts full-text index, e.g. after a bulk import"""
+    count = db.rebuild_search_index()
+    print(f"places_fts: {count} place(s) indexed")
+
+
+def rebuild_clusters(_args: argparse.Namespace) -> None:
+    """Rebuild the marker cluster grid, e.g. after a bulk import"""
+    count = db.rebuild_place_clusters()
+    print(f"place_clusters: {count} cell(s) written")
+
+
+def archive_notifications(args: argparse.Namespace) -> None:
+    """Move old read notifications to notifications_archive; meant to run from cron"""
+    count = db.archive_read_notifications(older_than_days=args.days)
+    print(f"notifications: {count} read notification(s) archived")
+
+
+def migrate(_args: argparse.Namespace) -> None:
+    """Apply pending schema migrations and run their backfills to completion"""
+    applied = db.migrate()
+    batches = db.run_backfills()
+    print(f"schema_version: {db.SCHEMA_VERSION} ({applied} migration(s) applied, {batches} backfill batch(es) run)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Park Place database maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reconcile_parser = subparsers.add_parser("reconcile-ratings", help="Rebuild rating_sum/rating_count from the ratings tables")
+    reconcile_parser.set_defaults(func=reconcile_ratings)
+
+    search_parser = subparsers.add_parser("rebuild-search-index", help="Rebuild the full-text index over place titles, descriptions and addresses")
+    search_parser.set_defaults(func=rebuild_search_index)
+
+    clusters_parser = subparsers.add_parser("rebuild-clusters", help="Rebuild the marker cluster grid from the places table")
+    clusters_parser.set_defaults(func=rebuild_clusters)
+
+    archive_parser = subparsers.add_parser("archive-notifications", help="Archive read notifications older than the retention period")
+    archive_parser.add_argument("--days", type=int, default=db.NOTIFICATION_RETENTION_DAYS, help="Retention period in days")
+    archive_parser.set_defaults(func=archive_notifications)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Apply pending schema migrations and finish online backfills")
+    migrate_parser.set_defaults(func=migrate)
+
+    args = parser.parse_args()
+    if args.func is not migrate:
+        db.init_database()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
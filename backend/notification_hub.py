@@ -0,0 +1,156 @@
+"""
+Push delivery of notifications over Server-Sent Events.
+
+backend.database reports every committed notification change to its
+listeners; the hub fans those events out to the SSE streams open for that
+user in this process, so clients stop polling /notifications and
+/notifications/unread-count.
+
+Each stream has a bounded buffer. A client that falls behind is disconnected
+rather than buffered without limit; EventSource reconnects with the
+Last-Event-ID header and the missed notifications are replayed from SQLite.
+Notification events carry the notification id as their SSE id for that reason.
+"""
+
+import asyncio
+import os
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import orjson
+
+from backend import async_database as adb
+from backend import database as db
+
+NOTIFICATION_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_HEARTBEAT_SECONDS", "15"))
+NOTIFICATION_STREAM_BUFFER = int(os.getenv("NOTIFICATION_STREAM_BUFFER", "100"))  # events queued per connection
+NOTIFICATION_REPLAY_PAGE = 100  # notifications read per query when replaying after a reconnect
+NOTIFICATION_RETRY_MS = 3000  # reconnection delay suggested to EventSource clients
+
+
+class Subscription:
+    """One open stream: a bounded queue of (event, payload) pairs, closed by a None item"""
+
+    def __init__(self, user_email: str, max_size: int):
+        self.user_email = user_email
+        self.queue: asyncio.Queue[tuple[str, dict[str, Any]] | None] = asyncio.Queue(max_size)
+
+
+class NotificationHub:
+    """In-process pub/sub from database notification events to per-user SSE streams.
+
+    Subscriptions are only touched on the event loop thread; publish() is safe
+    to call from the database threads and hops onto the loop.
+    """
+
+    def __init__(self, buffer_size: int = NOTIFICATION_STREAM_BUFFER):
+        self.buffer_size = max(1, buffer_size)
+        self._subscribers: dict[str, set[Subscription]] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> None:
+        """Bind to the running event loop and start receiving database events"""
+        self._loop = asyncio.get_running_loop()
+        db.add_notification_listener(self.publish)
+
+    def stop(self) -> None:
+        """Stop receiving events and end every open stream"""
+        db.remove_notification_listener(self.publish)
+        self._loop = None
+        for subscriptions in list(self._subscribers.values()):
+            for subscription in list(subscriptions):
+                self._close(subscription)
+
+    def publish(self, event: str, payload: dict[str, Any]) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._deliver, event, payload)
+
+    def _deliver(self, event: str, payload: dict[str, Any]) -> None:
+        for subscription in list(self._subscribers.get(payload["user_email"], ())):
+            try:
+                subscription.queue.put_nowait((event, payload))
+            except asyncio.QueueFull:
+                # The client will reconnect and replay what it missed from the database
+                self._close(subscription)
+
+    def _close(self, subscription: Subscription) -> None:
+        self._remove(subscription)
+        while True:
+            try:
+                subscription.queue.put_nowait(None)
+                return
+            except asyncio.QueueFull:
+                subscription.queue.get_nowait()
+
+    def _remove(self, subscription: Subscription) -> None:
+        subscriptions = self._subscribers.get(subscription.user_email)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_email]
+
+    @contextmanager
+    def subscribe(self, user_email: str) -> Iterator[Subscription]:
+        subscription = Subscription(user_email, self.buffer_size)
+        self._subscribers.setdefault(user_email, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            self._remove(subscription)
+
+    def stats(self) -> dict[str, int]:
+        return {"users": len(self._subscribers), "connections": sum(len(s) for s in self._subscribers.values())}
+
+
+hub = NotificationHub()
+
+
+def _sse(event: str, data: dict[str, Any], event_id: int | None = None) -> bytes:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\n".encode() + b"data: " + orjson.dumps(data) + b"\n\n"
+
+
+async def stream(user_email: str, last_event_id: int | None) -> AsyncIterator[bytes]:
+    """SSE byte stream of a user's new notifications and unread count changes.
+
+    Emits "notification" events (id = notification id) and "unread-count" events
+    with the absolute count and the change that caused it. A heartbeat comment
+    is sent whenever the stream has been idle for the heartbeat interval.
+    """
+    with hub.subscribe(user_email) as subscription:
+        yield f"retry: {NOTIFICATION_RETRY_MS}\n\n".encode()
+
+        # Live events can arrive out of id order, so only the replay moves this mark
+        replayed_upto = last_event_id or 0
+        if last_event_id is not None:
+            while True:
+                missed = await adb.run(db.get_user_notifications_after, user_email, replayed_upto, NOTIFICATION_REPLAY_PAGE)
+                for notification in missed:
+                    yield _sse("notification", notification, notification["id"])
+                    replayed_upto = notification["id"]
+                if len(missed) < NOTIFICATION_REPLAY_PAGE:
+                    break
+
+        count = await adb.run(db.get_unread_notification_count, user_email)
+        yield _sse("unread-count", {"count": count, "delta": 0})
+
+        while True:
+            try:
+                item = await asyncio.wait_for(subscription.queue.get(), NOTIFICATION_HEARTBEAT_SECONDS)
+            except TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if item is None:
+                return
+            event, payload = item
+            if event == "created":
+                notification = {key: value for key, value in payload.items() if key != "unread_count"}
+                if notification["id"] > replayed_upto:  # Skip what the replay already sent
+                    yield _sse("notification", notification, notification["id"])
+                delta = 1
+            else:
+                delta = -len(payload["ids"])
+            yield _sse("unread-count", {"count": payload["unread_count"], "delta": delta})
@@ -3,6 +3,7 @@
 Test script for the consolidated database.py functionality
 """
 import os
+import re
 import sqlite3
 import tempfile
 
@@ -446,7 +447,1479 @@ def test_user_type_distinction():
             os.unlink(test_db_path)
 
 
+def test_connection_pool():
+    """Test connection reuse per thread, nested get_db, the size bound and recycling of broken connections"""
+    import threading
+    import time
+
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🏊 Testing connection pool...")
+
+        pool = database.ConnectionPool(test_db_path, max_size=2, timeout=0.2, health_check_interval=60)
+        in_thread = threading.Event()
+        main_released = threading.Event()
+        thread_released = threading.Event()
+        main_reacquired = threading.Event()
+        seen = {}
+
+        def other_thread():
+            first = pool.acquire()
+            in_thread.set()
+            main_released.wait(5)
+            pool.release(first)
+            thread_released.set()
+            main_reacquired.wait(5)
+            second = pool.acquire()
+            seen["thread"] = (first, second)
+            pool.release(second)
+
+        mine = pool.acquire()
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        assert in_thread.wait(5)
+        assert pool.stats() == {"size": 2, "idle": 0, "max_size": 2}
+
+        # Both connections are out: a third checkout waits for the timeout, then fails
+        started = time.monotonic()
+        try:
+            pool.acquire()
+            raise AssertionError("The pool should not grow past max_size")
+        except sqlite3.OperationalError as e:
+            assert "Timed out" in str(e)
+        assert time.monotonic() - started >= 0.2
+
+        pool.release(mine)
+        main_released.set()
+        assert thread_released.wait(5)
+        # Both connections are idle now, the other thread's returned last
+        again = pool.acquire()
+        assert again is mine, "A thread gets its previous connection back while it is idle"
+        main_reacquired.set()
+        thread.join(5)
+        first, second = seen["thread"]
+        assert first is second and first is not mine
+        pool.release(again)
+
+        # A waiting checkout is woken as soon as a connection is released
+        pool.timeout = 5
+        held = [pool.acquire()]
+        waiters = [threading.Thread(target=lambda: held.append(pool.acquire())) for _ in range(2)]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.05)
+        assert len(held) == 2, "Only one of the two waiting checkouts fits"
+        pool.release(held[0])
+        for waiter in waiters:
+            waiter.join(5)
+        assert len(held) == 3 and held[0] in held[1:]
+        # Connections may be returned from any thread
+        pool.release(held[1])
+        pool.release(held[2])
+
+        # A broken idle connection is noticed by the health check and replaced
+        pool.health_check_interval = 0
+        broken = pool.acquire()
+        broken.conn.close()
+        pool.release(broken)
+        replacement = pool.acquire()
+        assert replacement is not broken
+        assert replacement.conn.execute("SELECT 1").fetchone()[0] == 1
+        pool.release(replacement)
+        assert pool.stats() == {"size": 1, "idle": 1, "max_size": 2}, "The broken connection no longer counts toward the size"
+
+        # A connection older than the max lifetime is closed instead of returned
+        pool.max_lifetime = 0
+        expired = pool.acquire()
+        pool.release(expired)
+        assert expired not in pool._idle
+        pool.close()
+        assert pool.stats() == {"size": 0, "idle": 0, "max_size": 2}
+
+        # Nested get_db calls join the outer connection and its transaction
+        database.init_database()
+        try:
+            with database.get_db() as outer:
+                with database.get_db() as inner:
+                    assert inner is outer
+                    inner.execute("INSERT INTO users (email, username, hashed_password) VALUES ('pool@test.com', 'pool', 'hash')")
+                raise RuntimeError("roll back")
+        except RuntimeError:
+            pass
+        assert database.get_user_by_email("pool@test.com") is None, "The inner write rolls back with the outer block"
+        with database.get_db() as conn:
+            assert database.get_pool().held().conn is conn
+        assert database.get_pool().held() is None
+
+        # A new DB_PATH gets a new pool
+        previous = database.get_pool()
+        database.DB_PATH = test_db_path + "-other"
+        assert database.get_pool() is not previous
+        database.DB_PATH = test_db_path
+        print("✅ Connection pool reuses, bounds and recycles connections")
+
+    finally:
+        database.DB_PATH = original_db_path
+        for path in (test_db_path, test_db_path + "-other"):
+            if os.path.exists(path):
+                os.unlink(path)
+
+
+def test_keyset_pagination():
+    """Test that keyset cursors page through every place exactly once, and that bad cursors are rejected"""
+    import base64
+
+    from fastapi.testclient import TestClient
+
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n📄 Testing keyset pagination...")
+
+        database.init_database()
+        owner_id = database.create_user(email="pages@test.com", username="pages", hashed_password="hash")
+        place_ids = [database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address=f"Place {i}") for i in range(40)]
+        database.update_place(place_ids[5], is_published=0)
+        with database.get_db() as conn:
+            # Few distinct timestamps, so most of the ordering comes from the id tiebreak
+            for i, place_id in enumerate(place_ids):
+                conn.execute("UPDATE places SET created_at = ? WHERE id = ?", (f"2026-01-0{i % 3 + 1} 12:00:00", place_id))
+        published = [place_id for place_id in place_ids if place_id != place_ids[5]]
+        newest_first = sorted(published, key=lambda place_id: (place_ids.index(place_id) % 3, place_id), reverse=True)
+
+        seen = []
+        after = None
+        while True:
+            page = database.get_published_places(limit=7, after=after)
+            seen.extend(place["id"] for place in page)
+            if len(page) < 7:
+                break
+            after = database.decode_cursor(database.encode_cursor(page[-1]))
+        assert seen == newest_first, "Cursor pages visit every published place once, newest first"
+
+        with TestClient(main.app) as client:
+            seen = []
+            cursor = None
+            while True:
+                response = client.get("/spaces", params={"limit": 7} if cursor is None else {"limit": 7, "cursor": cursor})
+                assert response.status_code == 200
+                seen.extend(space["id"] for space in response.json())
+                cursor = response.headers.get("X-Next-Cursor")
+                if cursor is None:
+                    break
+                if len(seen) == 14:
+                    # A place added mid-way is newer than every cursor, so it neither appears nor shifts later pages
+                    database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address="Late")
+            assert seen == newest_first
+            assert len(response.json()) == len(published) % 7, "The last page is short and carries no cursor"
+
+            malformed = [
+                "not a cursor",
+                "!!!",
+                base64.urlsafe_b64encode(b'{"created_at": 1}').decode(),
+                base64.urlsafe_b64encode(b'[1, "x"]').decode(),
+                base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+            ]
+            for cursor in malformed:
+                response = client.get("/spaces", params={"cursor": cursor})
+                assert response.status_code == 400, f"Cursor {cursor!r} should be rejected"
+                assert response.json()["detail"] == "Invalid cursor"
+        print("✅ Keyset pagination visits every place once")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_space_json_matches_model():
+    """Test that the orjson fast path produces exactly what ParkingSpaceResponse would"""
+    import json
+
+    import orjson
+    from fastapi.testclient import TestClient
+
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🧾 Testing space JSON encoding...")
+
+        with TestClient(main.app) as client:
+            owner_id = database.create_user(email="json@test.com", username="json", hashed_password="hash")
+            database.create_place(added_by=owner_id, title="Garage", description="Covered", latitude=37.77, longitude=-122.42, address="A", price_per_hour=5, tags=["covered", "ev-charging"])
+            database.create_place(added_by=owner_id, latitude=37.7712345, longitude=-122.4198765, address="B", price_per_hour=2.75)
+            database.create_place(added_by=owner_id, title="No coordinates", address="C")
+
+            rows = database.get_published_places()
+            rows += database.search_places_by_location(37.77, -122.42, radius_km=1.0)
+            rows += database.get_nearest_places(37.77, -122.42, k=2)
+            assert len(rows) == 7 and any(row.get("distance_m") is not None for row in rows)
+            for row in rows:
+                encoded = main._space_json(row, tags=row["tags"])
+                model = main.ParkingSpaceResponse.model_validate(encoded)
+                assert list(encoded) == list(main.ParkingSpaceResponse.model_fields), "Same fields in the same order"
+                assert encoded == model.model_dump(), f"Space {row['id']} differs from the model"
+                assert orjson.dumps(encoded) == orjson.dumps(json.loads(model.model_dump_json())), "Same JSON on the wire"
+
+            # The list endpoint agrees with the single-space endpoint, which builds the model
+            for space in client.get("/spaces").json():
+                assert client.get(f"/spaces/{space['id']}").json() == space
+        print("✅ Space JSON matches ParkingSpaceResponse")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_stream_spaces():
+    """Test that /spaces/stream pages through every published place once, as NDJSON and as a JSON array"""
+    import json
+
+    from fastapi.testclient import TestClient
+
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+    original_page_size = main.STREAM_PAGE_SIZE
+    main.STREAM_PAGE_SIZE = 4
+
+    try:
+        print("\n🌊 Testing space streaming...")
+
+        with TestClient(main.app) as client:
+            assert client.get("/spaces/stream", params={"format": "json"}).json() == [], "No spaces is an empty array"
+            assert client.get("/spaces/stream").text == ""
+
+            owner_id = database.create_user(email="stream@test.com", username="stream", hashed_password="hash")
+            place_ids = [database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address=f"Place {i}") for i in range(13)]
+            database.update_place(place_ids[0], is_published=0)
+            with database.get_db() as conn:
+                # Shared timestamps across page boundaries, so the id tiebreak decides the order
+                for i, place_id in enumerate(place_ids):
+                    conn.execute("UPDATE places SET created_at = ? WHERE id = ?", (f"2026-01-0{i % 2 + 1} 12:00:00", place_id))
+            published = sorted(place_ids[1:], key=lambda place_id: (place_ids.index(place_id) % 2, place_id), reverse=True)
+            assert len(published) % main.STREAM_PAGE_SIZE == 0, "The last page is full, so an empty page ends the stream"
+
+            response = client.get("/spaces/stream")
+            assert response.status_code == 200 and response.headers["content-type"] == "application/x-ndjson"
+            assert response.text.endswith("\n")
+            lines = response.text.splitlines()
+            assert [json.loads(line)["id"] for line in lines] == published, "Every published space once, newest first"
+
+            response = client.get("/spaces/stream", params={"format": "json"})
+            assert response.status_code == 200 and response.headers["content-type"] == "application/json"
+            spaces = json.loads(response.text)
+            assert [space["id"] for space in spaces] == published
+            assert spaces[0] == json.loads(lines[0]), "Both formats carry the same objects"
+
+            for limit in (1, 5, 8, 100):
+                ndjson = client.get("/spaces/stream", params={"limit": limit}).text.splitlines()
+                array = client.get("/spaces/stream", params={"format": "json", "limit": limit}).json()
+                expected = published[:limit]
+                assert [json.loads(line)["id"] for line in ndjson] == expected, f"limit={limit}"
+                assert [space["id"] for space in array] == expected, f"limit={limit}"
+        print("✅ Space streams cover every published space once")
+
+    finally:
+        main.STREAM_PAGE_SIZE = original_page_size
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_spatial_index_sync():
+    """Test that places_rtree follows inserts, moves and deletes of places"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🗺️  Testing spatial index sync...")
+
+        # Places created before the index exists are backfilled by init_database
+        with sqlite3.connect(test_db_path) as conn:
+            conn.execute("""
+                CREATE TABLE places (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    description TEXT,
+                    added_by INTEGER NOT NULL,
+                    creator_is_owner BOOLEAN DEFAULT 1,
+                    latitude DECIMAL(10, 8),
+                    longitude DECIMAL(10, 8),
+                    address TEXT NOT NULL,
+                    price_per_hour DECIMAL(10, 2) DEFAULT 0,
+                    is_published BOOLEAN DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("INSERT INTO places (added_by, latitude, longitude, address) VALUES (1, 37.7749, -122.4194, 'Market St')")
+
+        database.init_database()
+        user_id = database.create_user(email="geo@test.com", username="geo", hashed_password="hash")
+        legacy = database.search_places_by_location(37.7749, -122.4194, radius_km=1.0)
+        assert [p["id"] for p in legacy] == [1], "Existing place should be backfilled into the index"
+
+        place_id = database.create_place(added_by=user_id, latitude=37.7849, longitude=-122.4094, address="Nob Hill")
+        nearby = database.search_places_by_location(37.7849, -122.4094, radius_km=0.5)
+        assert place_id in [p["id"] for p in nearby], "New place should be indexed on insert"
+
+        # Counts read publication and price from places_rtree_aux's auxiliary columns
+        assert database.count_places_by_location(37.7749, -122.4194, radius_km=1.0) == 1, "Legacy place is counted"
+        assert database.count_places_by_location(37.7849, -122.4094, radius_km=0.5) == 1
+        database.update_place(place_id, price_per_hour=4.0)
+        assert database.count_places_by_location(37.7849, -122.4094, radius_km=0.5, min_price=3.0) == 1
+        database.update_place(place_id, is_published=0)
+        assert database.count_places_by_location(37.7849, -122.4094, radius_km=0.5) == 0
+        database.update_place(place_id, is_published=1)
+        with database.get_db() as conn:
+            assert database._places_rtree_aux_ready(conn)
+            sql, params = database._place_count_query(True, min_price=1.0, max_price=5.0, tags_all=["covered", "ev-charging"], tags_any=["valet"])
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", [37.0, 38.0, -123.0, -122.0, *params])]
+        scanned = {re.match(r"(?:SCAN|SEARCH) (\w+)", step).group(1) for step in plan if re.match(r"SCAN|SEARCH", step)}
+        assert scanned == {"r", "place_tags"}, f"Counting should not read places rows: {plan}"
+        assert any(step.startswith("SCAN r VIRTUAL TABLE INDEX") for step in plan), "The box is searched in the R*Tree"
+
+        database.update_place(place_id, latitude=40.7589, longitude=-73.9851)
+        assert database.count_places_by_location(40.7589, -73.9851, radius_km=0.5, min_price=3.0) == 1, "A moved place keeps its price"
+        assert place_id not in [p["id"] for p in database.search_places_by_location(37.7849, -122.4094, radius_km=0.5)]
+        assert place_id in [p["id"] for p in database.search_places_by_location(40.7589, -73.9851, radius_km=0.5)]
+
+        database.delete_place(place_id)
+        assert database.search_places_by_location(40.7589, -73.9851, radius_km=0.5) == [], "Deleted place should leave the index"
+        print("✅ Spatial index stays in sync with places")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_search_across_antimeridian():
+    """Test that radius searches and counts reach places on the far side of the antimeridian"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🌐 Testing search across the antimeridian...")
+
+        database.init_database()
+        owner_id = database.create_user(email="dateline@test.com", username="dateline", hashed_password="hash")
+        east = database.create_place(added_by=owner_id, title="Dateline garage", latitude=0.0, longitude=179.999, address="East", tags=["covered"])
+        west = database.create_place(added_by=owner_id, title="Dateline lot", latitude=0.0, longitude=-179.9995, address="West")
+        database.create_place(added_by=owner_id, latitude=0.0, longitude=179.9, address="Too far")
+
+        results = database.search_places_by_location(0.0, -179.999, radius_km=1.0)
+        assert [place["id"] for place in results] == [west, east], "Both sides of the antimeridian are searched, nearest first"
+        assert abs(results[1]["distance_m"] - 222.4) < 1.0
+        assert [place["id"] for place in database.search_places_by_location(0.0, 179.9995, radius_km=1.0)] == [east, west]
+        assert [place["id"] for place in database.search_places_by_location(0.0, -179.999, radius_km=1.0, text="dateline")] == [west, east]
+        assert [place["id"] for place in database.search_places_by_location(0.0, -179.999, radius_km=1.0, tags_all=["covered"])] == [east]
+        assert database.count_places_by_location(0.0, -179.999, radius_km=1.0) == 2, "Counts agree with searches"
+        assert database.count_places_by_location(0.0, -179.999, radius_km=1.0, tags_all=["covered"]) == 1
+        assert [place["id"] for place in database.get_nearest_places(0.0, -179.999, k=2)] == [west, east]
+        print("✅ Searches and counts cross the antimeridian")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_nearest_places():
+    """Test that the best-first kNN search agrees with a brute-force scan"""
+    import math
+    import random
+
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n📍 Testing nearest places...")
+
+        database.init_database()
+        owner_id = database.create_user(email="knn@test.com", username="knn", hashed_password="hash")
+        rng = random.Random(4)
+        places = []
+        for i in range(300):
+            # Most places cluster around San Francisco, the rest are spread over the globe
+            if i < 200:
+                lat, lng = 37.77 + rng.uniform(-0.3, 0.3), -122.42 + rng.uniform(-0.3, 0.3)
+            else:
+                lat, lng = rng.uniform(-80.0, 80.0), rng.uniform(-180.0, 180.0)
+            price = round(rng.uniform(0.0, 10.0), 2)
+            place_id = database.create_place(added_by=owner_id, latitude=lat, longitude=lng, address=f"Place {i}", price_per_hour=price)
+            published = i % 10 != 0
+            if not published:
+                database.update_place(place_id, is_published=0)
+            places.append((place_id, lat, lng, price, published))
+
+        def brute_force(lat, lng, k, min_price=None, max_price=None):
+            distances = []
+            for place_id, place_lat, place_lng, price, published in places:
+                if not published or (min_price is not None and price < min_price) or (max_price is not None and price > max_price):
+                    continue
+                dlat = math.radians(place_lat - lat)
+                dlng = math.radians(place_lng - lng)
+                a = math.sin(dlat / 2) ** 2 + math.cos(math.radians(lat)) * math.cos(math.radians(place_lat)) * math.sin(dlng / 2) ** 2
+                distances.append((2 * database.EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0))), place_id))
+            return [place_id for _, place_id in sorted(distances)[:k]]
+
+        centers = [(37.77, -122.42), (37.5, -122.0), (40.75, -73.98), (0.0, 179.9), (-60.0, 10.0)]
+        for lat, lng in centers:
+            for k in (1, 10, 50):
+                nearest = database.get_nearest_places(lat, lng, k=k)
+                assert [place["id"] for place in nearest] == brute_force(lat, lng, k), f"kNN at ({lat}, {lng}) with k={k}"
+                distances = [place["distance_m"] for place in nearest]
+                assert distances == sorted(distances), "Results come nearest first"
+
+        filtered = database.get_nearest_places(37.77, -122.42, k=20, min_price=2.5, max_price=7.5)
+        assert [place["id"] for place in filtered] == brute_force(37.77, -122.42, 20, min_price=2.5, max_price=7.5)
+        everything = database.get_nearest_places(37.77, -122.42, k=1000)
+        assert [place["id"] for place in everything] == brute_force(37.77, -122.42, 1000), "k beyond the place count returns every published place"
+        print("✅ Nearest places match a brute-force search")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_rating_aggregates():
+    """Test that denormalized rating aggregates track rating creates and deletes"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n⭐ Testing rating aggregates...")
+
+        database.init_database()
+        rater_id = database.create_user(email="rater@test.com", username="rater", hashed_password="hash")
+        ratee_id = database.create_user(email="ratee@test.com", username="ratee", hashed_password="hash")
+        place_id = database.create_place(added_by=ratee_id, latitude=37.77, longitude=-122.42, address="Mission St")
+
+        first = database.create_place_rating(user_id=rater_id, place_id=place_id, rating=5)
+        database.create_place_rating(user_id=ratee_id, place_id=place_id, rating=2)
+        user_rating = database.create_user_rating(rater_id=rater_id, ratee_id=ratee_id, rating=4)
+
+        place = database.get_place_by_id(place_id)
+        assert place["rating_count"] == 2 and place["average_rating"] == 3.5
+        assert database.get_user_by_id(ratee_id)["average_rating"] == 4.0
+
+        assert database.delete_place_rating(first)
+        assert not database.delete_place_rating(first), "Deleting twice should not decrement again"
+        assert database.delete_user_rating(user_rating)
+        assert database.get_place_by_id(place_id)["average_rating"] == 2.0
+        ratee = database.get_user_by_id(ratee_id)
+        assert ratee["rating_count"] == 0 and ratee["average_rating"] is None
+
+        # Drifted aggregates are repaired by reconcile
+        with database.get_db() as conn:
+            conn.execute("UPDATE places SET rating_sum = 99, rating_count = 7 WHERE id = ?", (place_id,))
+        assert database.reconcile_rating_aggregates() == {"places": 1, "users": 0}
+        assert database.get_place_rating_count(place_id) == 1
+        assert database.get_place_average_rating(place_id) == 2.0
+        print("✅ Rating aggregates maintained incrementally and reconciled")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_place_tag_index():
+    """Test that place_tags follows create/update/delete and drives tag filters"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🏷️ Testing place tag index...")
+
+        database.init_database()
+        owner_id = database.create_user(email="tags@test.com", username="tags", hashed_password="hash")
+        both = database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address="A", tags=["ev-charging", "covered"])
+        covered = database.create_place(added_by=owner_id, latitude=37.771, longitude=-122.42, address="B", tags=["covered", "covered"])
+        database.create_place(added_by=owner_id, latitude=37.772, longitude=-122.42, address="C")
+        for place_id in (both, covered):
+            database.update_place(place_id, is_published=1)
+
+        assert database.get_place_by_id(both)["tags"] == ["ev-charging", "covered"]
+        assert database.get_place_by_id(covered)["tags"] == ["covered"]
+
+        def search_ids(**filters):
+            return [place["id"] for place in database.search_places_by_location(37.77, -122.42, 1.0, **filters)]
+
+        assert search_ids(tags_all=["ev-charging", "covered"]) == [both]
+        assert search_ids(tags_any=["ev-charging", "covered"]) == [both, covered]
+        assert search_ids(tags_any=["valet"]) == []
+        assert database.count_places_by_location(37.77, -122.42, 1.0, tags_any=["ev-charging", "covered"]) == 2
+        assert database.count_places_by_location(37.77, -122.42, 1.0, tags_all=["ev-charging", "covered"], max_price=0) == 1
+        assert database.count_places_by_location(37.77, -122.42, 1.0, min_price=1) == 0
+
+        assert database.update_place(covered, tags=["ev-charging"])
+        assert search_ids(tags_all=["ev-charging"]) == [both, covered]
+        assert not database.update_place(999, tags=["covered"]), "Unknown place should not be tagged"
+
+        database.delete_place(both)
+        with database.get_db() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM place_tags WHERE place_id = ?", (both,)).fetchone()[0] == 0
+        print("✅ Tag index kept in sync and filters evaluated in SQL")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_database_overload():
+    """Test that endpoints answer 503 with Retry-After while the database executor's backlog is full"""
+    import asyncio
+    import threading
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from backend import async_database as adb
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+    original_limits = adb.DB_EXECUTOR_THREADS, adb.DB_EXECUTOR_QUEUE_SIZE
+    release = threading.Event()
+
+    async def fill_backlog():
+        await asyncio.gather(*(adb.run(release.wait) for _ in range(2)))
+
+    try:
+        print("\n🚦 Testing database overload responses...")
+
+        with TestClient(main.app) as client:
+            adb.DB_EXECUTOR_THREADS, adb.DB_EXECUTOR_QUEUE_SIZE = 2, 0
+            blockers = threading.Thread(target=asyncio.run, args=(fill_backlog(),))
+            blockers.start()
+            try:
+                deadline = time.monotonic() + 5
+                while adb._pending < 2 and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                assert adb._pending == 2, "Both slots should be taken"
+
+                # Endpoints with and without catch-all handlers, including the polled notification ones
+                for path in ("/notifications?email=a@test.com", "/notifications/unread-count?email=a@test.com", "/spaces", "/reports"):
+                    response = client.get(path)
+                    assert response.status_code == 503, f"{path} answered {response.status_code}"
+                    assert response.headers["Retry-After"] == str(adb.DB_OVERLOAD_RETRY_AFTER)
+                    assert response.json()["detail"] == "Database is overloaded, try again shortly"
+            finally:
+                # Shutting the client down waits for the blocked calls
+                release.set()
+                blockers.join(timeout=5)
+            assert adb._pending == 0
+            assert client.get("/notifications/unread-count?email=a@test.com").json() == {"unread_count": 0}
+        print("✅ Overload answered with 503 and Retry-After")
+
+    finally:
+        adb.DB_EXECUTOR_THREADS, adb.DB_EXECUTOR_QUEUE_SIZE = original_limits
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_upload_limits():
+    """Test that oversized uploads get 413 and leave no files behind"""
+    import asyncio
+    import io
+    import shutil
+
+    from fastapi import HTTPException, UploadFile
+    from fastapi.testclient import TestClient
+
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+    upload_dir = tempfile.mkdtemp()
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+    original_settings = main.UPLOAD_DIR, main.UPLOAD_MAX_BYTES, main.UPLOAD_FORM_OVERHEAD, main.UPLOAD_CHUNK_SIZE
+    main.UPLOAD_DIR, main.UPLOAD_MAX_BYTES, main.UPLOAD_FORM_OVERHEAD, main.UPLOAD_CHUNK_SIZE = main.FilePath(upload_dir), 1000, 1000, 256
+
+    try:
+        print("\n📦 Testing upload limits...")
+
+        with TestClient(main.app) as client:
+            owner_id = database.create_user(email="uploader@test.com", username="uploader", hashed_password="hash")
+            assert owner_id == main.DEV_USER["id"]
+            space_id = database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address="Upload St")
+            upload_url = f"/spaces/{space_id}/upload-image"
+
+            # A Content-Length over the request limit is refused before the body is read
+            response = client.post(upload_url, files={"file": ("big.jpg", b"x" * 3000, "image/jpeg")})
+            assert response.status_code == 413 and response.json()["detail"] == "Upload exceeds the 2000 byte request limit"
+
+            # Without a Content-Length, reading stops once the body passes the limit
+            boundary = "limit-test"
+            head = f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="big.jpg"\r\nContent-Type: image/jpeg\r\n\r\n'.encode()
+
+            def chunked_body():
+                yield head
+                for _ in range(30):
+                    yield b"x" * 100
+                yield f"\r\n--{boundary}--\r\n".encode()
+
+            response = client.post(upload_url, content=chunked_body(), headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+            assert response.status_code == 413 and response.json()["detail"] == "Upload exceeds the 2000 byte request limit"
+
+            # A single file over the per-file limit, in a body under the request limit
+            response = client.post(upload_url, files={"file": ("big.jpg", b"x" * 1001, "image/jpeg")})
+            assert response.status_code == 413 and response.json()["detail"] == "File exceeds the 1000 byte upload limit"
+            response = client.post(upload_url, files={"file": ("ok.jpg", b"x" * 1000, "image/jpeg")})
+            assert response.status_code == 200
+            (saved,) = os.listdir(upload_dir)
+            assert response.json()["image_url"] == f"/uploads/{saved}"
+            os.unlink(os.path.join(upload_dir, saved))
+
+            # An oversized verification document also removes the documents saved before it
+            response = client.post(
+                "/verification/upload",
+                files={
+                    "profile_photo": ("photo.jpg", b"x" * 500, "image/jpeg"),
+                    "id_document": ("id.jpg", b"x" * 1001, "image/jpeg"),
+                    "vehicle_registration": ("registration.jpg", b"x" * 500, "image/jpeg"),
+                },
+                data={"user_email": "uploader@test.com"},
+            )
+            assert response.status_code == 413 and response.json()["detail"] == "File exceeds the 1000 byte upload limit"
+            assert os.listdir(upload_dir) == [], "No verification document is kept"
+
+        # A file of unknown size is cut off mid-write and the partial file removed
+        partial = main.UPLOAD_DIR / "partial.jpg"
+        try:
+            asyncio.run(main.save_upload(UploadFile(io.BytesIO(b"x" * 1500), filename="partial.jpg"), partial))
+            raise AssertionError("An oversized upload should be rejected")
+        except HTTPException as e:
+            assert e.status_code == 413
+        assert not partial.exists(), "The partially written file is removed"
+        assert asyncio.run(main.save_upload(UploadFile(io.BytesIO(b"x" * 1000), filename="ok.jpg"), partial)) == 1000
+        print("✅ Oversized uploads rejected without leftover files")
+
+    finally:
+        main.UPLOAD_DIR, main.UPLOAD_MAX_BYTES, main.UPLOAD_FORM_OVERHEAD, main.UPLOAD_CHUNK_SIZE = original_settings
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_image_variants():
+    """Test variant rendering: sizes, orientation, EXIF removal, transparency, and which URLs are advertised"""
+    import shutil
+    from pathlib import Path
+
+    from PIL import ExifTags, Image
+
+    from backend import image_pipeline
+
+    upload_dir = Path(tempfile.mkdtemp())
+
+    try:
+        print("\n🖼️  Testing image variants...")
+
+        # A landscape photo whose EXIF orientation displays it rotated a quarter turn clockwise
+        photo = upload_dir / "photo.jpg"
+        image = Image.new("RGB", (2000, 1000), "blue")
+        image.paste("red", (0, 0, 1000, 1000))
+        exif = Image.Exif()
+        exif[ExifTags.Base.Orientation] = 6
+        exif[ExifTags.IFD.GPSInfo] = {ExifTags.GPS.GPSLatitudeRef: "N", ExifTags.GPS.GPSLatitude: (37.0, 46.0, 30.0)}
+        image.save(photo, exif=exif)
+        assert image_pipeline.variant_urls("/uploads/photo.jpg", upload_dir) is None, "Nothing is advertised before rendering"
+
+        written = image_pipeline.render_variants(str(photo))
+        assert len(written) == len(image_pipeline.IMAGE_VARIANTS) * len(image_pipeline.IMAGE_FORMATS)
+        for variant, size in image_pipeline.IMAGE_VARIANTS.items():
+            for extension in image_pipeline.IMAGE_FORMATS:
+                with Image.open(image_pipeline.variant_path(photo, variant, extension)) as rendered:
+                    assert rendered.size == (size // 2, size), f"{variant}.{extension} is upright and fits {size} px"
+                    assert not rendered.getexif(), "Variants carry no EXIF"
+                    red, _, blue = rendered.convert("RGB").getpixel((size // 4, size // 8))
+                    assert red > 200 and blue < 50, "The left half of the sensor image ends up on top"
+        with Image.open(photo) as original:
+            assert original.size == (1000, 2000), "The original is re-saved upright"
+            assert not original.getexif(), "Orientation and GPS tags are stripped from the original"
+
+        urls = image_pipeline.variant_urls("/uploads/photo.jpg", upload_dir)
+        assert urls == {
+            variant: {extension: f"/uploads/photo.{variant}.{extension}" for extension in image_pipeline.IMAGE_FORMATS}
+            for variant in image_pipeline.IMAGE_VARIANTS
+        }
+
+        # Transparency survives in WebP and becomes white, not black, in JPEG
+        logo = upload_dir / "logo.png"
+        image = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+        image.paste((0, 160, 0, 255), (200, 0, 400, 200))
+        image.save(logo)
+        image_pipeline.render_variants(str(logo))
+        with Image.open(image_pipeline.variant_path(logo, "thumbnail", "webp")) as webp:
+            assert webp.size == (160, 80) and webp.mode == "RGBA"
+            assert webp.getpixel((10, 40))[3] == 0 and webp.getpixel((150, 40))[3] == 255
+        with Image.open(image_pipeline.variant_path(logo, "thumbnail", "jpg")) as jpg:
+            assert min(jpg.getpixel((10, 40))) > 245, "Transparent pixels are flattened onto white"
+        with Image.open(image_pipeline.variant_path(logo, "medium", "webp")) as medium:
+            assert medium.size == (400, 200), "Small images are not enlarged"
+
+        # Only rendered uploads get variant URLs
+        broken = upload_dir / "broken.jpg"
+        broken.write_bytes(b"not an image")
+        try:
+            image_pipeline.render_variants(str(broken))
+            raise AssertionError("An undecodable upload should fail to render")
+        except OSError:
+            pass
+        assert image_pipeline.variant_urls("/uploads/broken.jpg", upload_dir) is None
+        assert image_pipeline.variant_urls("/uploads/never-uploaded.jpg", upload_dir) is None
+        assert image_pipeline.variant_urls("https://example.com/photo.jpg", upload_dir) is None
+        assert image_pipeline.variant_urls("/uploads/../photo.jpg", upload_dir) is None
+        print("✅ Image variants rendered upright, stripped and with transparency kept")
+
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def test_text_search():
+    """Test FTS5 text search: ranking, query quoting, trigger sync, index rebuild and the q= search parameter"""
+    from fastapi.testclient import TestClient
+
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🔎 Testing text search...")
+
+        database.init_database()
+        owner_id = database.create_user(email="fts@test.com", username="fts", hashed_password="hash")
+        near = database.create_place(added_by=owner_id, title="Valet garage", address="Pine St", latitude=37.771, longitude=-122.42)
+        far = database.create_place(added_by=owner_id, title="Valet garage", address="Pine St", latitude=37.779, longitude=-122.42)
+        desc = database.create_place(added_by=owner_id, title="Driveway", description="valet on request", address="Oak St", latitude=37.7705, longitude=-122.42)
+
+        def text_ids(text):
+            return [place["id"] for place in database.search_places_by_location(37.77, -122.42, 2.0, text=text)]
+
+        # Title matches outrank description matches; equal matches come nearest first
+        results = database.search_places_by_location(37.77, -122.42, 2.0, text="valet")
+        assert [place["id"] for place in results] == [near, far, desc]
+        assert results[0]["text_rank"] == results[1]["text_rank"] < results[2]["text_rank"]
+        assert text_ids("GAR") == [near, far], "Words match as case-insensitive prefixes"
+
+        # User input is quoted, never parsed as FTS5 syntax
+        assert text_ids("AND") == []
+        assert text_ids("NEAR(valet") == [near, far, desc]
+        assert text_ids('valet" OR "x') == [near, far, desc]
+        assert sorted(text_ids('"')) == sorted([near, far, desc]), "Input without words does not filter"
+
+        # Triggers follow title and address changes and deletes
+        database.update_place(desc, title="Covered bay")
+        database.update_place(far, address="Market St")
+        assert text_ids("covered") == [desc] and text_ids("driveway") == []
+        assert text_ids("market") == [far] and text_ids("pine") == [near]
+        database.delete_place(near)
+        assert text_ids("valet") == [far, desc]
+
+        # An index emptied behind the triggers' back is restored by a rebuild
+        with database.get_db() as conn:
+            conn.execute("INSERT INTO places_fts (places_fts) VALUES ('delete-all')")
+        assert text_ids("valet") == []
+        assert database.rebuild_search_index() == 2
+        assert text_ids("valet") == [far, desc]
+
+        with TestClient(main.app) as client:
+            response = client.post("/spaces/search", json={"lat": 37.77, "lng": -122.42, "radius": 2.0, "q": "valet"})
+        assert response.status_code == 200 and [space["id"] for space in response.json()] == [far, desc]
+        print("✅ Text search ranks by BM25 then distance and stays in sync with places")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_schema_migrations():
+    """Test that migrations run once, upgrade legacy databases and backfill new columns in batches"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🧱 Testing schema migrations...")
+
+        # A database from before rating aggregates and schema versioning existed
+        with sqlite3.connect(test_db_path) as conn:
+            conn.execute("""
+                CREATE TABLE places (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    title TEXT,
+                    description TEXT,
+                    added_by INTEGER NOT NULL,
+                    creator_is_owner BOOLEAN DEFAULT 1,
+                    latitude DECIMAL(10, 8),
+                    longitude DECIMAL(10, 8),
+                    address TEXT NOT NULL,
+                    price_per_hour DECIMAL(10, 2) DEFAULT 0,
+                    is_published BOOLEAN DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE place_ratings (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    place_id INTEGER NOT NULL,
+                    rating INTEGER NOT NULL,
+                    description TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conn.executemany(
+                "INSERT INTO places (added_by, address, latitude, longitude, price_per_hour) VALUES (1, ?, ?, ?, ?)",
+                [(f"Street {i}", 37.7 + i / 100, -122.4, 3.0 + i) for i in range(5)],
+            )
+            conn.executemany("INSERT INTO place_ratings (user_id, place_id, rating) VALUES (1, ?, ?)", [(1, 5), (1, 3), (4, 2)])
+
+        assert database.migrate() == database.SCHEMA_VERSION
+        assert database.migrate() == 0, "An up-to-date schema should not be migrated again"
+        with database.get_db() as conn:
+            assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == database.SCHEMA_VERSION
+            assert conn.execute("SELECT rating_count FROM places WHERE id = 1").fetchone()[0] == 0, "Backfill should not run inside the migration"
+            assert conn.execute("SELECT COUNT(*) FROM place_clusters").fetchone()[0] == 0, "Nor the cluster grid build"
+
+        # Writes before the backfills reach a place must not be counted twice
+        database.create_place_rating(user_id=1, place_id=5, rating=1)
+        database.delete_place(2)
+        database.update_place(3, price_per_hour=1.0)
+        database.create_place(added_by=1, latitude=37.8, longitude=-122.4, address="New St", price_per_hour=2.0)
+
+        # Until places_rtree_aux is filled, counts fall back to reading places
+        with database.get_db() as conn:
+            assert not database._places_rtree_aux_ready(conn)
+            assert conn.execute("SELECT COUNT(*) FROM places_rtree_aux").fetchone()[0] == 2, "Only places written since the migration"
+        assert database.count_places_by_location(37.72, -122.4, radius_km=5.0, max_price=5.0) == 2
+
+        assert database.run_backfills(batch_size=2) == 9, "Five places in batches of two, for clusters, ratings and the count index"
+        with database.get_db() as conn:
+            assert database._places_rtree_aux_ready(conn)
+            indexed = conn.execute("SELECT id, price_per_hour FROM places_rtree_aux ORDER BY id").fetchall()
+        assert [tuple(row) for row in indexed] == [(1, 3.0), (3, 1.0), (4, 6.0), (5, 7.0), (6, 2.0)]
+        assert database.count_places_by_location(37.72, -122.4, radius_km=5.0, max_price=5.0) == 2
+        assert database.run_backfills() == 0
+        assert database.get_place_by_id(1)["average_rating"] == 4.0
+        assert database.get_place_by_id(4)["rating_count"] == 1
+        assert database.get_place_by_id(5)["rating_count"] == 1
+        assert database.start_backfills() is None
+        (world,) = database.get_place_clusters(-85, 85, -180, 180, 0)
+        assert world["count"] == 5 and world["min_price"] == 1.0
+        assert world["average_rating"] == 11 / 4, "Each of the four ratings counted once"
+        print("✅ Migrations applied once and aggregates backfilled online")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_lookup_cache():
+    """Test that cached place and user lookups are invalidated by writes"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🗃️ Testing lookup cache...")
+
+        database.init_database()
+        owner_id = database.create_user(email="cache@test.com", username="cache", hashed_password="hash")
+        rater_id = database.create_user(email="rater@test.com", username="rater", hashed_password="hash")
+        place_id = database.create_place(added_by=owner_id, title="Old", address="Folsom St", tags=["covered"])
+
+        before = database.lookup_cache_stats()["places"]
+        database.get_place_by_id(place_id)["tags"].append("mutated")
+        assert database.get_place_by_id(place_id)["tags"] == ["covered"], "Callers must not mutate the cached copy"
+        after = database.lookup_cache_stats()["places"]
+        assert (after["hits"] - before["hits"], after["misses"] - before["misses"]) == (1, 1)
+
+        database.update_place(place_id, title="New")
+        assert database.get_place_by_id(place_id)["title"] == "New"
+        database.create_place_rating(user_id=rater_id, place_id=place_id, rating=4)
+        assert database.get_place_by_id(place_id)["average_rating"] == 4.0
+        database.delete_place(place_id)
+        assert database.get_place_by_id(place_id) is None
+
+        assert database.get_user_by_email("cache@test.com")["units_preference"] == "imperial"
+        database.update_user("cache@test.com", units_preference="metric")
+        assert database.get_user_by_email("cache@test.com")["units_preference"] == "metric"
+        database.create_user_rating(rater_id=rater_id, ratee_id=owner_id, rating=5)
+        assert database.get_user_by_email("cache@test.com")["average_rating"] == 5.0
+
+        # A lookup that read the row before a write committed must not re-cache it
+        generation = database._place_cache.generation()
+        database._place_cache.invalidate(1)
+        database._place_cache.put(1, {"id": 1, "tags": []}, generation)
+        assert database._place_cache.get(1) is None
+        print("✅ Lookup cache serves hits and is invalidated by writes")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_search_tile_cache():
+    """Test that radius searches share cached geo tiles and see place writes"""
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🧩 Testing search tile cache...")
+
+        database.init_database()
+        owner_id = database.create_user(email="tiles@test.com", username="tiles", hashed_password="hash")
+        first = database.create_place(added_by=owner_id, latitude=37.7749, longitude=-122.4194, address="Market St")
+
+        def search_ids(lat, lng):
+            return [place["id"] for place in database.search_places_by_location(lat, lng, radius_km=0.5)]
+
+        assert search_ids(37.7749, -122.4194) == [first]
+        before = database.lookup_cache_stats()["search_tiles"]
+        assert search_ids(37.7752, -122.4190) == [first], "A slightly panned search should reuse the loaded tiles"
+        after = database.lookup_cache_stats()["search_tiles"]
+        assert after["misses"] == before["misses"] and after["hits"] > before["hits"]
+
+        second = database.create_place(added_by=owner_id, latitude=37.7760, longitude=-122.4194, address="Mission St")
+        assert search_ids(37.7749, -122.4194) == [first, second], "Creating a place should invalidate its tile"
+
+        database.update_place(second, latitude=40.7589, longitude=-73.9851)
+        assert search_ids(37.7749, -122.4194) == [first]
+        assert search_ids(40.7589, -73.9851) == [second]
+
+        database.update_place(first, is_published=0)
+        assert search_ids(37.7749, -122.4194) == []
+        database.delete_place(second)
+        assert search_ids(40.7589, -73.9851) == []
+        print("✅ Tile cache shared across nearby searches and invalidated by writes")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_place_clusters():
+    """Test that the cluster grid follows place and rating writes, matches a full rebuild and serves viewports across the antimeridian"""
+    from fastapi.testclient import TestClient
+
+    from backend import database, main
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🔵 Testing place clusters...")
+
+        database.init_database()
+        owner_id = database.create_user(email="clusters@test.com", username="clusters", hashed_password="hash")
+        cheap = database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address="A", price_per_hour=2.0)
+        database.create_place(added_by=owner_id, latitude=37.78, longitude=-122.41, address="B", price_per_hour=5.0)
+        far = database.create_place(added_by=owner_id, latitude=40.75, longitude=-73.98, address="C", price_per_hour=9.0)
+        database.create_place_rating(user_id=owner_id, place_id=cheap, rating=4)
+
+        def bay_area(level):
+            return database.get_place_clusters(37.0, 38.5, -123.0, -121.5, level)
+
+        (cluster,) = bay_area(6)
+        assert cluster["count"] == 2 and cluster["min_price"] == 2.0 and cluster["average_rating"] == 4.0
+        assert abs(cluster["lat"] - 37.775) < 1e-9 and abs(cluster["lng"] + 122.415) < 1e-9
+        assert len(bay_area(database.CLUSTER_MAX_LEVEL)) == 2, "Finest level should separate the places"
+        assert [c["count"] for c in database.get_place_clusters(-85, 85, -180, 180, 0)] == [3]
+
+        database.delete_place(cheap)
+        (cluster,) = bay_area(6)
+        assert cluster["count"] == 1 and cluster["min_price"] == 5.0 and cluster["average_rating"] is None
+
+        database.update_place(far, latitude=37.79, longitude=-122.40, price_per_hour=1.0)
+        (cluster,) = bay_area(6)
+        assert cluster["count"] == 2 and cluster["min_price"] == 1.0
+
+        with database.get_db() as conn:
+            incremental = conn.execute("SELECT level, x, y, place_count, min_price FROM place_clusters ORDER BY level, x, y").fetchall()
+        database.rebuild_place_clusters()
+        with database.get_db() as conn:
+            rebuilt = conn.execute("SELECT level, x, y, place_count, min_price FROM place_clusters ORDER BY level, x, y").fetchall()
+        assert [tuple(row) for row in incremental] == [tuple(row) for row in rebuilt]
+
+        # Viewports crossing the antimeridian cover the cells on both sides of it
+        database.create_place(added_by=owner_id, latitude=0.0, longitude=179.5, address="East", price_per_hour=3.0)
+        database.create_place(added_by=owner_id, latitude=0.0, longitude=-179.5, address="West", price_per_hour=4.0)
+        database.create_place(added_by=owner_id, latitude=0.0, longitude=0.0, address="Null Island")
+        dateline = database.get_place_clusters(-10, 10, 170, -170, 8)
+        assert sorted(c["lng"] for c in dateline) == [-179.5, 179.5]
+        (world,) = database.get_place_clusters(-10, 10, 170, -170, 0)
+        assert world["count"] == 5, "A cell reached from both sides is returned once"
+        with TestClient(main.app) as client:
+            for bbox in ("170,-10,-170,10", "170,-10,190,10", "-190,-10,-170,10"):
+                response = client.get("/spaces/clusters", params={"bbox": bbox, "zoom": 6})
+                assert response.status_code == 200, f"{bbox} answered {response.status_code}"
+                assert sorted(c["min_price"] for c in response.json()) == [3.0, 4.0]
+            clusters = client.get("/spaces/clusters", params={"bbox": "-200,-85,200,85", "zoom": 0}).json()
+            assert sum(c["count"] for c in clusters) == 5, "A viewport wider than the world covers all of it"
+            assert len({(c["x"], c["y"]) for c in clusters}) == len(clusters)
+            for bbox in ("nan,-10,10,10", "0,10,1,-10", "0,0,1"):
+                assert client.get("/spaces/clusters", params={"bbox": bbox, "zoom": 6}).status_code == 400
+        print("✅ Cluster grid maintained incrementally")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_notification_events():
+    """Test that notification listeners see committed creates and reads with unread counts"""
+    from datetime import UTC, datetime
+
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+    events = []
+
+    def listener(event, payload):
+        events.append((event, payload))
+
+    try:
+        print("\n🔔 Testing notification events...")
+
+        database.init_database()
+        database.add_notification_listener(listener)
+        first = database.create_notification("bell@test.com", "One", "First")
+        second = database.create_notification("bell@test.com", "Two", "Second")
+        assert [(e, p["id"], p["unread_count"]) for e, p in events] == [("created", first, 1), ("created", second, 2)]
+
+        assert database.mark_notification_read(first)
+        assert database.mark_notification_read(first), "Marking twice still finds the notification"
+        assert not database.mark_notification_read(999)
+        assert events[2:] == [("read", {"user_email": "bell@test.com", "ids": [first], "unread_count": 1})], "Only the first read changes anything"
+
+        assert [n["id"] for n in database.get_user_notifications_after("bell@test.com", first)] == [second]
+        assert database.get_unread_notification_count("bell@test.com") == 1
+        assert database.get_unread_notification_count("nobody@test.com") == 0
+
+        assert database.create_notifications_bulk(["bell@test.com", "other@test.com", "bell@test.com"], "News", "Announcement") == 3
+        assert database.get_unread_notification_count("bell@test.com") == 3
+        assert [p["user_email"] for e, p in events[3:]] == ["bell@test.com", "other@test.com", "bell@test.com"]
+        bulk = [p["id"] for e, p in events[3:]]
+        assert database.mark_notifications_read("bell@test.com", ids=[second, *bulk[:2]]) == 2, "Other users' ids are ignored"
+        assert database.get_unread_notification_count("other@test.com") == 1
+        assert events[-1][1]["ids"] == [second, bulk[0]] and events[-1][1]["unread_count"] == 1
+        assert database.mark_notifications_read("bell@test.com", before=datetime.now(UTC)) == 1
+        assert database.get_unread_notification_count("bell@test.com") == 0
+        assert database.mark_notifications_read("bell@test.com", before=datetime.now(UTC)) == 0
+
+        # Only read notifications past the retention period are archived
+        with database.get_db() as conn:
+            conn.execute("UPDATE notifications SET created_at = '2000-01-01 00:00:00' WHERE id = ?", (first,))
+            plan = " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN SELECT * FROM notifications WHERE user_email = ? AND is_read = 0 ORDER BY created_at DESC LIMIT 50", ("bell@test.com",)))
+        assert "idx_notifications_user_read_created" in plan and "TEMP B-TREE" not in plan
+        assert database.archive_read_notifications(older_than_days=30, batch_size=1) == 1
+        assert second in [n["id"] for n in database.get_user_notifications("bell@test.com")]
+        with database.get_db() as conn:
+            assert [row["id"] for row in conn.execute("SELECT id FROM notifications_archive")] == [first]
+        print("✅ Notification events published after commit, counters kept and read notifications archived")
+
+    finally:
+        database.remove_notification_listener(listener)
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_notification_stream():
+    """Test that the SSE stream replays after Last-Event-ID and forwards live events in any id order"""
+    import asyncio
+
+    from backend import database, notification_hub
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    def live(notification_id):
+        return {"id": notification_id, "user_email": "bell@test.com", "title": "Live", "unread_count": notification_id}
+
+    async def read_stream():
+        frames = []
+        hub = notification_hub.hub
+        hub.start()
+        stream = notification_hub.stream("bell@test.com", last_event_id=first)
+        try:
+            for _ in range(3):  # retry hint, replayed notification, unread-count snapshot
+                frames.append(await anext(stream))
+            # Events from concurrent writers may be published out of id order
+            hub._deliver("created", live(second + 2))
+            hub._deliver("created", live(second + 1))
+            hub._deliver("created", live(second))  # Already replayed
+            for _ in range(5):  # Two notifications, three unread-count changes
+                frames.append(await anext(stream))
+        finally:
+            await stream.aclose()
+            hub.stop()
+        return frames
+
+    try:
+        print("\n📡 Testing notification stream...")
+
+        database.init_database()
+        first = database.create_notification("bell@test.com", "One", "First")
+        second = database.create_notification("bell@test.com", "Two", "Second")
+
+        frames = [frame.decode() for frame in asyncio.run(read_stream())]
+        assert frames[0].startswith("retry:")
+        assert frames[1].startswith(f"id: {second}\nevent: notification\n")
+        assert frames[2].startswith("event: unread-count\n") and '"count":2' in frames[2]
+        ids = [int(frame.split("\n")[0][4:]) for frame in frames[3:] if frame.startswith("id: ")]
+        assert ids == [second + 2, second + 1], "A lower id arriving after a higher one is still sent, replayed ids are not"
+        assert sum(frame.startswith("event: unread-count") for frame in frames[3:]) == 3
+        print("✅ Stream replays missed notifications and keeps out-of-order live events")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_write_queue():
+    """Test that batched writes roll back only the failing job, the DB_WRITE_QUEUE=0 fallback and flushing on close"""
+    import threading
+
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    original_queue_setting = database.DB_WRITE_QUEUE
+    database.DB_PATH = test_db_path
+
+    class RecordingQueue(database.WriteQueue):
+        def __init__(self):
+            self.batch_sizes = []
+            super().__init__()
+
+        def _apply(self, batch):
+            self.batch_sizes.append(len(batch))
+            super()._apply(batch)
+
+    def insert(name, fail=False):
+        def job(conn):
+            conn.execute("INSERT INTO write_queue_test (name) VALUES (?)", (name,))
+            if fail:
+                raise ValueError(name)
+            return threading.current_thread().name
+
+        return job
+
+    def names():
+        with database.get_db() as conn:
+            return [row["name"] for row in conn.execute("SELECT name FROM write_queue_test ORDER BY rowid")]
+
+    try:
+        print("\n✍️ Testing write queue...")
+
+        database.init_database()
+        with database.get_db() as conn:
+            conn.execute("CREATE TABLE write_queue_test (name TEXT NOT NULL)")
+
+        # Hold the writer on a first job so the next three are queued into one batch
+        write_queue = RecordingQueue()
+        running = threading.Event()
+        release = threading.Event()
+
+        def hold(conn):
+            running.set()
+            return release.wait(10)
+
+        blocker = write_queue.submit(hold)
+        assert running.wait(10)
+        futures = [write_queue.submit(insert("a")), write_queue.submit(insert("b", fail=True)), write_queue.submit(insert("c"))]
+        release.set()
+        assert blocker.result(10)
+        assert futures[0].result(10) == "db-writer" and futures[2].result(10) == "db-writer"
+        assert isinstance(futures[1].exception(10), ValueError)
+        assert write_queue.batch_sizes == [1, 3], "The three jobs should share one transaction"
+        assert names() == ["a", "c"], "Only the failing job is rolled back"
+
+        # close() applies everything already queued before the writer stops
+        running.clear()
+        release.clear()
+        write_queue.submit(hold)
+        assert running.wait(10)
+        queued = [write_queue.submit(insert(f"q{i}")) for i in range(5)]
+        release.set()
+        write_queue.close()
+        assert all(future.done() for future in queued)
+        assert names()[2:] == [f"q{i}" for i in range(5)]
+        try:
+            write_queue.submit(insert("late"))
+            raise AssertionError("A closed queue should refuse jobs")
+        except sqlite3.OperationalError:
+            pass
+
+        # With DB_WRITE_QUEUE=0 jobs run on the calling thread and no writer is started
+        database.close_write_queue()
+        database.DB_WRITE_QUEUE = False
+        assert database.run_write(insert("inline")) == threading.current_thread().name
+        assert database._write_queue is None
+        try:
+            database.run_write(insert("inline-fail", fail=True))
+            raise AssertionError("The job's exception should propagate")
+        except ValueError:
+            pass
+        assert names()[-1] == "inline", "A failing inline job is rolled back"
+        database.DB_WRITE_QUEUE = True
+        assert database.run_write(insert("queued")) == "db-writer"
+        print("✅ Write queue isolates failing jobs and flushes on close")
+
+    finally:
+        database.DB_WRITE_QUEUE = original_queue_setting
+        database.close_write_queue()
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_availability_bitmaps():
+    """Test the per-day slot bitmaps behind availability search across days, cancellations and timezones"""
+    from datetime import UTC, datetime, timedelta, timezone
+
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🗓️ Testing availability bitmaps...")
+
+        database.init_database()
+        owner_id = database.create_user(email="slots@test.com", username="slots", hashed_password="hash")
+        space_id = database.create_place(added_by=owner_id, latitude=37.77, longitude=-122.42, address="Folsom St")
+
+        def busy(start, end):
+            return database.get_booked_space_ids([space_id], start, end) == {space_id}
+
+        # A booking spanning midnight twice marks every day it touches
+        assert database.create_booking(space_id, owner_id, datetime(2030, 1, 1, 22, 0), datetime(2030, 1, 3, 1, 10))
+        assert busy(datetime(2030, 1, 1, 23, 0), datetime(2030, 1, 1, 23, 30))
+        assert busy(datetime(2030, 1, 2, 12, 0), datetime(2030, 1, 2, 13, 0))
+        assert busy(datetime(2030, 1, 3, 1, 10), datetime(2030, 1, 3, 1, 12)), "The partially used 01:00-01:15 slot is booked"
+        assert not busy(datetime(2030, 1, 3, 1, 15), datetime(2030, 1, 3, 2, 0))
+        assert not busy(datetime(2030, 1, 1, 20, 0), datetime(2030, 1, 1, 22, 0))
+
+        # Two bookings sharing the 10:00-10:15 slot: cancelling one must keep the other's bits
+        first = database.create_booking(space_id, owner_id, datetime(2030, 2, 1, 10, 0), datetime(2030, 2, 1, 10, 5))
+        second = database.create_booking(space_id, owner_id, datetime(2030, 2, 1, 10, 10), datetime(2030, 2, 1, 10, 30))
+        assert first and second
+        assert database.cancel_booking(first)
+        assert busy(datetime(2030, 2, 1, 10, 0), datetime(2030, 2, 1, 10, 5)), "The slot is still shared with the second booking"
+        assert database.cancel_booking(second)
+        assert not busy(datetime(2030, 2, 1, 10, 0), datetime(2030, 2, 1, 10, 30))
+        assert busy(datetime(2030, 1, 2, 12, 0), datetime(2030, 1, 2, 13, 0)), "Cancelling leaves other days alone"
+
+        # Aware datetimes are stored in UTC; naive ones are taken as UTC
+        plus_two = timezone(timedelta(hours=2))
+        assert database.create_booking(space_id, owner_id, datetime(2030, 3, 1, 12, 0, tzinfo=plus_two), datetime(2030, 3, 1, 13, 0, tzinfo=plus_two))
+        assert busy(datetime(2030, 3, 1, 10, 30, tzinfo=UTC), datetime(2030, 3, 1, 10, 45, tzinfo=UTC))
+        assert busy(datetime(2030, 3, 1, 10, 30), datetime(2030, 3, 1, 10, 45))
+        assert not busy(datetime(2030, 3, 1, 12, 30), datetime(2030, 3, 1, 12, 45))
+
+        # Bookings spanning more days than SQLite's bound variable limit are read and rebuilt by day range
+        with database.get_db() as conn:
+            limit = conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)  # The default before SQLite 3.32
+            try:
+                long_booking = database.create_booking(space_id, owner_id, datetime(2040, 1, 1), datetime(2043, 1, 1))
+                assert long_booking and busy(datetime(2042, 6, 1), datetime(2042, 6, 2))
+                assert database.cancel_booking(long_booking)
+                assert conn.execute("SELECT COUNT(*) FROM space_availability WHERE day >= '2040-01-01'").fetchone()[0] == 0
+            finally:
+                conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+        print("✅ Slot bitmaps follow multi-day bookings, shared-slot cancellations and timezones")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
+def test_concurrent_booking_stress():
+    """Fire thousands of parallel overlapping bookings at one space; exactly one may win per slot"""
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime, timedelta
+
+    import database
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".db") as tmp_db:
+        test_db_path = tmp_db.name
+
+    original_db_path = database.DB_PATH
+    database.DB_PATH = test_db_path
+
+    try:
+        print("\n🏁 Testing concurrent booking stress...")
+
+        database.init_database()
+        renter_id = database.create_user(email="racer@test.com", username="racer", hashed_password="hash")
+        space_id = database.create_place(added_by=renter_id, latitude=37.77, longitude=-122.42, address="Howard St")
+
+        # Every attempt for a slot contains the slot's midpoint, so attempts for the same
+        # slot always overlap each other and never overlap attempts for other slots
+        slot_count = 20
+        attempts = 2000
+        base = datetime(2030, 1, 1, 8, 0)
+        rng = random.Random(42)
+
+        def attempt(slot: int) -> tuple[int, int | None]:
+            slot_start = base + timedelta(hours=slot)
+            start = slot_start + timedelta(minutes=rng.randint(0, 29))
+            end = slot_start + timedelta(minutes=rng.randint(31, 60))
+            return slot, database.create_booking(space_id, renter_id, start, end)
+
+        slots = [i % slot_count for i in range(attempts)]
+        rng.shuffle(slots)
+        with ThreadPoolExecutor(max_workers=64) as executor:
+            outcomes = list(executor.map(attempt, slots))
+
+        winners: dict[int, list[int]] = {}
+        for slot, booking_id in outcomes:
+            if booking_id is not None:
+                winners.setdefault(slot, []).append(booking_id)
+        assert sorted(winners) == list(range(slot_count)), "Every slot should have been booked"
+        assert all(len(ids) == 1 for ids in winners.values()), f"Double booking detected: {winners}"
+
+        bookings = database.get_bookings_by_space(space_id)
+        assert len(bookings) == slot_count
+        for earlier, later in zip(bookings, bookings[1:], strict=False):
+            assert earlier["end_time"] <= later["start_time"], "Stored bookings overlap"
+        print(f"✅ {attempts} concurrent attempts produced exactly one booking per slot")
+
+    finally:
+        database.DB_PATH = original_db_path
+        if os.path.exists(test_db_path):
+            os.unlink(test_db_path)
+
+
 if __name__ == "__main__":
     test_database()
     test_user_type_distinction()
+    test_connection_pool()
+    test_keyset_pagination()
+    test_space_json_matches_model()
+    test_stream_spaces()
+    test_spatial_index_sync()
+    test_search_across_antimeridian()
+    test_nearest_places()
+    test_rating_aggregates()
+    test_place_tag_index()
+    test_database_overload()
+    test_upload_limits()
+    test_image_variants()
+    test_text_search()
+    test_schema_migrations()
+    test_lookup_cache()
+    test_search_tile_cache()
+    test_place_clusters()
+    test_notification_events()
+    test_notification_stream()
+    test_write_queue()
+    test_availability_bitmaps()
+    test_concurrent_booking_stress()
     print("\n🚀 All database tests completed successfully!")
\ No newline at end of file
@@ -41,6 +41,10 @@ class ApiService {
         radius,
         min_price: filters.priceRange ? filters.priceRange[0] : undefined,
         max_price: filters.priceRange ? filters.priceRange[1] : undefined,
+        start_time: filters.startTime,
+        end_time: filters.endTime,
+        tags_any: filters.tags && filters.tags.length > 0 ? filters.tags : undefined,
+        q: filters.query || undefined,
       };
 
       const response = await fetch(`${API_BASE_URL}/spaces/search`, {
@@ -79,6 +83,22 @@ class ApiService {
     }
   }
 
+  async getNearestSpaces(lat, lng, k = 10) {
+    try {
+      const response = await fetch(
+        `${API_BASE_URL}/spaces/nearest?lat=${lat}&lng=${lng}&k=${k}`
+      );
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const spaces = await response.json();
+      return this.transformApiSpacesToFrontend(spaces);
+    } catch (error) {
+      console.error('Error fetching nearest spaces:', error);
+      throw error;
+    }
+  }
+
   async getSpacesCount(lat, lng, radius = 1.0) {
     try {
       const response = await fetch(
@@ -144,8 +164,10 @@ class ApiService {
   }
 
   transformApiSpaceToFrontend(apiSpace) {
-    // Calculate mock distance (in real app, backend would provide this)
-    const distance = Math.floor(Math.random() * 2000) + 100; // 100-2100 meters
+    // Search results carry the server-computed distance; fall back to a mock elsewhere
+    const distance = apiSpace.distance_m != null
+      ? Math.round(apiSpace.distance_m)
+      : Math.floor(Math.random() * 2000) + 100; // 100-2100 meters
 
     // Normalize incoming tags if present
     let features = Array.isArray(apiSpace.tags) ? apiSpace.tags.map(t => this.normalizeTagId(t)) : null;